@@ -1,3 +1,18 @@
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import math
+import os
+import secrets
+import statistics
+import time
+import unicodedata
+import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from typing import Optional
 import jwt
@@ -5,25 +20,163 @@ from jwt.exceptions import InvalidTokenError
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy import func, select, update
 from sqlalchemy.orm import Session
-from app.database import SessionLocal, User
+from app import database
+from app.database import ReadSessionLocal, RefreshToken, SessionLocal, User
+from app.metrics import PASSWORD_HASH_SECONDS, REGISTRY, counter
+
+logger = logging.getLogger(__name__)
 
 # Security configuration
-SECRET_KEY = "secret-key"
 ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30
+
+# Signing keys by key id. JWT_SIGNING_KEYS='{"2025-06": "...", "2025-01": "..."}'
+# lists every key still accepted; JWT_ACTIVE_KID picks the one that signs.
+# To rotate: add the new key, make it active, and drop the old one once the
+# tokens it signed have expired (REFRESH_TOKEN_EXPIRE_DAYS). Without
+# JWT_SIGNING_KEYS, SECRET_KEY is the only key.
+SIGNING_KEYS: dict[str, str] = json.loads(os.getenv("JWT_SIGNING_KEYS") or "{}") or {
+    "default": os.getenv("SECRET_KEY", "secret-key"),
+}
+ACTIVE_KID = os.getenv("JWT_ACTIVE_KID") or next(iter(SIGNING_KEYS))
+if ACTIVE_KID not in SIGNING_KEYS:
+    raise RuntimeError(f"JWT_ACTIVE_KID {ACTIVE_KID!r} is not in JWT_SIGNING_KEYS")
+SECRET_KEY = SIGNING_KEYS[ACTIVE_KID]
+# access tokens are short-lived; clients renew them with a refresh token
+# (one HMAC check + one primary-key lookup) instead of the password
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "15"))
+REFRESH_TOKEN_EXPIRE_DAYS   = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "14"))
+
+TOKENS_ISSUED = counter(
+    "nutricart_auth_tokens_issued_total",
+    "Access tokens issued by grant (password = bcrypt login, refresh = rotation).",
+)
+REFRESH_REUSE = counter(
+    "nutricart_refresh_token_reuse_total",
+    "Rotated refresh tokens presented again (their family is revoked).",
+)
+
+# Comma-separated list of e-mails allowed to use the /admin endpoints
+ADMIN_EMAILS = frozenset(
+    e.strip().lower() for e in os.getenv("ADMIN_EMAILS", "").split(",") if e.strip()
+)
 
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# bcrypt cost is calibrated at start-up so that one verification takes about
+# PASSWORD_HASH_TARGET_MS on this machine; BCRYPT_ROUNDS pins it instead
+# (useful when several hosts must agree, or in tests).
+PASSWORD_HASH_TARGET_SECONDS = float(os.getenv("PASSWORD_HASH_TARGET_MS", "250")) / 1000
+BCRYPT_MIN_ROUNDS = 10      # never weaker than this, whatever the hardware
+BCRYPT_MAX_ROUNDS = 16
+BCRYPT_PROBE_ROUNDS = 8     # cheap probe; each extra round doubles the cost
+BCRYPT_ROUNDS: Optional[int] = None     # set by configure_password_hashing
+
 # Token authentication
 security = HTTPBearer()
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    with PASSWORD_HASH_SECONDS.time(op="verify"):
+        return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    with PASSWORD_HASH_SECONDS.time(op="hash"):
+        return pwd_context.hash(password)
+
+# ---------------------------------------------------------------------------
+# Hashing pool
+#
+# bcrypt releases the GIL, so a small dedicated pool hashes in parallel
+# without holding request threads. Bulk work is capped at half the pool so
+# interactive hashing always has threads left.
+# ---------------------------------------------------------------------------
+
+def _default_hash_workers() -> int:
+    from app.workers import available_cpus
+    return available_cpus()
+
+HASH_WORKERS   = int(os.getenv("HASH_WORKERS", "0")) or _default_hash_workers()
+HASH_MAX_QUEUE = int(os.getenv("HASH_MAX_QUEUE", "64"))   # readiness threshold
+BULK_HASH_WORKERS = max(1, HASH_WORKERS // 2)
+BULK_HASH_SECONDS = float(os.getenv("BULK_HASH_SECONDS", "5"))   # one bulk request's hashing
+
+_hash_executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="bcrypt")
+_hash_pending  = 0
+_hash_lock     = threading.Lock()
+
+def _hash_done(_: Future) -> None:
+    global _hash_pending
+    with _hash_lock:
+        _hash_pending -= 1
+
+def submit_hash(password: str) -> Future:
+    global _hash_pending
+    with _hash_lock:
+        _hash_pending += 1
+    future = _hash_executor.submit(get_password_hash, password)
+    future.add_done_callback(_hash_done)
+    return future
+
+async def hash_password_async(password: str) -> str:
+    """``get_password_hash`` on the hashing pool, awaited from the event loop."""
+    return await asyncio.wrap_future(submit_hash(password))
+
+def bulk_hash_limit() -> int:
+    """Passwords ``hash_passwords_bulk`` hashes in about ``BULK_HASH_SECONDS``
+    (each hash takes about ``PASSWORD_HASH_TARGET_SECONDS``)."""
+    return max(1, int(BULK_HASH_WORKERS * BULK_HASH_SECONDS / PASSWORD_HASH_TARGET_SECONDS))
+
+async def hash_passwords_bulk(passwords: list[str]) -> list[str]:
+    limit = asyncio.Semaphore(BULK_HASH_WORKERS)
+
+    async def one(password: str) -> str:
+        async with limit:
+            return await hash_password_async(password)
+
+    return list(await asyncio.gather(*(one(p) for p in passwords)))
+
+def hashing_pool_load() -> tuple[int, int, int]:
+    """``(busy, queued, workers)`` of the hashing pool."""
+    pending = _hash_pending
+    busy = min(pending, HASH_WORKERS)
+    return busy, pending - busy, HASH_WORKERS
+
+def calibrate_bcrypt_rounds(target_seconds: float = PASSWORD_HASH_TARGET_SECONDS) -> int:
+    """bcrypt cost whose verification takes about *target_seconds* here.
+
+    Times a few hashes at ``BCRYPT_PROBE_ROUNDS`` and extrapolates (the
+    cost is exponential: +1 round = 2x time), rounding to the nearest cost.
+    """
+    probe = pwd_context.handler("bcrypt").using(rounds=BCRYPT_PROBE_ROUNDS)
+    samples = []
+    for _ in range(3):
+        t0 = time.perf_counter()
+        probe.hash("calibration")
+        samples.append(time.perf_counter() - t0)
+    extra = round(math.log2(target_seconds / statistics.median(samples)))
+    return max(BCRYPT_MIN_ROUNDS, min(BCRYPT_MAX_ROUNDS, BCRYPT_PROBE_ROUNDS + extra))
+
+def configure_password_hashing(rounds: Optional[int] = None) -> int:
+    """Make *rounds* (default: ``BCRYPT_ROUNDS`` env, else calibrated) the
+    cost for new hashes; hashes below it then ``needs_update``. Costlier
+    hashes are kept, so a slow start-up or another host calibrating lower
+    never downgrades them. Idempotent: only the first call calibrates."""
+    global BCRYPT_ROUNDS
+    if rounds is None:
+        if BCRYPT_ROUNDS is not None:
+            return BCRYPT_ROUNDS
+        env = os.getenv("BCRYPT_ROUNDS")
+        rounds = int(env) if env else calibrate_bcrypt_rounds()
+    # passlib treats the default cost as the maximum unless one is given
+    pwd_context.update(
+        bcrypt__rounds=rounds, bcrypt__min_rounds=rounds,
+        bcrypt__max_rounds=pwd_context.handler("bcrypt").max_rounds,
+    )
+    BCRYPT_ROUNDS = rounds
+    logger.info("bcrypt cost set to %d", rounds)
+    return rounds
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -31,19 +184,154 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
         expire = datetime.now(timezone.utc) + expires_delta
     else:
         expire = datetime.now(timezone.utc) + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
+    to_encode.update({"exp": expire, "type": "access"})
+    return encode_jwt(to_encode)
+
+def encode_jwt(payload: dict) -> str:
+    return jwt.encode(payload, SIGNING_KEYS[ACTIVE_KID], algorithm=ALGORITHM,
+                      headers={"kid": ACTIVE_KID})
+
+def decode_jwt(token: str) -> dict:
+    """Verify *token* with the key named by its ``kid`` header (tokens
+    issued before key ids existed carry none and use the "default" key)."""
+    kid = jwt.get_unverified_header(token).get("kid") or (
+        "default" if "default" in SIGNING_KEYS else ACTIVE_KID)
+    key = SIGNING_KEYS.get(kid)
+    if key is None:
+        raise InvalidTokenError(f"unknown key id {kid!r}")
+    return jwt.decode(token, key, algorithms=[ALGORITHM])
+
+# Recently verified access tokens: sha256(token) -> (subject, exp). A hit
+# skips base64/JSON parsing and the HMAC; entries are only trusted until
+# the token's own ``exp``. Only successful verifications are cached.
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+_token_cache: OrderedDict[bytes, tuple[str, float]] = OrderedDict()
+_token_cache_lock = threading.Lock()
+
+def clear_token_cache() -> None:
+    with _token_cache_lock:
+        _token_cache.clear()
 
 def verify_token(token: str) -> Optional[str]:
+    digest = hashlib.sha256(token.encode()).digest()
+    with _token_cache_lock:
+        hit = _token_cache.get(digest)
+        if hit is not None:
+            if hit[1] > time.time():
+                _token_cache.move_to_end(digest)
+                return hit[0]
+            del _token_cache[digest]
+
+    try:
+        payload = decode_jwt(token)
+    except InvalidTokenError:
+        return None
+    # refresh tokens must not authenticate API calls
+    if payload.get("type", "access") != "access":
+        return None
+    email: str = payload.get("sub")
+    if email is None:
+        return None
+
+    if "exp" in payload:
+        with _token_cache_lock:
+            _token_cache[digest] = (email, float(payload["exp"]))
+            if len(_token_cache) > TOKEN_CACHE_SIZE:
+                _token_cache.popitem(last=False)
+    return email
+
+# ---------------------------------------------------------------------------
+# Refresh tokens
+# ---------------------------------------------------------------------------
+
+def create_refresh_token(db: Session, user_id: int, email: str,
+                         family: Optional[str] = None, jti: Optional[str] = None) -> str:
+    """Record and sign a refresh token; a new login starts a new family."""
+    row = RefreshToken(
+        jti=jti or secrets.token_urlsafe(16),
+        user_id=user_id,
+        family=family or secrets.token_urlsafe(16),
+        expires_at=datetime.now(timezone.utc) + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
+    )
+    db.add(row)
+    return encode_jwt({
+        "sub": email, "uid": user_id, "jti": row.jti, "fam": row.family,
+        "type": "refresh", "exp": row.expires_at,
+    })
+
+def issue_tokens(db: Session, user_id: int, email: str, family: Optional[str] = None,
+                 jti: Optional[str] = None, grant: str = "password") -> dict:
+    refresh = create_refresh_token(db, user_id, email, family, jti)
+    db.commit()
+    TOKENS_ISSUED.inc(grant=grant)
+    return {
+        "access_token": create_access_token(
+            {"sub": email}, timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)),
+        "refresh_token": refresh,
+        "token_type": "bearer",
+        "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+    }
+
+def decode_refresh_token(token: str) -> Optional[dict]:
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            return None
-        return email
+        payload = decode_jwt(token)
     except InvalidTokenError:
         return None
+    if payload.get("type") != "refresh" or not payload.get("jti"):
+        return None
+    return payload
+
+def revoke_refresh_family(db: Session, family: str) -> None:
+    db.execute(
+        update(RefreshToken)
+        .where(RefreshToken.family == family, RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=datetime.now(timezone.utc))
+    )
+    db.commit()
+
+def revoke_user_refresh_tokens(db: Session, user_id: int) -> None:
+    db.execute(
+        update(RefreshToken)
+        .where(RefreshToken.user_id == user_id, RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=datetime.now(timezone.utc))
+    )
+    db.commit()
+
+def rotate_refresh_token(db: Session, token: str) -> Optional[dict]:
+    """Exchange a valid refresh token for a new access + refresh pair.
+
+    The old token is revoked with a conditional UPDATE, so of two
+    concurrent uses of one token only one wins. Presenting a token that
+    is already revoked means it leaked: its whole family is revoked.
+    """
+    payload = decode_refresh_token(token)
+    if payload is None:
+        return None
+
+    new_jti = secrets.token_urlsafe(16)
+    claimed = db.execute(
+        update(RefreshToken)
+        .where(RefreshToken.jti == payload["jti"], RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=datetime.now(timezone.utc), replaced_by=new_jti)
+    ).rowcount
+    if not claimed:
+        db.rollback()
+        old = db.get(RefreshToken, payload["jti"])
+        if old is not None and old.replaced_by is not None:
+            REFRESH_REUSE.inc()
+            revoke_refresh_family(db, payload["fam"])
+        return None
+
+    return issue_tokens(db, payload["uid"], payload["sub"],
+                        family=payload["fam"], jti=new_jti, grant="refresh")
+
+def prune_refresh_tokens(db: Session) -> int:
+    """Delete expired refresh tokens (revoked or not)."""
+    deleted = db.query(RefreshToken).filter(
+        RefreshToken.expires_at < datetime.now(timezone.utc)
+    ).delete(synchronize_session=False)
+    db.commit()
+    return deleted
 
 def get_db():
     db = SessionLocal()
@@ -52,6 +340,15 @@ def get_db():
     finally:
         db.close()
 
+def get_read_db():
+    """Session on the read replica (the primary when none is configured).
+    Only for request paths that never write; replicas may lag slightly."""
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
 def get_user_by_email(db: Session, email: str) -> Optional[User]:
     return db.query(User).filter(User.email == email).first()
 
@@ -61,11 +358,67 @@ def authenticate_user(db: Session, email: str, password: str) -> Optional[User]:
         return None
     if not verify_password(password, user.hashed_password):
         return None
+    if pwd_context.needs_update(user.hashed_password):
+        # we hold the plain password only now: move it to the current cost
+        user.hashed_password = get_password_hash(password)
+        db.commit()
     return user
 
+# ---------------------------------------------------------------------------
+# Hash cost distribution (scraped with /metrics)
+# ---------------------------------------------------------------------------
+
+HASH_COST_REFRESH_SECONDS = 60.0    # the GROUP BY scans the users table
+_hash_costs: tuple[float, list[str]] = (0.0, [])
+
+
+def _hash_cost_label(prefix: str) -> tuple[str, str]:
+    # bcrypt: "$2b$12$..." -> ("bcrypt", "12")
+    parts = prefix.split("$")
+    if len(parts) >= 3 and parts[1] in ("2a", "2b", "2y") and parts[2].isdigit():
+        return "bcrypt", str(int(parts[2]))
+    return "other", ""
+
+
+def hash_cost_lines() -> list[str]:
+    global _hash_costs
+    now = time.monotonic()
+    if _hash_costs[0] > now:
+        return _hash_costs[1]
+
+    prefix = func.substr(User.hashed_password, 1, 7)
+    counts: dict[tuple[str, str], int] = {}
+    try:
+        with database.engine.connect() as conn:
+            for p, n in conn.execute(select(prefix, func.count()).group_by(prefix)):
+                key = _hash_cost_label(p or "")
+                counts[key] = counts.get(key, 0) + n
+    except Exception as exc:            # never fail a scrape on the DB
+        logger.warning("hash cost metrics unavailable: %s", exc)
+        return _hash_costs[1]
+
+    name = "nutricart_password_hash_cost_users"
+    lines = [
+        f"# HELP {name} Users by password hash scheme and cost (refreshed every "
+        f"{HASH_COST_REFRESH_SECONDS:.0f}s).",
+        f"# TYPE {name} gauge",
+    ]
+    lines += [f'{name}{{scheme="{s}",cost="{c}"}} {n}' for (s, c), n in sorted(counts.items())]
+    if BCRYPT_ROUNDS is not None:
+        lines += [
+            "# HELP nutricart_password_hash_target_cost bcrypt cost used for new hashes.",
+            "# TYPE nutricart_password_hash_target_cost gauge",
+            f"nutricart_password_hash_target_cost {BCRYPT_ROUNDS}",
+        ]
+    _hash_costs = (now + HASH_COST_REFRESH_SECONDS, lines)
+    return lines
+
+
+REGISTRY.add_collector(hash_cost_lines)
+
 def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ) -> User:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -88,6 +441,11 @@ def get_current_active_user(current_user: User = Depends(get_current_user)) -> U
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
 
+def get_current_admin_user(current_user: User = Depends(get_current_active_user)) -> User:
+    if current_user.email.lower() not in ADMIN_EMAILS:
+        raise HTTPException(status_code=403, detail="Admin privileges required")
+    return current_user
+
 
 def update_user_password(db: Session, user_id: int, new_password: str) -> bool:
     user = db.query(User).filter(User.id == user_id).first()
@@ -97,20 +455,84 @@ def update_user_password(db: Session, user_id: int, new_password: str) -> bool:
     user.hashed_password = get_password_hash(new_password)
     user.updated_at = datetime.now(timezone.utc)
     db.commit()
+    # sessions opened with the old password must not outlive it
+    revoke_user_refresh_tokens(db, user_id)
     return True
 
 
+# ---------------------------------------------------------------------------
+# Security questions
+#
+# ``security_qa_json`` holds one scrypt digest over all answers:
+#
+#     {"v": 2, "questions": [...], "kdf": "scrypt", "n": ..., "r": ..., "p": ...,
+#      "salt": "<b64>", "hash": "<b64>"}
+#
+# so a reset attempt costs one KDF run instead of one bcrypt per answer.
+# Rows in the legacy ``{question: bcrypt(answer)}`` format are upgraded the
+# next time their answers verify.
+# ---------------------------------------------------------------------------
+
+SECURITY_QA_VERSION = 2
+SCRYPT_N = 2 ** 14          # 16 MiB per evaluation (128 * r * n)
+SCRYPT_R = 8
+SCRYPT_P = 1
+
+
+def _normalize_answer(answer: str) -> str:
+    return " ".join(unicodedata.normalize("NFKC", answer).casefold().split())
+
+
+def _answers_kdf(questions: list, answers: list, salt: bytes, n: int, r: int, p: int) -> bytes:
+    # JSON keeps the concatenation unambiguous and binds answers to questions
+    material = json.dumps([questions, [_normalize_answer(a) for a in answers]],
+                          ensure_ascii=False, separators=(",", ":")).encode()
+    with PASSWORD_HASH_SECONDS.time(op="security_answers"):
+        return hashlib.scrypt(material, salt=salt, n=n, r=r, p=p,
+                              maxmem=256 * r * n, dklen=32)
+
+
+def hash_security_answers(security_qa: dict) -> dict:
+    questions = list(security_qa)
+    salt = os.urandom(16)
+    digest = _answers_kdf(questions, [security_qa[q] for q in questions],
+                          salt, SCRYPT_N, SCRYPT_R, SCRYPT_P)
+    return {
+        "v": SECURITY_QA_VERSION, "questions": questions, "kdf": "scrypt",
+        "n": SCRYPT_N, "r": SCRYPT_R, "p": SCRYPT_P,
+        "salt": base64.b64encode(salt).decode(), "hash": base64.b64encode(digest).decode(),
+    }
+
+
+def stored_questions(stored: Optional[dict]) -> list:
+    if not stored:
+        return []
+    if stored.get("v") == SECURITY_QA_VERSION:
+        return list(stored["questions"])
+    return list(stored)                      # legacy: question -> bcrypt hash
+
+
+def check_security_answers(stored: Optional[dict], provided: dict) -> bool:
+    """All stored questions must be answered, and nothing else."""
+    questions = stored_questions(stored)
+    if not questions or set(provided) != set(questions):
+        return False
+    if stored.get("v") == SECURITY_QA_VERSION:
+        digest = _answers_kdf(questions, [provided[q] for q in questions],
+                              base64.b64decode(stored["salt"]),
+                              stored["n"], stored["r"], stored["p"])
+        return hmac.compare_digest(digest, base64.b64decode(stored["hash"]))
+    return all(
+        verify_password(provided[q].lower().strip(), stored[q]) for q in questions
+    )
+
+
 def save_security_questions(db: Session, user_id: int, security_qa: dict) -> bool:
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
         return False
-    
-    # Hash the answers for security
-    hashed_qa = {}
-    for question, answer in security_qa.items():
-        hashed_qa[question] = get_password_hash(answer.lower().strip())
-    
-    user.security_qa_json = hashed_qa
+
+    user.security_qa_json = hash_security_answers(security_qa)
     user.updated_at = datetime.now(timezone.utc)
     db.commit()
     return True
@@ -118,26 +540,20 @@ def save_security_questions(db: Session, user_id: int, security_qa: dict) -> boo
 
 def verify_security_answers(db: Session, user_id: int, provided_answers: dict) -> bool:
     user = db.query(User).filter(User.id == user_id).first()
-    if not user or not user.security_qa_json:
+    if not user or not check_security_answers(user.security_qa_json, provided_answers):
         return False
-    
-    stored_qa = user.security_qa_json
-    
-    # Check if all questions are answered correctly
-    for question, provided_answer in provided_answers.items():
-        if question not in stored_qa:
-            return False
-        
-        stored_hash = stored_qa[question]
-        if not verify_password(provided_answer.lower().strip(), stored_hash):
-            return False
-    
+
+    if user.security_qa_json.get("v") != SECURITY_QA_VERSION:
+        # re-key in stored question order so the questions list is unchanged
+        questions = stored_questions(user.security_qa_json)
+        user.security_qa_json = hash_security_answers(
+            {q: provided_answers[q] for q in questions})
+        db.commit()
     return True
 
 
 def get_user_security_questions(db: Session, user_id: int) -> list:
     user = db.query(User).filter(User.id == user_id).first()
-    if not user or not user.security_qa_json:
+    if not user:
         return []
-    
-    return list(user.security_qa_json.keys())
+    return stored_questions(user.security_qa_json)
@@ -0,0 +1,43 @@
+"""
+Backfill of the derived profile columns (BMR, TDEE, per-meal targets,
+price target, cluster).
+
+Profiles get their targets on every write; rows written before the columns
+existed, or under other ML artefacts / formulas (``targets_version`` differs
+from ``TARGETS_VERSION``), are recomputed on read until this has run::
+
+    python -m app.backfill --batch-size 1000
+
+Run it after deploying retrained artefacts. Each batch is its own
+transaction, so it is safe to interrupt and re-run.
+"""
+from __future__ import annotations
+
+# ---------- stdlib ---------------------------------------------------------
+import argparse
+import sys
+import time
+from   typing import Optional
+
+# ---------- local ----------------------------------------------------------
+from   app import database
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Recompute stored profile targets.")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    if not database.catalogue_ready():
+        print(f"catalogue not loaded: {database.CATALOGUE_ERROR}", file=sys.stderr)
+        return 1
+    database.init_db()                  # adds the columns to older databases
+    t0 = time.perf_counter()
+    updated = database.backfill_profile_targets(database.engine, args.batch_size)
+    print(f"updated {updated} profiles in {time.perf_counter() - t0:.1f}s "
+          f"(targets version {database.TARGETS_VERSION})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
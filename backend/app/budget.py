@@ -0,0 +1,143 @@
+"""
+Budget-aware meal picking shared by plan generation and swaps.
+
+A plan is filled slot by slot against its weekly budget. Each slot may
+cost at most ``BUDGET_SLACK`` times the average still available per
+remaining slot, so a cheap breakfast raises what the following meals may
+cost, and never so much that the remaining slots could not be filled with
+the cheapest meal. A cap never drops below the price of the n-th
+cheapest row, so a run of n slots (a day, or a week) can always be filled
+without repeats. Without a budget only a flat per-slot ceiling applies.
+A swap is one slot under the same ceiling as the first slot of a week.
+
+Candidate rows are kept sorted by price (``PricedPool``); the rows that
+fit under a slot's cap are a prefix of each array found by binary search,
+and a pick is a uniform draw from those prefixes, weighted per array. No
+step touches the whole pool, so filling a week costs O(slots · log n).
+"""
+from __future__ import annotations
+
+# ---------- stdlib ---------------------------------------------------------
+import math
+import os
+from   typing import Container
+
+# ---------- 3rd-party ------------------------------------------------------
+import numpy as np
+
+# ---------------------------------------------------------------------------
+# Configuration
+# ---------------------------------------------------------------------------
+
+BUDGET_SLACK = float(os.getenv("BUDGET_SLACK", "1.2"))   # one slot vs the per-slot average left
+MAX_DRAWS    = 32       # redraws for repeated / recently served meals per slot
+
+
+class PricedPool:
+    """Candidate rows in one or more disjoint arrays, each sorted by price,
+    with a sampling weight per row of each array."""
+
+    __slots__ = ("rows", "prices", "weights")
+
+    def __init__(self, rows: list[np.ndarray], prices: list[np.ndarray], weights: list[float] | None = None):
+        self.rows    = rows
+        self.prices  = prices
+        self.weights = np.asarray([1.0] * len(rows) if weights is None else weights, dtype=float)
+
+    @classmethod
+    def from_rows(cls, rows: np.ndarray, prices: np.ndarray) -> "PricedPool":
+        """One-array pool of *rows* with their (unsorted) *prices*."""
+        order = np.argsort(prices, kind="stable")
+        return cls([np.asarray(rows)[order]], [np.asarray(prices)[order]])
+
+    def __len__(self) -> int:
+        return sum(len(r) for r in self.rows)
+
+    @property
+    def cheapest(self) -> float:
+        return min((float(p[0]) for p in self.prices if len(p)), default=math.inf)
+
+    def price_of_nth(self, n: int) -> float:
+        """Price of the *n*-th cheapest row (the dearest if there are fewer)."""
+        head = np.concatenate([p[:n] for p in self.prices] or [np.empty(0)])
+        if not len(head):
+            return math.inf
+        k = min(n, len(head)) - 1
+        return float(np.partition(head, k)[k])
+
+    def available(self, cap: float) -> np.ndarray:
+        """Rows of each array priced at most *cap*."""
+        return np.array([np.searchsorted(p, cap, side="right") for p in self.prices], dtype=np.int64)
+
+    def draw(self, cap: float, rng: np.random.Generator) -> tuple[int, float] | None:
+        """A random ``(row, price)`` priced at most *cap*, or None."""
+        counts = self.available(cap)
+        mass   = np.cumsum(self.weights * counts)
+        if not len(mass) or mass[-1] <= 0:
+            return None
+        seg = int(np.searchsorted(mass, rng.random() * mass[-1], side="right"))
+        seg = min(seg, len(mass) - 1)
+        i   = int(rng.integers(counts[seg]))
+        return int(self.rows[seg][i]), float(self.prices[seg][i])
+
+    def cheapest_except(self, cap: float, exclude: Container[int]) -> tuple[int, float] | None:
+        """The cheapest ``(row, price)`` priced at most *cap* not in *exclude*."""
+        best = None
+        for rows, prices, n in zip(self.rows, self.prices, self.available(cap)):
+            for i in range(min(int(n), len(exclude) + 1)):
+                if int(rows[i]) not in exclude:
+                    if best is None or prices[i] < best[1]:
+                        best = (int(rows[i]), float(prices[i]))
+                    break
+        return best
+
+
+def slot_cap(remaining: float, slots_left: int, cheapest: float) -> float:
+    """Most the next of *slots_left* slots may cost out of *remaining*."""
+    if math.isinf(remaining):
+        return math.inf
+    reserve = remaining - (slots_left - 1) * cheapest
+    return max(min(remaining / slots_left * BUDGET_SLACK, reserve), cheapest)
+
+
+def pack(
+    pool: PricedPool, budget: float | None, slots: int, rng: np.random.Generator,
+    recent: Container[int] = (), recent_weight: float = 1.0, distinct: int | None = None,
+    ceiling: float = math.inf,
+) -> tuple[np.ndarray, float]:
+    """Pick *slots* rows from *pool* within *budget* (None = unlimited),
+    none priced above *ceiling*.
+
+    Rows in *recent* are kept with probability *recent_weight* and redrawn
+    otherwise, for up to ``MAX_DRAWS`` redraws. A row is not repeated
+    within each run of *distinct* slots (default: all of them): a slot's
+    cap never drops below the price of the *distinct*-th cheapest row, so
+    that many rows are always eligible, and when redraws keep hitting taken
+    rows the cheapest untaken one is used. That floor can take the total
+    over *budget* (or a slot over *ceiling*) when the budget is too tight.
+
+    Returns the rows and their total price.
+    """
+    distinct  = distinct or slots
+    remaining = math.inf if budget is None else float(budget)
+    cheapest  = pool.cheapest
+    floor     = pool.price_of_nth(distinct)
+    chosen: list[int] = []
+    spent = 0.0
+    for slot in range(slots):
+        cap   = max(min(slot_cap(remaining, slots - slot, cheapest), ceiling), floor)
+        taken = chosen[slot - slot % distinct:]
+        for _ in range(MAX_DRAWS):
+            row, price = pool.draw(cap, rng)
+            if row in taken:
+                continue
+            if row in recent and rng.random() >= recent_weight:
+                continue
+            break
+        else:
+            if row in taken:
+                row, price = pool.cheapest_except(cap, taken) or (row, price)
+        chosen.append(row)
+        spent     += price
+        remaining -= price
+    return np.array(chosen, dtype=np.int32), spent
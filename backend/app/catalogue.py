@@ -0,0 +1,152 @@
+"""
+Columnar recipe catalogue.
+
+The plan and swap pipeline reads the catalogue on every request, so it is
+kept as one contiguous NumPy array per column instead of a DataFrame:
+selecting a pool is an index lookup, and gathering the 21 sampled rows
+touches 21 elements per column without building frames or Series.
+
+Names are interned: each distinct name is stored once in ``names`` and
+rows refer to it by an ``int32`` id. Row ids are ``int32`` positions into
+the columns. ``Recipe`` is a ``__slots__`` view of one row.
+
+pandas is only used to build a catalogue (``from_frame``) and to convert
+one back for tooling (``frame``).
+"""
+from __future__ import annotations
+
+# ---------- stdlib ---------------------------------------------------------
+import hashlib
+import sys
+from   typing import Sequence
+
+# ---------- 3rd-party ------------------------------------------------------
+import numpy as np
+import pandas as pd
+
+# ---------- local ----------------------------------------------------------
+from   app.serialization import MEAL_FIELDS, meal_dict
+
+# ---------------------------------------------------------------------------
+# Columns
+# ---------------------------------------------------------------------------
+
+COLUMNS = ("name", "calories", "protein", "carbs", "fat", "price", "cluster")
+NUMERIC = ("calories", "protein", "carbs", "fat", "price")
+
+ROW_DTYPE = np.int32
+_DTYPES = {
+    # calories are served as integers, so they are truncated once on load
+    "calories": np.int32,
+    "protein":  np.float64,
+    "carbs":    np.float64,
+    "fat":      np.float64,
+    "price":    np.float64,
+    "cluster":  np.int32,
+}
+
+
+class RecipeCatalogue:
+    """Immutable column arrays of a recipe catalogue."""
+
+    __slots__ = ("names", "name_id", "calories", "protein", "carbs", "fat", "price", "cluster")
+
+    def __init__(self, names: np.ndarray, name_id: np.ndarray, **columns: np.ndarray):
+        self.names   = names                  # object array of distinct names
+        self.name_id = name_id                # int32 index into ``names`` per row
+        for field, dtype in _DTYPES.items():
+            setattr(self, field, np.ascontiguousarray(columns[field], dtype=dtype))
+        for arr in (self.names, self.name_id, *(getattr(self, f) for f in _DTYPES)):
+            arr.flags.writeable = False       # shared between requests (and workers)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "RecipeCatalogue":
+        """Build from a DataFrame with ``COLUMNS`` (e.g. ``recipes_with_clusters.csv``)."""
+        codes, uniques = pd.factorize(df["name"], use_na_sentinel=False)
+        names = np.array([str(n) for n in uniques], dtype=object)
+        columns = {f: df[f].to_numpy(dtype=float) for f in NUMERIC}
+        columns["calories"] = np.trunc(np.nan_to_num(columns["calories"]))
+        columns["cluster"]  = df["cluster"].to_numpy()
+        return cls(names, codes.astype(ROW_DTYPE), **columns)
+
+    @classmethod
+    def empty(cls) -> "RecipeCatalogue":
+        return cls.from_frame(pd.DataFrame({c: [] for c in COLUMNS}))
+
+    def frame(self) -> pd.DataFrame:
+        """The catalogue as a DataFrame (tooling and tests, not the request path)."""
+        return pd.DataFrame({c: self[c] for c in COLUMNS})
+
+    def take(self, rows: Sequence[int]) -> "RecipeCatalogue":
+        """A new catalogue of *rows*, sharing the name table."""
+        rows = np.asarray(rows, dtype=ROW_DTYPE)
+        return RecipeCatalogue(
+            self.names, self.name_id[rows], **{f: getattr(self, f)[rows] for f in _DTYPES})
+
+    # -- access --------------------------------------------------------------
+
+    def __len__(self) -> int:
+        return len(self.name_id)
+
+    def __getitem__(self, field: str) -> np.ndarray:
+        """Column *field*; ``"name"`` materialises one string per row."""
+        if field == "name":
+            return self.names[self.name_id]
+        if field in _DTYPES:
+            return getattr(self, field)
+        raise KeyError(field)
+
+    @property
+    def mean_price(self) -> float:
+        return float(self.price.mean()) if len(self) else 0.0
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by the columns and the name table."""
+        arrays = (self.name_id, *(getattr(self, f) for f in _DTYPES))
+        return (sum(a.nbytes for a in arrays) + self.names.nbytes
+                + sum(sys.getsizeof(n) for n in self.names))
+
+    def fingerprint(self) -> str:
+        """Digest of the names and every column: equal catalogues (e.g. the
+        same file loaded by another process or release) give the same one."""
+        h = hashlib.sha1("\0".join(self.names.tolist()).encode())
+        for arr in (self.name_id, *(getattr(self, f) for f in _DTYPES)):
+            h.update(arr.tobytes())
+        return h.hexdigest()[:16]
+
+    def recipe(self, row: int) -> "Recipe":
+        return Recipe(self, row)
+
+    def meals(self, rows: Sequence[int]) -> list[dict]:
+        """``meal_dict`` for each of *rows* (gathers only those rows)."""
+        rows = np.asarray(rows, dtype=ROW_DTYPE)
+        cols = [self.names[self.name_id[rows]].tolist()]
+        cols += [getattr(self, f)[rows].tolist() for f in MEAL_FIELDS[1:]]
+        return [meal_dict(*values) for values in zip(*cols)]
+
+
+class Recipe:
+    """One catalogue row, read lazily from the columns."""
+
+    __slots__ = ("catalogue", "row")
+
+    def __init__(self, catalogue: RecipeCatalogue, row: int):
+        self.catalogue = catalogue
+        self.row       = int(row)
+
+    @property
+    def name(self) -> str:
+        c = self.catalogue
+        return c.names[c.name_id[self.row]]
+
+    def __getattr__(self, field: str):
+        if field in _DTYPES:
+            return getattr(self.catalogue, field)[self.row].item()
+        raise AttributeError(field)
+
+    def meal(self) -> dict:
+        return meal_dict(*(getattr(self, f) for f in MEAL_FIELDS))
+
+    def __repr__(self) -> str:
+        return f"Recipe({self.row}, {self.name!r})"
@@ -0,0 +1,84 @@
+"""
+Response compression (brotli preferred, gzip fallback).
+
+Built on Starlette's GZip responders, so small bodies, already-encoded
+responses and ``text/event-stream`` pass through untouched. Levels are
+tuned for the 1–20 KiB JSON documents this API returns: beyond gzip 5 /
+brotli 5 the ratio on such bodies barely moves while CPU time keeps
+growing, and a 256 KiB brotli window is plenty for them.
+"""
+from __future__ import annotations
+
+# ---------- 3rd-party ------------------------------------------------------
+from   starlette.datastructures import Headers
+from   starlette.middleware.gzip import GZipResponder, IdentityResponder
+from   starlette.types import ASGIApp, Receive, Scope, Send
+
+try:                                    # optional: brotli is preferred when present
+    import brotli
+except ImportError:                     # pragma: no cover - depends on env
+    brotli = None
+
+MINIMUM_SIZE   = 1024   # bytes; below this the headers cost more than we save
+GZIP_LEVEL     = 5
+BROTLI_QUALITY = 5
+BROTLI_LGWIN   = 18
+
+
+class BrotliResponder(IdentityResponder):
+    content_encoding = "br"
+
+    def __init__(self, app: ASGIApp, minimum_size: int, quality: int) -> None:
+        super().__init__(app, minimum_size)
+        self.compressor = brotli.Compressor(
+            mode=brotli.MODE_TEXT, quality=quality, lgwin=BROTLI_LGWIN
+        )
+
+    def apply_compression(self, body: bytes, *, more_body: bool) -> bytes:
+        out = self.compressor.process(body)
+        return out + (self.compressor.flush() if more_body else self.compressor.finish())
+
+
+def _accepted(accept_encoding: str) -> set[str]:
+    """Codings listed in Accept-Encoding, minus any sent with ``q=0``."""
+    codings = set()
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q=") and float(q[2:] or 0) == 0:
+            continue
+        if coding:
+            codings.add(coding.strip().lower())
+    return codings
+
+
+class CompressionMiddleware:
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = MINIMUM_SIZE,
+        gzip_level: int = GZIP_LEVEL,
+        brotli_quality: int = BROTLI_QUALITY,
+    ) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            accepted = _accepted(Headers(scope=scope).get("accept-encoding", ""))
+        except ValueError:              # malformed q-value: don't compress
+            accepted = set()
+
+        if brotli is not None and "br" in accepted:
+            responder = BrotliResponder(self.app, self.minimum_size, self.brotli_quality)
+        elif "gzip" in accepted:
+            responder = GZipResponder(self.app, self.minimum_size, compresslevel=self.gzip_level)
+        else:
+            responder = self.app
+        await responder(scope, receive, send)
@@ -1,42 +1,105 @@
 from __future__ import annotations
 
 # ---------- stdlib ---------------------------------------------------------
+import hashlib
 import json
-import random
+import logging
+import math
+import os
+import re
 from   datetime import datetime, timezone
+from   typing   import Callable
 
 # ---------- 3rd-party ------------------------------------------------------
 import joblib
 import numpy  as np
 import pandas as pd
 from   sqlalchemy import (
-    create_engine, Column, Integer, Float, String,
-    DateTime, Boolean
+    bindparam, create_engine, func, inspect, select, text, Column, Integer,
+    Float, String, DateTime, Boolean
 )
+from   sqlalchemy.engine import Engine, make_url
 from   sqlalchemy.orm  import sessionmaker, declarative_base
+from   sqlalchemy.orm.attributes import flag_modified
+from   sqlalchemy.pool import StaticPool
 from   sqlalchemy.types import TypeDecorator, TEXT
 
+# ---------- local ----------------------------------------------------------
+from   app import energy
+from   app.budget import BUDGET_SLACK, PricedPool, pack, slot_cap
+from   app.catalogue import ROW_DTYPE, RecipeCatalogue
+from   app.history import HISTORY_WEIGHT, history as meal_history
+from   app.metrics import PLAN_POOLS, PLAN_STAGE_SECONDS, StageTimer, instrument_sqlalchemy
+from   app.serialization import (
+    MEAL_FIELDS, FragmentCache, dumps, meal_dict, render_plan
+)
+
+logger = logging.getLogger(__name__)
+
 # ---------------------------------------------------------------------------
 # DB INITIALISATION
 # ---------------------------------------------------------------------------
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./nutricart.db"
+# DATABASE_URL selects the primary (all writes); DATABASE_REPLICA_URL, when
+# set, serves read-only request paths (see ``get_read_db``).
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./nutricart.db")
+REPLICA_DATABASE_URL    = os.getenv("DATABASE_REPLICA_URL") or None
+
+DB_POOL_SIZE     = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW  = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_RECYCLE  = int(os.getenv("DB_POOL_RECYCLE", "1800"))   # seconds
+
+
+def normalize_url(url: str) -> str:
+    """Map ``postgres://`` / bare ``postgresql://`` URLs onto the psycopg 3
+    driver this project ships with."""
+    for prefix in ("postgres://", "postgresql://"):
+        if url.startswith(prefix):
+            return "postgresql+psycopg://" + url[len(prefix):]
+    return url
+
+
+def make_engine(url: str) -> Engine:
+    """Engine with per-backend settings: SQLite connections may hop threads
+    (FastAPI runs sync endpoints on a pool), and an in-memory SQLite database
+    is one shared connection so every thread sees the same data; client-server
+    databases get a sized, pre-pinged, periodically recycled connection pool."""
+    url = normalize_url(url)
+    if url.startswith("sqlite"):
+        kwargs = {"connect_args": {"check_same_thread": False}}
+        if make_url(url).database in (None, "", ":memory:"):
+            kwargs["poolclass"] = StaticPool
+        return create_engine(url, **kwargs)
+    return create_engine(
+        url,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_pre_ping=True,
+        pool_recycle=DB_POOL_RECYCLE,
+    )
+
+
+engine      = make_engine(SQLALCHEMY_DATABASE_URL)
+read_engine = make_engine(REPLICA_DATABASE_URL) if REPLICA_DATABASE_URL else engine
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
-    connect_args={"check_same_thread": False}
-)
 SessionLocal = sessionmaker(
     autocommit=False, autoflush=False, bind=engine
 )
+ReadSessionLocal = sessionmaker(
+    autocommit=False, autoflush=False, bind=read_engine
+)
 Base = declarative_base()
 
+# time every statement on every engine (including test engines)
+instrument_sqlalchemy(Engine)
+
 # ---------------------------------------------------------------------------
 # Custom JSON type (works with SQLite which lacks native JSON)
 # ---------------------------------------------------------------------------
 
 class JSON(TypeDecorator):
     impl = TEXT  # store as TEXT
+    cache_ok = True  # stateless, so statements using it can be cached
 
     def process_bind_param(self, value, dialect):
         return json.dumps(value) if value is not None else None
@@ -56,8 +119,25 @@ class Profile(Base):
     weight               = Column(Float,   nullable=False)  # kg
     height               = Column(Float,   nullable=False)  # cm
     goal                 = Column(String,  nullable=False)  # maintain | lose | gain
+    sex                  = Column(String,  nullable=True)   # male | female
+    activity_level       = Column(String,  nullable=True)   # key of energy.ACTIVITY_FACTORS
     budget               = Column(Float,   nullable=True)   # weekly $ budget
     dietary_restrictions = Column(JSON,    nullable=True)   # list[str]
+    updated_at           = Column(
+        DateTime,
+        default=lambda: datetime.now(timezone.utc),
+        onupdate=lambda: datetime.now(timezone.utc),
+    )
+    # derived on write by ``derive_targets``; NULL until backfilled
+    bmr                  = Column(Float,   nullable=True)   # kcal / day
+    tdee                 = Column(Float,   nullable=True)   # kcal / day, goal applied
+    kcal_target          = Column(Float,   nullable=True)   # per meal
+    protein_target       = Column(Float,   nullable=True)   # g per meal
+    carbs_target         = Column(Float,   nullable=True)   # g per meal
+    fat_target           = Column(Float,   nullable=True)   # g per meal
+    avg_price_per_meal   = Column(Float,   nullable=True)   # $
+    cluster              = Column(Integer, nullable=True, index=True)
+    targets_version      = Column(String,  nullable=True)   # TARGETS_VERSION used
 
 
 class User(Base):
@@ -79,13 +159,30 @@ class User(Base):
     )
 
 
+class RefreshToken(Base):
+    """One row per issued refresh token (looked up by ``jti``).
+
+    Tokens minted from the same login share a ``family``; presenting a
+    token that was already rotated revokes the whole family.
+    """
+    __tablename__ = "refresh_tokens"
+
+    jti         = Column(String,   primary_key=True)
+    user_id     = Column(Integer,  nullable=False, index=True)
+    family      = Column(String,   nullable=False, index=True)
+    expires_at  = Column(DateTime, nullable=False, index=True)
+    revoked_at  = Column(DateTime, nullable=True)
+    replaced_by = Column(String,   nullable=True)
+    created_at  = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+
 class MealPlan(Base):
     __tablename__ = "mealPlans"
 
     id         = Column(Integer, primary_key=True, index=True)
     name       = Column(String, nullable=True)
-    user_id    = Column(Integer, nullable=True)
-    plan_json  = Column(JSON, nullable=True)
+    user_id    = Column(Integer, nullable=True, index=True)
+    plan_json  = Column(JSON, nullable=True)       # last served plan (``save_served_plan``)
     plan_ids   = Column(String, nullable=True)
     created_at = Column(DateTime, nullable=True)
 
@@ -113,6 +210,29 @@ class Contact(Base):
     created_at  = Column(DateTime, default=lambda: datetime.now(timezone.utc))
 
 
+class Job(Base):
+    """Background job run by ``app.jobs``. The row is the source of truth for
+    status and progress, so both survive worker restarts."""
+    __tablename__ = "jobs"
+
+    id               = Column(String,  primary_key=True)             # uuid4 hex
+    kind             = Column(String,  nullable=False)                # key of jobs.JOB_KINDS
+    params           = Column(JSON,    nullable=True)
+    status           = Column(String,  nullable=False, index=True)   # queued | running | succeeded | failed | cancelled
+    progress         = Column(Float,   nullable=False, default=0.0)  # 0 … 1
+    message          = Column(String,  nullable=True)
+    result           = Column(JSON,    nullable=True)
+    error            = Column(String,  nullable=True)
+    attempts         = Column(Integer, nullable=False, default=0)
+    owner            = Column(String,  nullable=True)                 # "host:pid" running it
+    cancel_requested = Column(Boolean, nullable=False, default=False)
+    created_by       = Column(Integer, nullable=True)                 # admin user id
+    created_at       = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    started_at       = Column(DateTime, nullable=True)
+    finished_at      = Column(DateTime, nullable=True)
+    heartbeat_at     = Column(DateTime, nullable=True)
+
+
 class Ingredient(Base):
     __tablename__ = "ingredients"
 
@@ -121,247 +241,790 @@ class Ingredient(Base):
     created_at = Column(DateTime, nullable=True)
 
 
+def _add_missing_columns(bind) -> None:
+    """Additive migration: ALTER TABLE ... ADD COLUMN for model columns that
+    an existing table does not have yet, then create any missing indexes."""
+    insp = inspect(bind)
+    with bind.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not insp.has_table(table.name):
+                continue
+            existing = {c["name"] for c in insp.get_columns(table.name)}
+            for col in table.columns:
+                if col.name not in existing:
+                    ddl = col.type.compile(dialect=bind.dialect)
+                    conn.execute(text(
+                        f'ALTER TABLE "{table.name}" ADD COLUMN "{col.name}" {ddl}'
+                    ))
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+
+
 def init_db() -> None:
-    """Create tables on first start-up."""
+    """Create tables on first start-up and add columns introduced since."""
     Base.metadata.create_all(bind=engine)
+    _add_missing_columns(engine)
+
+# ---------------------------------------------------------------------------
+# Profile upsert
+# ---------------------------------------------------------------------------
+
+PROFILE_FIELDS = (
+    "age", "weight", "height", "goal", "sex", "activity_level", "budget",
+    "dietary_restrictions",
+)
+TARGET_FIELDS  = (
+    "bmr", "tdee", "kcal_target", "protein_target", "carbs_target", "fat_target",
+    "avg_price_per_meal", "cluster", "targets_version",
+)
+UPSERT_CHUNK   = 500        # rows per statement (SQLite bound-parameter limit)
+
+# Called with the user ids whose profile was written, once the write is
+# committed; anything cached per user in the process drops it here.
+_profile_listeners: list[Callable[[list[int]], None]] = []
+
+
+def on_profile_change(fn: Callable[[list[int]], None]) -> Callable[[list[int]], None]:
+    _profile_listeners.append(fn)
+    return fn
+
+
+def profiles_changed(user_ids: list[int]) -> None:
+    """Run the ``on_profile_change`` listeners; call after committing."""
+    for fn in _profile_listeners:
+        fn(user_ids)
+
+
+# recently served rows were drawn from the old profile's pool
+on_profile_change(meal_history.forget)
+
+
+def _dialect_insert(bind):
+    name = bind.dialect.name if hasattr(bind, "dialect") else bind.get_bind().dialect.name
+    if name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    elif name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        raise NotImplementedError(f"profile upsert not supported on {name}")
+    return insert
+
+
+def upsert_profiles(db, rows: list[dict]) -> list:
+    """``INSERT ... ON CONFLICT (user_id) DO UPDATE ... RETURNING *`` for
+    *rows* (dicts with ``user_id`` + ``PROFILE_FIELDS``), one statement per
+    ``UPSERT_CHUNK`` rows. *db* is a Session or Connection; the caller
+    commits and then calls ``profiles_changed``. Returns the stored rows in
+    input order."""
+    insert = _dialect_insert(db)
+    table  = Profile.__table__
+    now    = datetime.now(timezone.utc)
+    out    = []
+    # one statement may not touch a row twice: last write per user wins
+    rows = list({r["user_id"]: r for r in rows}.values())
+    for start in range(0, len(rows), UPSERT_CHUNK):
+        batch = rows[start:start + UPSERT_CHUNK]
+        chunk = [
+            {"user_id": r["user_id"], **{f: r.get(f) for f in PROFILE_FIELDS},
+             **targets, "updated_at": now}
+            for r, targets in zip(batch, derive_targets(batch))
+        ]
+        stmt = insert(table).values(chunk)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.user_id],
+            set_={f: stmt.excluded[f] for f in (*PROFILE_FIELDS, *TARGET_FIELDS, "updated_at")},
+        ).returning(*table.c)
+        by_id = {row.user_id: row for row in db.execute(stmt)}
+        out.extend(by_id[r["user_id"]] for r in chunk)
+    return out
+
+
+def insert_users_ignore_existing(db, rows: list[dict]) -> list:
+    """``INSERT ... ON CONFLICT (email) DO NOTHING RETURNING id, email`` in
+    ``UPSERT_CHUNK``-row statements; the caller commits, so thousands of
+    users land in one transaction. Returns only the rows actually created."""
+    insert = _dialect_insert(db)
+    table  = User.__table__
+    now    = datetime.now(timezone.utc)
+    created = []
+    for start in range(0, len(rows), UPSERT_CHUNK):
+        chunk = [
+            {"is_active": True, "is_verified": False, "created_at": now, "updated_at": now, **r}
+            for r in rows[start:start + UPSERT_CHUNK]
+        ]
+        stmt = insert(table).values(chunk).on_conflict_do_nothing(
+            index_elements=[table.c.email]
+        ).returning(table.c.id, table.c.email)
+        created.extend(db.execute(stmt))
+    return created
+
+# ---------------------------------------------------------------------------
+# Dietary restriction keywords (matched case-insensitively against names)
+# ---------------------------------------------------------------------------
+
+RESTRICTION_KEYWORDS: dict[str, list[str]] = {
+    # Exclude common meat items
+    "vegetarian": [
+        'chicken', 'beef', 'pork', 'lamb', 'turkey', 'duck',
+        'bacon', 'sausage', 'meatball', 'steak', 'ham', 'salami',
+        'shrimp', 'salmon', 'cod', 'tuna', 'fish'
+    ],
+    # Exclude all animal products
+    "vegan": [
+        'chicken', 'beef', 'pork', 'lamb', 'turkey', 'duck',
+        'bacon', 'sausage', 'meatball', 'steak', 'ham', 'salami',
+        'shrimp', 'salmon', 'cod', 'tuna', 'fish',
+        'egg', 'milk', 'cheese', 'yogurt', 'butter', 'cream',
+        'mozzarella', 'cheddar', 'parmesan', 'feta', 'cottage cheese'
+    ],
+    # Exclude dairy products
+    "dairy-free": [
+        'milk', 'cheese', 'yogurt', 'butter', 'cream',
+        'mozzarella', 'cheddar', 'parmesan', 'feta', 'cottage cheese'
+    ],
+    # Exclude gluten-containing items
+    "gluten-free": [
+        'bread', 'pasta', 'spaghetti', 'noodles', 'wrap',
+        'sandwich', 'toast', 'waffle', 'pancake'
+    ],
+    # Exclude nuts
+    "nut-free": ['peanut', 'almond', 'walnut', 'cashew', 'pecan', 'nut'],
+    # Exclude pork and alcohol
+    "halal": ['pork', 'bacon', 'ham', 'wine', 'beer'],
+    # Basic kosher restrictions
+    "kosher": ['pork', 'bacon', 'ham', 'shrimp', 'lobster', 'crab'],
+}
+
+
+def _restriction_pattern(restrictions: list[str]) -> str | None:
+    """One alternation regex covering every keyword of *restrictions*."""
+    keywords = {
+        kw
+        for r in restrictions
+        for kw in RESTRICTION_KEYWORDS.get(r.lower(), [])
+    }
+    return "|".join(re.escape(kw) for kw in sorted(keywords)) or None
 
 # ---------------------------------------------------------------------------
 # ML artefacts & recipe catalogue
 # ---------------------------------------------------------------------------
 
-scaler  = joblib.load("scaler.pkl")               # fitted on 5 columns
-model   = joblib.load("meal_cluster_model.pkl")   # KMeans(n_clusters=10)
-recipes = pd.read_csv("recipes_with_clusters.csv")
+SCALER_PATH  = os.getenv("SCALER_PATH",  "scaler.pkl")                 # fitted on 5 columns
+MODEL_PATH   = os.getenv("MODEL_PATH",   "meal_cluster_model.pkl")     # KMeans(n_clusters=10)
+RECIPES_PATH = os.getenv("RECIPES_PATH", "recipes_with_clusters.csv")
 # columns: name calories protein carbs fat price cluster
 
+# Plans draw from the nearest cluster and up to PLAN_CLUSTER_K - 1 more whose
+# centroids are within PLAN_CLUSTER_RADIUS × the nearest one's distance.
+PLAN_CLUSTER_K      = int(os.getenv("PLAN_CLUSTER_K", "3"))
+PLAN_CLUSTER_RADIUS = float(os.getenv("PLAN_CLUSTER_RADIUS", "2.0"))
+
+scaler  = None
+model   = None
+recipes = RecipeCatalogue.empty()
+
+# Indexes over ``recipes``, rebuilt by ``use_catalogue``:
+#   CLUSTER_INDEX      cluster id  -> int32 array of row positions, by price
+#   CLUSTER_PRICES     cluster id  -> their prices (ascending)
+#   RESTRICTION_MASKS  restriction -> bool array, True = row is excluded
+#   CLUSTER_MASKS      cluster id  -> restriction -> the same, in CLUSTER_INDEX order
+CLUSTER_INDEX:     dict[int, np.ndarray] = {}
+CLUSTER_PRICES:    dict[int, np.ndarray] = {}
+CLUSTER_MASKS:     dict[int, dict[str, np.ndarray]] = {}
+RESTRICTION_MASKS: dict[str, np.ndarray] = {}
+CATALOGUE_VERSION = 0
+CATALOGUE_FINGERPRINT: str | None = None   # stable across processes, for ETags
+CATALOGUE_ERROR: str | None = None
+
+# Bump when the target formulas change, so stored targets become stale.
+TARGETS_FORMULA = 2
+# Fingerprint of everything stored profile targets depend on; rows whose
+# ``targets_version`` differs are recomputed on read and by the backfill.
+TARGETS_VERSION: str | None = None
+
+
+def _targets_version() -> str | None:
+    if scaler is None or model is None:
+        return None
+    h = hashlib.sha1(f"{TARGETS_FORMULA}:{energy.DEFAULT_FORMULA}".encode())
+    for a in (scaler.mean_, scaler.scale_, model.cluster_centers_):
+        h.update(np.ascontiguousarray(a, dtype=float).tobytes())
+    # budget-less profiles target the catalogue's mean price
+    h.update(repr(round(recipes.mean_price, 6)).encode())
+    return h.hexdigest()[:12]
+
+
+def use_catalogue(catalogue: RecipeCatalogue | pd.DataFrame) -> None:
+    """Install *catalogue* (or a DataFrame of its columns) as the recipe
+    catalogue and rebuild its indexes."""
+    global recipes, CLUSTER_INDEX, CLUSTER_PRICES, CLUSTER_MASKS, RESTRICTION_MASKS
+    global CATALOGUE_VERSION, CATALOGUE_FINGERPRINT, TARGETS_VERSION
+
+    if isinstance(catalogue, pd.DataFrame):
+        catalogue = RecipeCatalogue.from_frame(catalogue)
+    order = np.lexsort((catalogue.price, catalogue.cluster)).astype(ROW_DTYPE)
+    clusters, starts = np.unique(catalogue.cluster[order], return_index=True)
+    cluster_index = {
+        int(c): rows for c, rows in zip(clusters, np.split(order, starts[1:]))
+    }
+    cluster_prices = {c: catalogue.price[rows] for c, rows in cluster_index.items()}
+    # keywords are matched once per distinct name, then spread to the rows
+    names = pd.Series(catalogue.names, dtype=object)
+    masks = {
+        r: names.str.contains(_restriction_pattern([r]), case=False, na=False)
+                .to_numpy(dtype=bool)[catalogue.name_id]
+        for r in RESTRICTION_KEYWORDS
+    }
+
+    # per-cluster copies keep the diet filter on contiguous memory
+    cluster_masks = {
+        c: {r: mask[rows] for r, mask in masks.items()} for c, rows in cluster_index.items()
+    }
+
+    recipes, CLUSTER_INDEX, CLUSTER_PRICES, CLUSTER_MASKS, RESTRICTION_MASKS = (
+        catalogue, cluster_index, cluster_prices, cluster_masks, masks)
+    CATALOGUE_VERSION += 1
+    CATALOGUE_FINGERPRINT = catalogue.fingerprint()
+    TARGETS_VERSION = _targets_version()
+
+
+def load_catalogue(
+    scaler_path: str = SCALER_PATH,
+    model_path: str = MODEL_PATH,
+    recipes_path: str = RECIPES_PATH,
+) -> bool:
+    """Load the ML artefacts and recipe catalogue; False (and
+    ``CATALOGUE_ERROR`` set) if any of them cannot be read."""
+    global scaler, model, CATALOGUE_ERROR
+    try:
+        new_scaler  = joblib.load(scaler_path)
+        new_model   = joblib.load(model_path)
+        new_recipes = RecipeCatalogue.from_frame(pd.read_csv(recipes_path))
+    except Exception as exc:  # missing / corrupt artefact
+        CATALOGUE_ERROR = f"{type(exc).__name__}: {exc}"
+        logger.error("Failed to load meal catalogue: %s", CATALOGUE_ERROR)
+        return False
+
+    scaler, model = new_scaler, new_model
+    use_catalogue(new_recipes)
+    CATALOGUE_ERROR = None
+    return True
+
+
+def catalogue_ready() -> bool:
+    return scaler is not None and model is not None and len(recipes) > 0
+
+
+load_catalogue()
+
 # ---------------------------------------------------------------------------
 # Helper functions
 # ---------------------------------------------------------------------------
 
-def calculate_bmr(age: int, weight: float, height: float) -> float:
-    """Mifflin–St Jeor BMR (male)."""
-    return 10 * weight + 6.25 * height - 5 * age + 5
+def calculate_bmr(age: int, weight: float, height: float, sex: str | None = None) -> float:
+    """BMR of one profile (``energy.DEFAULT_FORMULA``; male if *sex* is unknown)."""
+    return float(energy.bmr(age, weight, height, sex))
 
 
-def adjust_tdee(bmr: float, goal: str) -> float:
-    """Apply sedentary multiplier and goal offset."""
-    tdee = bmr * 1.2
-    if goal == "lose":
-        tdee -= 500
-    elif goal == "gain":
-        tdee += 300
-    return tdee
+def adjust_tdee(bmr: float, goal: str, activity_level: str | None = None) -> float:
+    """Apply the activity multiplier (sedentary if unknown) and goal offset."""
+    return float(energy.tdee(bmr, activity_level, goal))
 
 
-def _py(v):
-    """Convert pandas / NumPy scalars to regular Python types."""
-    if pd.isna(v):
-        return None
-    if isinstance(v, (np.generic,)):
-        return v.item()
-    return v
+# ---------------------------------------------------------------------------
+# Derived profile targets (stored on the profile row)
+# ---------------------------------------------------------------------------
+
+def derive_targets(rows: list[dict], timer: StageTimer | None = None) -> list[dict]:
+    """``TARGET_FIELDS`` for each profile dict in *rows*.
+
+    Energy comes from ``app.energy`` (vectorised over the batch); per-meal
+    targets are a third of the daily energy split 30/40/30 across
+    protein/carbs/fat. The price target is the weekly budget over 21 meals,
+    else the catalogue's mean price. Scaling and the nearest-cluster search
+    run once for the whole batch. ``cluster`` is None until the ML
+    artefacts are loaded.
+    """
+    if not rows:
+        return []
+
+    def col(field):
+        return [r.get(field) for r in rows]
+
+    bmr  = energy.bmr(col("age"), col("weight"), col("height"), col("sex"))
+    tdee = energy.tdee(bmr, col("activity_level"), col("goal"))
+    mean_price = recipes.mean_price
+    budget = np.nan_to_num(np.array(col("budget"), dtype=float))    # None -> 0
+    features = np.column_stack([
+        *energy.meal_targets(tdee),
+        np.where(budget != 0, budget / 21, mean_price),
+    ])
+    if timer:
+        timer.lap("targets")
+
+    clusters: list = [None] * len(rows)
+    if scaler is not None and model is not None:
+        scaled = scaler.transform(features)
+        if timer:
+            timer.lap("scaling")
+        centres = model.cluster_centers_
+        dist = ((scaled[:, None, :] - centres[None, :, :]) ** 2).sum(axis=2)
+        clusters = dist.argmin(axis=1).tolist()
+        if timer:
+            timer.lap("cluster")
+
+    return [
+        {
+            "bmr": float(b), "tdee": float(t),
+            "kcal_target": float(f[0]), "protein_target": float(f[1]),
+            "carbs_target": float(f[2]), "fat_target": float(f[3]),
+            "avg_price_per_meal": float(f[4]), "cluster": c,
+            "targets_version": TARGETS_VERSION,
+        }
+        for b, t, f, c in zip(bmr, tdee, features, clusters)
+    ]
+
+
+def profile_targets(profile: dict, timer: StageTimer | None = None) -> dict:
+    """Targets stored with *profile*, recomputed when they are missing or
+    were derived from other artefacts / formulas."""
+    version = profile.get("targets_version")
+    if version is not None and version == TARGETS_VERSION:
+        if timer:
+            timer.lap("targets")
+        return {f: profile[f] for f in TARGET_FIELDS}
+    return derive_targets([profile], timer)[0]
+
+
+def _stale_targets():
+    table = Profile.__table__
+    return (table.c.targets_version.is_(None)) | (table.c.targets_version != TARGETS_VERSION)
+
+
+def count_stale_profiles(bind) -> int:
+    """Profiles ``backfill_profile_targets`` would update."""
+    with bind.connect() as conn:
+        return conn.scalar(select(func.count()).select_from(Profile).where(_stale_targets()))
+
+
+def backfill_profile_targets(
+    bind: Engine,
+    batch_size: int = 1000,
+    derive: Callable[[list[dict]], list[dict]] = derive_targets,
+    progress: Callable[[int], None] | None = None,
+) -> int:
+    """Recompute the targets of every profile whose ``targets_version`` is
+    not the current one, *batch_size* rows per transaction. Returns the
+    number of rows updated.
+
+    *derive* computes a batch's targets (e.g. on a process pool);
+    *progress* is called with the running total after every batch.
+    """
+    table = Profile.__table__
+    stmt  = table.update().where(table.c.user_id == bindparam("uid")).values(
+        {**{f: bindparam(f) for f in TARGET_FIELDS}, "updated_at": bindparam("now")})
+    stale = _stale_targets()
+
+    updated, last_id = 0, 0
+    while True:
+        with bind.begin() as conn:
+            rows = [dict(r._mapping) for r in conn.execute(
+                select(table).where(stale, table.c.user_id > last_id)
+                .order_by(table.c.user_id).limit(batch_size))]
+            if not rows:
+                return updated
+            now = datetime.now(timezone.utc)
+            conn.execute(stmt, [
+                {"uid": r["user_id"], **t, "now": now}
+                for r, t in zip(rows, derive(rows))
+            ])
+        last_id  = rows[-1]["user_id"]
+        updated += len(rows)
+        profiles_changed([r["user_id"] for r in rows])
+        if progress:
+            progress(updated)
+
+
+def profile_cluster_stats(db) -> list[dict]:
+    """Profiles per assigned cluster with their mean targets (one indexed
+    ``GROUP BY``); rows not yet backfilled are reported under ``None``."""
+    table = Profile.__table__
+    stmt = (
+        select(
+            table.c.cluster,
+            func.count().label("profiles"),
+            func.avg(table.c.tdee).label("avg_tdee"),
+            func.avg(table.c.avg_price_per_meal).label("avg_price_per_meal"),
+        )
+        .group_by(table.c.cluster)
+        .order_by(table.c.cluster)
+    )
+    return [dict(r._mapping) for r in db.execute(stmt)]
 
 
 def apply_dietary_restrictions(pool: pd.DataFrame, restrictions: list[str]) -> pd.DataFrame:
     """
     Apply dietary restriction filters intelligently.
+
+    Works on any DataFrame with a ``name`` column; for the loaded
+    catalogue ``cluster_pool`` uses the precomputed masks instead.
     """
     if not restrictions or pool.empty:
         return pool
-    
-    filtered = pool.copy()
-    
-    for restriction in restrictions:
-        restriction_lower = restriction.lower()
-        
-        if restriction_lower == "vegetarian":
-            # Exclude common meat items
-            meat_keywords = [
-                'chicken', 'beef', 'pork', 'lamb', 'turkey', 'duck',
-                'bacon', 'sausage', 'meatball', 'steak', 'ham', 'salami',
-                'shrimp', 'salmon', 'cod', 'tuna', 'fish'
-            ]
-            for keyword in meat_keywords:
-                filtered = filtered[~filtered.name.str.contains(keyword, case=False, na=False)]
-                
-        elif restriction_lower == "vegan":
-            # Exclude all animal products
-            animal_keywords = [
-                'chicken', 'beef', 'pork', 'lamb', 'turkey', 'duck',
-                'bacon', 'sausage', 'meatball', 'steak', 'ham', 'salami',
-                'shrimp', 'salmon', 'cod', 'tuna', 'fish',
-                'egg', 'milk', 'cheese', 'yogurt', 'butter', 'cream',
-                'mozzarella', 'cheddar', 'parmesan', 'feta', 'cottage cheese'
-            ]
-            for keyword in animal_keywords:
-                filtered = filtered[~filtered.name.str.contains(keyword, case=False, na=False)]
-                
-        elif restriction_lower == "dairy-free":
-            # Exclude dairy products
-            dairy_keywords = [
-                'milk', 'cheese', 'yogurt', 'butter', 'cream',
-                'mozzarella', 'cheddar', 'parmesan', 'feta', 'cottage cheese'
-            ]
-            for keyword in dairy_keywords:
-                filtered = filtered[~filtered.name.str.contains(keyword, case=False, na=False)]
-                
-        elif restriction_lower == "gluten-free":
-            # Exclude gluten-containing items
-            gluten_keywords = [
-                'bread', 'pasta', 'spaghetti', 'noodles', 'wrap',
-                'sandwich', 'toast', 'waffle', 'pancake'
-            ]
-            for keyword in gluten_keywords:
-                filtered = filtered[~filtered.name.str.contains(keyword, case=False, na=False)]
-                
-        elif restriction_lower == "nut-free":
-            # Exclude nuts
-            nut_keywords = ['peanut', 'almond', 'walnut', 'cashew', 'pecan', 'nut']
-            for keyword in nut_keywords:
-                filtered = filtered[~filtered.name.str.contains(keyword, case=False, na=False)]
-                
-        elif restriction_lower == "halal":
-            # Exclude pork and alcohol
-            haram_keywords = ['pork', 'bacon', 'ham', 'wine', 'beer']
-            for keyword in haram_keywords:
-                filtered = filtered[~filtered.name.str.contains(keyword, case=False, na=False)]
-                
-        elif restriction_lower == "kosher":
-            # Basic kosher restrictions
-            non_kosher_keywords = ['pork', 'bacon', 'ham', 'shrimp', 'lobster', 'crab']
-            for keyword in non_kosher_keywords:
-                filtered = filtered[~filtered.name.str.contains(keyword, case=False, na=False)]
-    
-    return filtered
+
+    pattern = _restriction_pattern(restrictions)
+    if pattern is None:
+        return pool.copy()
+    return pool[~pool.name.str.contains(pattern, case=False, na=False)]
+
+
+def cluster_pool(cluster: int, restrictions: list[str] | None) -> tuple[np.ndarray, np.ndarray]:
+    """Catalogue rows of *cluster* that satisfy *restrictions* and their
+    prices, cheapest first (index lookups only)."""
+    rows   = CLUSTER_INDEX.get(cluster, np.empty(0, dtype=ROW_DTYPE))
+    prices = CLUSTER_PRICES.get(cluster, np.empty(0))
+    masks  = CLUSTER_MASKS.get(cluster, {})
+    excluded = None
+    for r in restrictions or []:
+        mask = masks.get(r.lower())
+        if mask is not None:
+            excluded = mask if excluded is None else excluded | mask
+    if excluded is None:
+        return rows, prices
+    keep = ~excluded
+    return rows[keep], prices[keep]
+
+
+def cluster_blend(targets: dict) -> tuple[list, np.ndarray]:
+    """Clusters a profile's meals are drawn from and their weights.
+
+    The stored nearest cluster comes first with weight 1. Up to
+    ``PLAN_CLUSTER_K - 1`` runners-up follow when their centroid is at most
+    ``PLAN_CLUSTER_RADIUS`` times as far from the profile's scaled targets,
+    weighted by inverse distance; a profile close to its own centroid keeps
+    a single cluster.
+    """
+    nearest = targets["cluster"]
+    if PLAN_CLUSTER_K <= 1 or nearest is None or scaler is None or model is None:
+        return [nearest], np.ones(1)
+
+    x    = np.array([targets[f] for f in _TARGET_FIELDS], dtype=float)
+    x    = (x - scaler.mean_) / scaler.scale_
+    dist = np.sqrt(((model.cluster_centers_ - x) ** 2).sum(axis=1))
+    reach = dist[nearest] * PLAN_CLUSTER_RADIUS
+    clusters = [nearest] + [
+        int(c) for c in np.argsort(dist)[:PLAN_CLUSTER_K] if c != nearest and dist[c] <= reach
+    ][:PLAN_CLUSTER_K - 1]
+    if len(clusters) == 1:
+        return clusters, np.ones(1)
+    d = dist[clusters]
+    return clusters, d[0] / np.maximum(d, d[0])
+
+
+def plan_pool(
+    targets: dict, restrictions: list[str] | None, ceiling: float,
+    need: int, endpoint: str, timer: StageTimer | None = None,
+) -> PricedPool | None:
+    """Candidate rows for a plan or swap: one price-sorted array per
+    blended cluster (``cluster_blend``) after the diet filter, with the
+    per-row sampling weight of each array, so every cluster's share of the
+    picks follows its weight however many rows it has.
+
+    None when fewer than *need* rows cost at most *ceiling* (the caller
+    falls back to ``MEAL_CATALOG``). Counts into
+    ``nutricart_plan_pool_total`` whether the nearest cluster alone had
+    enough such rows, only the blend had, or neither.
+    """
+    clusters, shares = cluster_blend(targets)
+    pools = [cluster_pool(c, restrictions) for c in clusters]
+    if timer:
+        timer.lap("diet_filter")
+    pool = PricedPool(
+        [rows for rows, _ in pools], [prices for _, prices in pools],
+        [float(share) / max(len(rows), 1) for share, (rows, _) in zip(shares, pools)],
+    )
+    affordable = pool.available(ceiling)
+    if timer:
+        timer.lap("budget_filter")
+
+    if affordable[0] >= need:
+        outcome = "nearest"
+    elif affordable.sum() >= need:
+        outcome = "blended"
+    else:
+        outcome = "fallback"
+    PLAN_POOLS.inc(endpoint=endpoint, pool=outcome)
+    return None if outcome == "fallback" else pool
 
 # ---------------------------------------------------------------------------
 # MEAL-PLAN GENERATION
 # ---------------------------------------------------------------------------
 
+DAYS = ["Mon","Tue","Wed","Thu","Fri","Sat","Sun"]
+
+_rng = np.random.default_rng()
+_fragments = FragmentCache()
+
+def slot_ceiling(targets: dict) -> float:
+    """Most one meal may cost when nothing has been spent yet: the first
+    slot of a budgeted week, every slot of a budget-less one, and a swap."""
+    return targets["avg_price_per_meal"] * BUDGET_SLACK
+
+
+def sample_week(
+    pool: PricedPool, user_id: int | None, budget: float | None = None, record: bool = True,
+    ceiling: float = math.inf,
+) -> np.ndarray:
+    """7×3 rows from *pool* packed into the weekly *budget* (``app.budget``),
+    none priced above *ceiling*, meals recently served to *user_id*
+    ``HISTORY_WEIGHT`` times as likely as the rest. Pools of 21+ affordable
+    rows give a week without repeats, smaller ones three distinct meals per
+    day. With *record* the picks are added to the user's history."""
+    slots    = len(DAYS) * 3
+    recent   = set(meal_history.recent(user_id, CATALOGUE_VERSION).tolist())
+    first    = min(ceiling, math.inf if budget is None else slot_cap(budget, slots, 0.0))
+    distinct = slots if pool.available(first).sum() >= slots else 3
+    rows, _  = pack(pool, budget, slots, _rng, recent, HISTORY_WEIGHT, distinct, ceiling)
+    chosen   = rows.reshape(len(DAYS), 3)
+    if record and user_id is not None:
+        meal_history.record(user_id, CATALOGUE_VERSION, chosen)
+    return chosen
+
+
+def _select_plan(
+    profile: dict, timer: StageTimer,
+) -> tuple[dict, RecipeCatalogue | None, np.ndarray]:
+    """
+    Steps 1–5 of ``generate_meal_plan``.
+
+    Returns the response header, the catalogue the rows refer to (``None``
+    when falling back to ``MEAL_CATALOG``) and a 7×3 array of row positions.
+    The sampled meals go into the user's recent-meal history.
+    """
+    catalogue = recipes
+
+    # 1–3 ▸ energy, macro & price targets, nearest cluster ------------------
+    # stored with the profile on write; derived here only for stale rows
+    targets            = profile_targets(profile, timer)
+    weekly_budget      = profile.get("budget")
+
+    # 4 ▸ diet & budget filter over the nearest clusters ------------------
+    # precomputed cluster & restriction indexes; the first meal may cost
+    # BUDGET_SLACK × the per-meal price target
+    ceiling = slot_ceiling(targets)
+    pool = plan_pool(
+        targets, profile.get("dietary_restrictions", []),
+        ceiling, need=3, endpoint="plan", timer=timer,
+    )
+
+    # 5 ▸ budget packing, recently served meals down-weighted ---------------
+    # a weekly budget rolls savings forward; without one every slot keeps
+    # the first slot's ceiling
+    plan_budget = float(weekly_budget) if weekly_budget else None
+    per_slot    = ceiling if plan_budget is None else math.inf
+    if pool is not None:
+        chosen = sample_week(pool, profile["user_id"], plan_budget, ceiling=per_slot)
+    else:
+        # Fallback to static catalog with complete meal data
+        catalogue = None
+        rows, _   = pack(_STATIC_POOL, plan_budget, len(DAYS) * 3, _rng,
+                         distinct=3, ceiling=per_slot)
+        chosen    = rows.reshape(len(DAYS), 3)
+    timer.lap("sampling")
+
+    header = {
+        "user_id":              profile["user_id"],
+        "weekly_budget":        weekly_budget,
+        "avg_price_per_meal":   round(float(targets["avg_price_per_meal"]), 2),
+        "dietary_restrictions": profile.get("dietary_restrictions", []),
+        "summary":              plan_summary(catalogue, chosen, targets, weekly_budget),
+    }
+    timer.lap("summary")
+    return header, catalogue, chosen
+
+
 def generate_meal_plan(profile: dict) -> dict:
     """
     High-level steps
     ----------------
     1. Compute per-meal calorie & macro targets
     2. Include **price target** so scaler sees 5 features
-    3. Choose closest K-Means cluster
+    3. Choose closest K-Means cluster(s), blending neighbours near boundaries
     4. Filter pool by cluster, diet, and budget
     5. Sample three meals per day (fallback to static catalogue)
+    6. Serialise to plain Python types, with per-day / weekly totals
+       (``summary``)
+
+    Each stage is timed into ``nutricart_plan_stage_duration_seconds``.
     """
+    timer = StageTimer(PLAN_STAGE_SECONDS)
+    header, catalogue, chosen = _select_plan(profile, timer)
 
-    # 1 ▸ energy & macros ----------------------------------------------------
-    bmr  = calculate_bmr(profile["age"], profile["weight"], profile["height"])
-    tdee = adjust_tdee(bmr, profile["goal"])
+    # 6 ▸ serialization ------------------------------------------------------
+    if catalogue is None:
+        meals = [[_STATIC_MEALS[i] for i in day] for day in chosen.tolist()]
+    else:
+        meals = [catalogue.meals(day) for day in chosen]
+    weekly_plan = [{"day": day, "meals": m} for day, m in zip(DAYS, meals)]
+    timer.lap("serialization")
 
-    kcal_target     = tdee / 3
-    protein_target  = (0.30 * tdee / 4) / 3
-    carbs_target    = (0.40 * tdee / 4) / 3
-    fat_target      = (0.30 * tdee / 9) / 3
+    return {**header, "weekly_plan": weekly_plan}
 
-    # 2 ▸ price target -------------------------------------------------------
-    weekly_budget      = profile.get("budget")
-    avg_price_per_meal = (
-        weekly_budget / 21 if weekly_budget else recipes["price"].mean()
+
+def generate_meal_plan_json(profile: dict) -> bytes:
+    """``generate_meal_plan`` encoded as JSON bytes.
+
+    Meals come from per-row fragments cached for the current catalogue, so
+    the response is a concatenation of 21 pre-encoded byte strings.
+    """
+    timer = StageTimer(PLAN_STAGE_SECONDS)
+    header, catalogue, chosen = _select_plan(profile, timer)
+
+    if catalogue is None:
+        meals = [[_STATIC_FRAGMENTS[i] for i in day] for day in chosen.tolist()]
+    else:
+        meals = [_fragments.get(catalogue, day) for day in chosen.tolist()]
+    body = render_plan(header, DAYS, meals)
+    timer.lap("serialization")
+    return body
+
+# ---------------------------------------------------------------------------
+# Plan summary (totals & deviation from targets)
+# ---------------------------------------------------------------------------
+
+SUMMARY_FIELDS = ("calories", "protein", "carbs", "fat", "price")
+_TARGET_FIELDS = ("kcal_target", "protein_target", "carbs_target", "fat_target", "avg_price_per_meal")
+
+
+def _rows(values: np.ndarray, price_decimals: int = 2) -> list[dict]:
+    """Rows of *values* (n × 5) as rounded field dicts; non-finite -> None."""
+    out = np.round(values, 1)
+    out[:, -1] = np.round(values[:, -1], price_decimals)
+    return [
+        {f: (v if v == v else None) for f, v in zip(SUMMARY_FIELDS, row)}
+        for row in np.where(np.isfinite(out), out, np.nan).tolist()
+    ]
+
+
+def daily_targets(targets: dict) -> np.ndarray:
+    """Calories, macros and price per day from per-meal *targets*."""
+    return np.array([targets[f] for f in _TARGET_FIELDS], dtype=float) * energy.MEALS_PER_DAY
+
+
+def plan_summary(
+    catalogue: RecipeCatalogue | None, chosen: np.ndarray, targets: dict,
+    weekly_budget: float | None = None,
+) -> dict:
+    """Per-day and weekly totals of the 7×3 plan *chosen* and their
+    percentage deviation from the profile's daily targets.
+
+    Gathers the 21 sampled rows of each column (no per-meal Python work),
+    so totals match the meals the client receives.
+    """
+    if catalogue is None:
+        values = _STATIC_VALUES[chosen]
+    else:
+        # calories are stored truncated, like ``meal_dict`` serves them
+        values = np.stack([catalogue[f][chosen] for f in SUMMARY_FIELDS], axis=-1)
+        values = values.astype(float)
+    return _summarize(values, targets, weekly_budget)
+
+
+def summarize_meals(weekly_plan: list[dict], targets: dict, weekly_budget: float | None = None) -> dict:
+    """``plan_summary`` of a served ``weekly_plan`` (days of meal dicts)."""
+    values = np.array(
+        [[[m[f] for f in SUMMARY_FIELDS] for m in day["meals"]] for day in weekly_plan],
+        dtype=float,
     )
+    return _summarize(values, targets, weekly_budget)
+
 
-    target = np.array([[
-        kcal_target, protein_target, carbs_target, fat_target, avg_price_per_meal
-    ]])
-    scaled_target = scaler.transform(target)
-
-    # 3 ▸ nearest cluster ----------------------------------------------------
-    cluster = int(np.argmin([
-        np.linalg.norm(scaled_target - c) for c in model.cluster_centers_
-    ]))
-    pool = recipes[recipes.cluster == cluster].copy()
-
-    # 4a ▸ diet filter -------------------------------------------------------
-    pool = apply_dietary_restrictions(pool, profile.get("dietary_restrictions", []))
-
-    # 4b ▸ budget filter (±20 % wiggle) -------------------------------------
-    budget_ceiling = avg_price_per_meal * 1.20
-    pool = pool[pool.price <= budget_ceiling]
-
-    # 5 ▸ daily sampling -----------------------------------------------------
-    weekly_plan: list[dict] = []
-    for day in ["Mon","Tue","Wed","Thu","Fri","Sat","Sun"]:
-        if len(pool) >= 3:
-            chosen = pool.sample(3).to_dict("records")
-        else:
-            # Fallback to static catalog with complete meal data
-            chosen = random.sample(MEAL_CATALOG, 3)
-        
-        # Ensure all meals have complete nutrition data
-        meals = []
-        for m in chosen:
-            meal_dict = {
-                "name": str(m.get("name", "Unknown Meal")),
-                "calories": int(_py(m.get("calories", 500))),
-                "protein": float(_py(m.get("protein", 20))),
-                "carbs": float(_py(m.get("carbs", 50))),
-                "fat": float(_py(m.get("fat", 15))),
-                "price": float(_py(m.get("price", 8.00)))
-            }
-            meals.append(meal_dict)
-            
-        weekly_plan.append({
-            "day": day,
-            "meals": meals
-        })
+def _summarize(values: np.ndarray, targets: dict, weekly_budget: float | None) -> dict:
+    daily  = values.sum(axis=1)                                   # 7 × 5
+    totals = np.vstack([daily, daily.sum(axis=0)])                # days + week
+    target = daily_targets(targets)
+    scale  = np.append(np.ones(len(DAYS)), len(DAYS))[:, None]    # week = 7 days
+    with np.errstate(divide="ignore", invalid="ignore"):
+        deviation = (totals / (target * scale) - 1.0) * 100.0
 
+    (target_row,)  = _rows(target[None, :])
+    total_rows     = _rows(totals)
+    deviation_rows = _rows(deviation, price_decimals=1)
     return {
-        "user_id":              profile["user_id"],
-        "weekly_budget":        weekly_budget,
-        "avg_price_per_meal":   round(avg_price_per_meal, 2),
-        "dietary_restrictions": profile.get("dietary_restrictions", []),
-        "weekly_plan":          weekly_plan,
+        "target_per_day": target_row,
+        "days": [
+            {"day": day, "totals": t, "deviation_pct": d}
+            for day, t, d in zip(DAYS, total_rows, deviation_rows)
+        ],
+        "week": {"totals": total_rows[-1], "deviation_pct": deviation_rows[-1]},
+        "within_budget": bool(totals[-1, -1] <= weekly_budget) if weekly_budget else None,
     }
 
+# ---------------------------------------------------------------------------
+# Served plans  – what /plan_summary reports on
+# ---------------------------------------------------------------------------
+
+def served_plan(db, user_id: int) -> MealPlan | None:
+    """The plan last served to *user_id* (one row per user)."""
+    return db.query(MealPlan).filter(MealPlan.user_id == user_id).first()
+
+
+def save_served_plan(db, user_id: int, plan: dict) -> MealPlan:
+    """Keep *plan* (header, ``summary`` and ``weekly_plan``) as the plan
+    last served to *user_id*; the caller commits."""
+    row = served_plan(db, user_id)
+    if row is None:
+        row = MealPlan(user_id=user_id, name="last served")
+        db.add(row)
+    row.plan_json  = plan
+    row.created_at = datetime.now(timezone.utc)
+    flag_modified(row, "plan_json")         # also when *plan* was edited in place
+    return row
+
+
+def swap_served_meal(db, profile: dict, day_index: int, meal_index: int, meal: dict) -> MealPlan | None:
+    """Put *meal* into the user's served plan, as the client does, and
+    recompute its ``summary``. None when no plan was served or the slot
+    does not exist; the caller commits."""
+    row = served_plan(db, profile["user_id"])
+    if row is None:
+        return None
+    plan = row.plan_json
+    days = plan["weekly_plan"]
+    if not (0 <= day_index < len(days) and 0 <= meal_index < len(days[day_index]["meals"])):
+        return None
+    days[day_index]["meals"][meal_index] = meal
+    plan["summary"] = summarize_meals(days, profile_targets(profile), plan.get("weekly_budget"))
+    return save_served_plan(db, profile["user_id"], plan)
+
 # ---------------------------------------------------------------------------
 # ONE-MEAL PICKER  – used by /swap_meal
 # ---------------------------------------------------------------------------
 
 def pick_random_meal(profile: dict) -> dict:
     """Return ONE meal that fits the user's cluster, diet & budget."""
-    bmr  = calculate_bmr(profile["age"], profile["weight"], profile["height"])
-    tdee = adjust_tdee(bmr, profile["goal"])
-
-    target = np.array([[
-        tdee / 3,
-        (0.30 * tdee / 4) / 3,
-        (0.40 * tdee / 4) / 3,
-        (0.30 * tdee / 9) / 3,
-        (profile.get("budget") or recipes["price"].mean()) / 21,
-    ]])
-    cluster = int(np.argmin([
-        np.linalg.norm(scaler.transform(target) - c)
-        for c in model.cluster_centers_
-    ]))
-
-    pool = recipes[recipes.cluster == cluster].copy()
-
-    # Apply dietary restrictions
-    pool = apply_dietary_restrictions(pool, profile.get("dietary_restrictions", []))
-
-    # Apply budget filter
-    if profile.get("budget"):
-        pool = pool[pool.price <= profile["budget"] / 21]
-
-    if pool.empty:
+    catalogue = recipes
+    targets   = profile_targets(profile)
+    ceiling   = slot_ceiling(targets)                  # same cap as a plan's first slot
+
+    # Pool of the nearest clusters, dietary restrictions and budget applied
+    pool = plan_pool(
+        targets, profile.get("dietary_restrictions", []),
+        ceiling, need=1, endpoint="swap",
+    )
+
+    if pool is None:
         # Return a complete meal from the static catalog
-        choice = random.choice(MEAL_CATALOG)
-        return choice
+        (row,), _ = pack(_STATIC_POOL, None, 1, _rng, ceiling=ceiling)
+        return MEAL_CATALOG[row]
 
-    # Select a random meal and ensure all fields are present
-    m = pool.sample(1).iloc[0]
-    return {
-        "name":     str(m.get("name", "Unknown Meal")),
-        "calories": int(_py(m.get("calories", 500))),
-        "protein":  float(_py(m.get("protein", 20))),
-        "carbs":    float(_py(m.get("carbs", 50))),
-        "fat":      float(_py(m.get("fat", 15))),
-        "price":    float(_py(m.get("price", 8.00)))
-    }
+    # Same draw as one plan slot: meals served recently are less likely
+    user_id = profile.get("user_id")
+    recent  = set(meal_history.recent(user_id, CATALOGUE_VERSION).tolist())
+    (row,), _ = pack(pool, None, 1, _rng, recent, HISTORY_WEIGHT, ceiling=ceiling)
+    if user_id is not None:
+        meal_history.record(user_id, CATALOGUE_VERSION, [row])
+    return catalogue.recipe(row).meal()
 
 # ---------------------------------------------------------------------------
 # Static fallback catalogue - NOW WITH COMPLETE NUTRITION DATA
@@ -376,4 +1039,10 @@ MEAL_CATALOG = [
     {"name": "Protein Smoothie",            "calories": 250, "price": 5.50,  "protein": 20, "carbs": 10, "fat": 8},
     {"name": "Black Bean Tacos",            "calories": 410, "price": 6.00,  "protein": 22, "carbs": 40, "fat": 14},
     {"name": "Vegan Buddha Bowl",           "calories": 510, "price": 9.00,  "protein": 22, "carbs": 55, "fat": 18},
-]
\ No newline at end of file
+]
+
+# normalised copies used by the plan serialisers
+_STATIC_MEALS     = [meal_dict(*(m[f] for f in MEAL_FIELDS)) for m in MEAL_CATALOG]
+_STATIC_FRAGMENTS = [dumps(m) for m in _STATIC_MEALS]
+_STATIC_VALUES    = np.array([[m[f] for f in SUMMARY_FIELDS] for m in _STATIC_MEALS], dtype=float)
+_STATIC_POOL      = PricedPool.from_rows(np.arange(len(MEAL_CATALOG)), _STATIC_VALUES[:, -1])
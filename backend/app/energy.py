@@ -0,0 +1,117 @@
+"""
+Energy model: basal metabolic rate, daily energy expenditure and per-meal
+targets.
+
+Every function takes scalars or equally shaped NumPy arrays (one element
+per profile) and works element-wise, like a ufunc, so one request and a
+million-row batch recompute go through the same code::
+
+    b = bmr(age, weight, height, sex)                  # arrays in, array out
+    t = tdee(b, activity_level, goal)
+    kcal, protein, carbs, fat = meal_targets(t)
+
+Categorical inputs (sex, activity level, goal) may be strings, ``None``
+(unknown), arrays of either, or integer codes; they are mapped to codes
+with one hashing pass instead of a Python lookup per row. Unknown values fall
+back to the assumptions the app made before these inputs existed: male,
+sedentary, no goal offset.
+"""
+from __future__ import annotations
+
+# ---------- stdlib ---------------------------------------------------------
+import os
+
+# ---------- 3rd-party ------------------------------------------------------
+import numpy  as np
+import pandas as pd
+
+# ---------------------------------------------------------------------------
+# Parameters
+# ---------------------------------------------------------------------------
+
+SEXES = ("male", "female")              # index 0 is the fallback
+
+ACTIVITY_FACTORS = {                    # TDEE = BMR x factor (PAL); index 0 is the fallback
+    "sedentary":   1.2,
+    "light":       1.375,
+    "moderate":    1.55,
+    "active":      1.725,
+    "very_active": 1.9,
+}
+
+GOAL_OFFSETS = {                        # kcal / day; index 0 is the fallback
+    "maintain": 0.0,
+    "lose":     -500.0,
+    "gain":     300.0,
+}
+
+# BMR = w * weight(kg) + h * height(cm) + a * age(y) + c, per sex
+# (male row, female row)
+FORMULAS: dict[str, np.ndarray] = {
+    # Mifflin & St Jeor (1990)
+    "mifflin_st_jeor": np.array([
+        [10.0,   6.25,  -5.0,    5.0],
+        [10.0,   6.25,  -5.0, -161.0],
+    ]),
+    # Harris–Benedict, revised by Roza & Shizgal (1984)
+    "harris_benedict": np.array([
+        [13.397, 4.799, -5.677,  88.362],
+        [ 9.247, 3.098, -4.330, 447.593],
+    ]),
+}
+
+DEFAULT_FORMULA = os.getenv("ENERGY_FORMULA", "mifflin_st_jeor")
+if DEFAULT_FORMULA not in FORMULAS:
+    raise ValueError(f"unknown ENERGY_FORMULA: {DEFAULT_FORMULA!r}")
+
+MEALS_PER_DAY = 3
+# share of energy from each macro, and kcal per gram
+MACRO_SPLIT = {"protein": (0.30, 4.0), "carbs": (0.40, 4.0), "fat": (0.30, 9.0)}
+
+# ---------------------------------------------------------------------------
+# Vectorised evaluation
+# ---------------------------------------------------------------------------
+
+def encode(values, vocabulary) -> np.ndarray:
+    """Index of each value in *vocabulary*; unknown values and None map to 0,
+    integers (scalars, lists or arrays) are taken to be codes already.
+
+    Hashes the values once (``pd.factorize``), so the Python-level work is
+    per distinct value, not per row.
+    """
+    arr = np.asarray(values)
+    if arr.dtype.kind in "iu":
+        return arr
+    codes, uniques = pd.factorize(arr.astype(object).ravel())
+    index  = {v: i for i, v in enumerate(vocabulary)}
+    lookup = np.array([index.get(v, 0) for v in uniques] + [0], dtype=np.intp)
+    return lookup[codes].reshape(arr.shape)          # code -1 (None) -> last -> 0
+
+
+def bmr(age, weight, height, sex=None, formula: str = DEFAULT_FORMULA) -> np.ndarray:
+    """Basal metabolic rate in kcal/day."""
+    coef = FORMULAS[formula][encode(sex, SEXES)]          # (..., 4) per element
+    return (coef[..., 0] * np.asarray(weight, dtype=float)
+            + coef[..., 1] * np.asarray(height, dtype=float)
+            + coef[..., 2] * np.asarray(age, dtype=float)
+            + coef[..., 3])
+
+
+_ACTIVITY = np.array(list(ACTIVITY_FACTORS.values()))
+_OFFSETS  = np.array(list(GOAL_OFFSETS.values()))
+
+
+def tdee(bmr_kcal, activity_level=None, goal=None) -> np.ndarray:
+    """Daily energy target: BMR x activity factor + goal offset."""
+    factor = _ACTIVITY[encode(activity_level, ACTIVITY_FACTORS)]
+    offset = _OFFSETS[encode(goal, GOAL_OFFSETS)]
+    return np.asarray(bmr_kcal, dtype=float) * factor + offset
+
+
+def meal_targets(tdee_kcal) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Per-meal ``(kcal, protein g, carbs g, fat g)``."""
+    t = np.asarray(tdee_kcal, dtype=float)
+    return (t / MEALS_PER_DAY, *(
+        share * t / kcal_per_g / MEALS_PER_DAY
+        for share, kcal_per_g in MACRO_SPLIT.values()
+    ))
@@ -0,0 +1,182 @@
+"""
+Bulk export of the ``users`` and ``contacts`` tables.
+
+Rows are read with keyset pagination on ``id`` – every page is a short
+``WHERE id > :last ORDER BY id LIMIT :n`` query on its own connection, so
+no read transaction is held open for the whole export and memory stays
+constant regardless of table size.
+
+Usable from the admin API (see ``/admin/export/{table}``) or the command
+line::
+
+    python -m app.export users --format csv --since 2025-01-01 > users.csv
+"""
+from __future__ import annotations
+
+# ---------- stdlib ---------------------------------------------------------
+import argparse
+import csv
+import io
+import json
+import sys
+from   contextlib import nullcontext
+from   datetime import datetime, timezone
+from   typing   import Iterator, Optional
+
+# ---------- 3rd-party ------------------------------------------------------
+from   sqlalchemy        import select
+from   sqlalchemy.engine import Connection, Engine
+
+# ---------- local ----------------------------------------------------------
+from   app.database import engine, User, Contact
+
+# ---------------------------------------------------------------------------
+# Configuration
+# ---------------------------------------------------------------------------
+
+# table name -> (model, exported columns). Secrets (password hashes,
+# security answers) are never part of an export.
+EXPORTABLE = {
+    "users": (User, [
+        "id", "first_name", "last_name", "email",
+        "is_active", "is_verified", "created_at", "updated_at",
+    ]),
+    "contacts": (Contact, [
+        "id", "first_name", "last_name", "email",
+        "phone", "message", "sms_consent", "created_at",
+    ]),
+}
+
+FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv":    "text/csv",
+}
+
+DEFAULT_BATCH_SIZE = 1000
+CHUNK_BYTES        = 64 * 1024   # flush output roughly every 64 KiB
+
+# ---------------------------------------------------------------------------
+# Row iteration
+# ---------------------------------------------------------------------------
+
+def _naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Timestamps are stored as naive UTC; normalise aware inputs to match."""
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _page_connection(bind: Engine | Connection):
+    # an Engine lends a fresh connection per page; a Connection (e.g. a
+    # caller's open transaction) is reused and left open
+    return bind.connect() if isinstance(bind, Engine) else nullcontext(bind)
+
+
+def iter_rows(
+    bind: Engine | Connection,
+    table: str,
+    since: Optional[datetime] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> Iterator[dict]:
+    """Yield rows of *table* in ``id`` order, one page per connection."""
+    model, columns = EXPORTABLE[table]
+    cols  = [getattr(model, c) for c in columns]
+    since = _naive_utc(since)
+
+    last_id = 0
+    while True:
+        stmt = select(*cols).where(model.id > last_id)
+        if since is not None:
+            stmt = stmt.where(model.created_at >= since)
+        stmt = stmt.order_by(model.id).limit(batch_size)
+
+        seen = 0
+        with _page_connection(bind) as conn:
+            result = conn.execution_options(
+                stream_results=True, yield_per=batch_size
+            ).execute(stmt)
+            for row in result:
+                seen   += 1
+                last_id = row.id
+                yield dict(row._mapping)
+
+        if seen < batch_size:
+            return
+
+# ---------------------------------------------------------------------------
+# Encoders
+# ---------------------------------------------------------------------------
+
+def _jsonable(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _encode_ndjson(rows: Iterator[dict], columns: list[str]) -> Iterator[str]:
+    for row in rows:
+        yield json.dumps({c: _jsonable(row[c]) for c in columns}) + "\n"
+
+
+def _encode_csv(rows: Iterator[dict], columns: list[str]) -> Iterator[str]:
+    buf    = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(columns)
+    for row in rows:
+        writer.writerow([_jsonable(row[c]) for c in columns])
+        yield buf.getvalue()
+        buf.seek(0); buf.truncate()
+    yield buf.getvalue()
+
+
+def stream_export(
+    bind: Engine | Connection,
+    table: str,
+    fmt: str = "ndjson",
+    since: Optional[datetime] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> Iterator[bytes]:
+    """Encode *table* as NDJSON or CSV, yielding ~64 KiB byte chunks."""
+    if table not in EXPORTABLE:
+        raise ValueError(f"Unknown table: {table}")
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format: {fmt}")
+
+    _, columns = EXPORTABLE[table]
+    encode = _encode_csv if fmt == "csv" else _encode_ndjson
+    rows   = iter_rows(bind, table, since=since, batch_size=batch_size)
+
+    pending: list[str] = []
+    size = 0
+    for piece in encode(rows, columns):
+        pending.append(piece)
+        size += len(piece)
+        if size >= CHUNK_BYTES:
+            yield "".join(pending).encode()
+            pending, size = [], 0
+    if pending:
+        yield "".join(pending).encode()
+
+# ---------------------------------------------------------------------------
+# CLI
+# ---------------------------------------------------------------------------
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Export NutriCart tables.")
+    parser.add_argument("table", choices=sorted(EXPORTABLE))
+    parser.add_argument("--format", dest="fmt", choices=sorted(FORMATS), default="ndjson")
+    parser.add_argument("--since", type=datetime.fromisoformat, default=None,
+                        help="only rows created at/after this ISO timestamp")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("-o", "--output", default="-", help="output file (default: stdout)")
+    args = parser.parse_args(argv)
+
+    out = sys.stdout.buffer if args.output == "-" else open(args.output, "wb")
+    try:
+        for chunk in stream_export(engine, args.table, args.fmt, args.since, args.batch_size):
+            out.write(chunk)
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
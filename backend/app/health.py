@@ -0,0 +1,156 @@
+"""
+Liveness / readiness probes.
+
+``/healthz`` only proves the event loop answers. ``/readyz`` runs every
+registered check and is cached for ``READY_CACHE_SECONDS`` so that frequent
+probes from Docker / load balancers cost a dictionary lookup.
+
+Other modules add checks with::
+
+    @register_check("name")
+    def _check() -> tuple[bool, str]: ...
+
+Checks may be plain functions or coroutines; they must be cheap and must not
+raise (an exception is reported as a failed check).
+"""
+from __future__ import annotations
+
+# ---------- stdlib ---------------------------------------------------------
+import asyncio
+import inspect
+import time
+from   concurrent.futures import Future, ThreadPoolExecutor
+from   typing             import Awaitable, Callable, Union
+
+# ---------- 3rd-party ------------------------------------------------------
+import anyio.to_thread
+from   sqlalchemy import select
+
+# ---------- local ----------------------------------------------------------
+from   app import database
+from   app.auth import HASH_MAX_QUEUE, hashing_pool_load
+
+# ---------------------------------------------------------------------------
+# Configuration
+# ---------------------------------------------------------------------------
+
+READY_CACHE_SECONDS = 2.0   # how long a readiness verdict is reused
+DB_TIMEOUT_SECONDS  = 1.0   # upper bound for the DB round-trip probe
+
+CheckResult = tuple[bool, str]
+Check       = Callable[[], Union[CheckResult, Awaitable[CheckResult]]]
+
+_checks: dict[str, Check] = {}
+_cached: tuple[float, bool, dict] | None = None   # (expires_at, ready, checks)
+
+# set by the application lifespan once start-up work is done
+started = False
+
+
+def register_check(name: str):
+    def decorator(fn: Check) -> Check:
+        _checks[name] = fn
+        return fn
+    return decorator
+
+
+def invalidate() -> None:
+    """Drop the cached verdict (e.g. after reloading the catalogue)."""
+    global _cached
+    _cached = None
+
+
+async def readiness() -> tuple[bool, dict]:
+    """Return ``(ready, {check: {"ok": bool, "detail": str}})``."""
+    global _cached
+    now = time.monotonic()
+    if _cached is not None and _cached[0] > now:
+        return _cached[1], _cached[2]
+
+    results: dict[str, dict] = {}
+    for name, fn in _checks.items():
+        try:
+            outcome = fn()
+            if inspect.isawaitable(outcome):
+                outcome = await outcome
+            ok, detail = outcome
+        except Exception as exc:
+            ok, detail = False, f"{type(exc).__name__}: {exc}"
+        results[name] = {"ok": ok, "detail": detail}
+
+    ready = all(r["ok"] for r in results.values())
+    _cached = (time.monotonic() + READY_CACHE_SECONDS, ready, results)
+    return ready, results
+
+# ---------------------------------------------------------------------------
+# Built-in checks
+# ---------------------------------------------------------------------------
+
+@register_check("startup")
+def _check_startup() -> CheckResult:
+    return started, "lifespan complete" if started else "warming up"
+
+
+@register_check("catalogue")
+def _check_catalogue() -> CheckResult:
+    if database.catalogue_ready():
+        return True, f"{len(database.recipes)} recipes (v{database.CATALOGUE_VERSION})"
+    return False, database.CATALOGUE_ERROR or "catalogue not loaded"
+
+
+@register_check("indexes")
+def _check_indexes() -> CheckResult:
+    missing = set(database.RESTRICTION_KEYWORDS) - set(database.RESTRICTION_MASKS)
+    if not database.CLUSTER_INDEX or missing:
+        return False, "catalogue indexes not built"
+    return True, f"{len(database.CLUSTER_INDEX)} clusters"
+
+
+# Dedicated threads run DB probes so a hung database cannot eat the request
+# thread pool; one per engine, and while an engine's probe is outstanding no
+# new one starts for it.
+_db_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="readyz-db")
+_db_probes: dict[str, Future] = {}
+
+
+def _probe_db(engine) -> None:
+    with engine.connect() as conn:
+        conn.execute(select(database.User.id).limit(1))
+
+
+async def _probe(name: str, engine) -> CheckResult:
+    probe = _db_probes.get(name)
+    if probe is None or probe.done():
+        probe = _db_probes[name] = _db_executor.submit(_probe_db, engine)
+    try:
+        await asyncio.wait_for(asyncio.wrap_future(probe), DB_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        return False, f"no answer within {DB_TIMEOUT_SECONDS}s"
+    return True, "ok"
+
+
+@register_check("database")
+async def _check_database() -> CheckResult:
+    return await _probe("database", database.engine)
+
+
+@register_check("replica")
+async def _check_replica() -> CheckResult:
+    # reads are routed here, so a dead replica fails requests just the same
+    if database.read_engine is database.engine:
+        return True, "not configured (reads use the primary)"
+    return await _probe("replica", database.read_engine)
+
+
+@register_check("threadpool")
+def _check_threadpool() -> CheckResult:
+    # sync endpoints (login's bcrypt verify included) run on this pool
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    busy, total = limiter.borrowed_tokens, limiter.total_tokens
+    return busy < total, f"{busy}/{int(total)} threads busy"
+
+
+@register_check("hashing")
+def _check_hashing() -> CheckResult:
+    busy, queued, workers = hashing_pool_load()
+    return queued < HASH_MAX_QUEUE, f"{busy}/{workers} busy, {queued} queued"
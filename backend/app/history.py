@@ -0,0 +1,120 @@
+"""
+Per-user history of recently served meals.
+
+Plans and swaps record the catalogue rows they hand out; the samplers in
+``app.database`` make those rows ``MEAL_HISTORY_WEIGHT`` times as likely as
+the rest of the pool, so users stop seeing the same few recipes every week.
+
+Each user's history is a ring buffer of the last ``MEAL_HISTORY_SIZE`` row
+positions: one row of a preallocated ``int32`` matrix (about 170 bytes per
+user at the default size), recycled least-recently-used beyond
+``MEAL_HISTORY_MAX_USERS``. Rows are positions in the catalogue, so the
+whole history is dropped when a new catalogue is installed, and a user's
+when their profile changes (their pool is a different one).
+
+The history lives in the worker process, like the token cache and the
+in-memory rate limiter: with several workers each one sees the plans it
+served itself.
+"""
+from __future__ import annotations
+
+# ---------- stdlib ---------------------------------------------------------
+import os
+import threading
+from   collections import OrderedDict
+
+# ---------- 3rd-party ------------------------------------------------------
+import numpy as np
+
+# ---------------------------------------------------------------------------
+# Configuration
+# ---------------------------------------------------------------------------
+
+HISTORY_SIZE      = int(os.getenv("MEAL_HISTORY_SIZE", "42"))          # two weeks of meals
+HISTORY_WEIGHT    = float(os.getenv("MEAL_HISTORY_WEIGHT", "0.1"))     # odds of a recent meal vs a new one
+HISTORY_MAX_USERS = int(os.getenv("MEAL_HISTORY_MAX_USERS", "50000"))
+
+_EMPTY = np.empty(0, dtype=np.int32)
+
+
+class MealHistory:
+    """Ring buffers of recently served catalogue rows, keyed by user id."""
+
+    __slots__ = ("size", "max_users", "version", "_rows", "_next", "_slots", "_free", "_lock")
+
+    def __init__(self, size: int = HISTORY_SIZE, max_users: int = HISTORY_MAX_USERS):
+        self.size      = size
+        self.max_users = max_users
+        self.version   = None                 # catalogue version the rows refer to
+        self._rows: np.ndarray | None = None  # (max_users, size) int32, -1 = empty
+        self._next: np.ndarray | None = None  # write position per slot
+        self._slots: OrderedDict[int, int] = OrderedDict()   # user id -> slot, LRU order
+        self._free: list[int] = []            # slots of forgotten users
+        self._lock = threading.Lock()
+
+    def _reset(self, version) -> None:
+        self.version = version
+        self._slots.clear()
+        self._free.clear()
+        if self._rows is not None:
+            self._rows.fill(-1)
+            self._next.fill(0)
+
+    def recent(self, user_id: int, version) -> np.ndarray:
+        """Rows recently served to *user_id* (unordered, may repeat)."""
+        with self._lock:
+            slot = self._slots.get(user_id)
+            if slot is None or version != self.version:
+                return _EMPTY
+            rows = self._rows[slot]
+            return rows[rows >= 0]
+
+    def record(self, user_id: int, version, rows) -> None:
+        """Append *rows* (catalogue positions) to the user's ring buffer."""
+        rows = np.asarray(rows, dtype=np.int32).ravel()[-self.size:]
+        if self.size <= 0 or self.max_users <= 0 or not len(rows):
+            return
+        with self._lock:
+            if version != self.version:
+                self._reset(version)
+            if self._rows is None:            # allocated on first use, after fork
+                self._rows = np.full((self.max_users, self.size), -1, dtype=np.int32)
+                self._next = np.zeros(self.max_users, dtype=np.int32)
+
+            slot = self._slots.get(user_id)
+            if slot is not None:
+                self._slots.move_to_end(user_id)
+            else:
+                if self._free:
+                    slot = self._free.pop()
+                elif len(self._slots) < self.max_users:
+                    slot = len(self._slots)   # no free slots: all below are in use
+                else:                         # recycle the least recently used slot
+                    _, slot = self._slots.popitem(last=False)
+                    self._rows[slot] = -1
+                    self._next[slot] = 0
+                self._slots[user_id] = slot
+
+            start = int(self._next[slot])
+            self._rows[slot, (start + np.arange(len(rows))) % self.size] = rows
+            self._next[slot] = (start + len(rows)) % self.size
+
+    def forget(self, user_ids) -> None:
+        """Drop the histories of *user_ids*."""
+        with self._lock:
+            for user_id in user_ids:
+                slot = self._slots.pop(user_id, None)
+                if slot is not None:
+                    self._rows[slot] = -1
+                    self._next[slot] = 0
+                    self._free.append(slot)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._reset(None)
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+
+history = MealHistory()
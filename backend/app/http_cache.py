@@ -0,0 +1,67 @@
+"""
+Conditional GET helpers.
+
+Validators are derived from row timestamps (``User.updated_at``,
+``Profile.updated_at``) plus anything else the representation depends on,
+so endpoints can answer ``If-None-Match`` / ``If-Modified-Since`` with a 304
+right after the single row lookup they need anyway.
+"""
+from __future__ import annotations
+
+# ---------- stdlib ---------------------------------------------------------
+import hashlib
+from   datetime      import datetime, timezone
+from   email.utils   import format_datetime, parsedate_to_datetime
+from   typing        import Optional
+
+# ---------- 3rd-party ------------------------------------------------------
+from   fastapi import Request, Response
+
+# clients must revalidate, shared caches must not store per-user data
+CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(*parts, weak: bool = False) -> str:
+    digest = hashlib.sha1("|".join(map(str, parts)).encode()).hexdigest()[:20]
+    return f'W/"{digest}"' if weak else f'"{digest}"'
+
+
+def _as_utc(value: datetime) -> datetime:
+    # SQLite hands back naive datetimes that were written as UTC
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+def _strip_weak(tag: str) -> str:
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime]) -> bool:
+    """Weak comparison of ``If-None-Match``; ``If-Modified-Since`` only
+    when no ``If-None-Match`` was sent (RFC 9110 §13.2.2)."""
+    inm = request.headers.get("if-none-match")
+    if inm is not None:
+        if inm.strip() == "*":
+            return True
+        wanted = _strip_weak(etag)
+        return any(_strip_weak(t.strip()) == wanted for t in inm.split(","))
+
+    ims = request.headers.get("if-modified-since")
+    if ims and last_modified is not None:
+        try:
+            since = _as_utc(parsedate_to_datetime(ims))
+        except (TypeError, ValueError):
+            return False
+        # HTTP dates have second precision
+        return _as_utc(last_modified).replace(microsecond=0) <= since
+    return False
+
+
+def validator_headers(etag: str, last_modified: Optional[datetime]) -> dict[str, str]:
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(_as_utc(last_modified), usegmt=True)
+    return headers
+
+
+def not_modified(etag: str, last_modified: Optional[datetime]) -> Response:
+    return Response(status_code=304, headers=validator_headers(etag, last_modified))
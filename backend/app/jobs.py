@@ -0,0 +1,514 @@
+"""
+In-process background jobs.
+
+Work that would outlive an HTTP request (regenerating stored profile
+targets, table exports, retraining the meal clusters) is queued as a row in
+``jobs`` and executed by the ``JobRunner`` that the application lifespan
+starts and drains:
+
+* the runner is one asyncio task per worker process. It claims queued rows
+  with a conditional ``UPDATE``, so several gunicorn workers (or hosts) can
+  share one queue without running a job twice;
+* job functions run on a small thread pool (``JOB_CONCURRENCY``) and hand
+  CPU-bound steps to a process pool (``JOB_PROCESSES``) with
+  ``ctx.run_cpu``, so the event loop keeps serving requests;
+* progress goes to in-process subscribers at once and to the row with every
+  heartbeat; ``watch`` (served as server-sent events by
+  ``/admin/jobs/{id}/events``) falls back to polling the row when the job
+  runs in another worker;
+* running jobs heartbeat every ``JOB_HEARTBEAT_SECONDS``. A row whose
+  heartbeat is older than ``JOB_STALE_SECONDS`` belonged to a worker that
+  died and is queued again (up to ``JOB_MAX_ATTEMPTS`` runs); a worker that
+  is shut down re-queues whatever it could not finish within
+  ``JOB_DRAIN_SECONDS``.
+
+Job kinds are plain functions registered with::
+
+    @job_kind("name")
+    def _run(ctx: JobContext, params: dict) -> dict: ...
+
+They should call ``ctx.progress`` regularly: that is where cancellation and
+shutdown take effect. Each must be safe to run again from the start.
+"""
+from __future__ import annotations
+
+# ---------- stdlib ---------------------------------------------------------
+import asyncio
+import concurrent.futures
+import logging
+import multiprocessing
+import os
+import socket
+import threading
+import time
+import uuid
+from   datetime import datetime, timedelta, timezone
+from   pathlib  import Path
+from   typing   import AsyncIterator, Callable, Optional
+
+# ---------- 3rd-party ------------------------------------------------------
+from   sqlalchemy        import select, update
+from   sqlalchemy.engine import Engine
+
+# ---------- local ----------------------------------------------------------
+from   app import database
+from   app.database import Job
+from   app.metrics import counter
+
+logger = logging.getLogger(__name__)
+
+# ---------------------------------------------------------------------------
+# Configuration
+# ---------------------------------------------------------------------------
+
+JOBS_ENABLED          = os.getenv("JOBS_ENABLED", "1") != "0"
+JOB_CONCURRENCY       = int(os.getenv("JOB_CONCURRENCY", "1"))      # jobs at once per worker
+JOB_PROCESSES         = int(os.getenv("JOB_PROCESSES", "1"))        # 0: CPU steps run inline
+JOB_POLL_SECONDS      = float(os.getenv("JOB_POLL_SECONDS", "2"))
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", "5"))
+JOB_STALE_SECONDS     = float(os.getenv("JOB_STALE_SECONDS", "60"))
+JOB_MAX_ATTEMPTS      = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_DRAIN_SECONDS     = float(os.getenv("JOB_DRAIN_SECONDS", "10"))  # below gunicorn's graceful_timeout
+JOB_INTERRUPT_SECONDS = 2.0     # then, for an interrupted job to reach ctx.progress
+JOB_OUTPUT_DIR        = Path(os.getenv("JOB_OUTPUT_DIR", "job_output"))
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = (
+    "queued", "running", "succeeded", "failed", "cancelled"
+)
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+JOBS_FINISHED = counter(
+    "nutricart_jobs_finished_total", "Background jobs finished, by kind and final status."
+)
+
+# ---------------------------------------------------------------------------
+# Job kinds
+# ---------------------------------------------------------------------------
+
+JobFunction = Callable[["JobContext", dict], Optional[dict]]
+JOB_KINDS: dict[str, JobFunction] = {}
+
+
+def job_kind(name: str):
+    def decorator(fn: JobFunction) -> JobFunction:
+        JOB_KINDS[name] = fn
+        return fn
+    return decorator
+
+
+class JobInterrupted(Exception):
+    """Raised inside a job by ``ctx.progress`` once it should stop."""
+
+
+class JobContext:
+    """Handle passed to a running job function (on a worker thread)."""
+
+    def __init__(self, runner: "JobRunner", row: dict):
+        self.runner   = runner
+        self.id       = row["id"]
+        self.row      = row
+        self.progress_value = row["progress"] or 0.0
+        self.message: Optional[str] = row["message"]
+        self.stop_reason: Optional[str] = None     # "cancelled" | "shutdown"
+
+    def progress(self, fraction: Optional[float] = None, message: Optional[str] = None) -> None:
+        """Report progress (0 … 1 and/or a message); raises ``JobInterrupted``
+        when the job was cancelled or the worker is shutting down."""
+        if fraction is not None:
+            self.progress_value = min(1.0, max(0.0, float(fraction)))
+        if message is not None:
+            self.message = message
+        self.runner._publish_soon(self)
+        self.check()
+
+    def check(self) -> None:
+        if self.stop_reason:
+            raise JobInterrupted(self.stop_reason)
+
+    def run_cpu(self, fn: Callable, *args):
+        """``fn(*args)`` on the job process pool (inline without one); *fn*
+        must be importable at module level. Interruptible while it waits."""
+        pool = self.runner.process_pool()
+        if pool is None:
+            return fn(*args)
+        try:
+            future = pool.submit(fn, *args)
+            while True:
+                try:
+                    return future.result(timeout=0.2)
+                except concurrent.futures.TimeoutError:
+                    if self.stop_reason:
+                        future.cancel()
+                        self.check()
+        except concurrent.futures.process.BrokenProcessPool:
+            self.runner.discard_process_pool(pool)      # next job gets a fresh one
+            raise
+
+    def output_path(self, suffix: str) -> Path:
+        """A file under ``JOB_OUTPUT_DIR`` named after this job."""
+        JOB_OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+        return JOB_OUTPUT_DIR / f"{self.id}{suffix}"
+
+    def snapshot(self) -> dict:
+        return {**self.row, "progress": self.progress_value, "message": self.message}
+
+# ---------------------------------------------------------------------------
+# Runner
+# ---------------------------------------------------------------------------
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _row(row) -> Optional[dict]:
+    return dict(row._mapping) if row is not None else None
+
+
+async def _wait(event: asyncio.Event, timeout: float) -> None:
+    """Wait until *event* is set or *timeout* passes. Unlike ``wait_for``
+    this never loses a cancellation that races with the event (Python 3.11)."""
+    waiter = asyncio.ensure_future(event.wait())
+    try:
+        await asyncio.wait({waiter}, timeout=timeout)
+    finally:
+        waiter.cancel()
+
+
+class JobRunner:
+    """Claims and runs queued jobs of one worker process; see module doc."""
+
+    def __init__(
+        self,
+        bind: Engine,
+        concurrency: int = JOB_CONCURRENCY,
+        processes: int = JOB_PROCESSES,
+    ):
+        self.bind        = bind
+        self.concurrency = concurrency
+        self.processes   = processes
+        self.owner       = None
+        self._table      = Job.__table__
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._main: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._running: dict[str, tuple[asyncio.Task, JobContext]] = {}
+        self._changed: dict[str, asyncio.Event] = {}
+        self._threads: Optional[concurrent.futures.ThreadPoolExecutor] = None
+        self._pool: Optional[concurrent.futures.ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+
+    # -- queue operations (blocking; call from threads) ---------------------
+
+    def submit(self, kind: str, params: Optional[dict] = None, created_by: Optional[int] = None) -> dict:
+        """Queue a job and return its row."""
+        if kind not in JOB_KINDS:
+            raise ValueError(f"Unknown job kind: {kind}")
+        row = {
+            "id": uuid.uuid4().hex, "kind": kind, "params": params or {},
+            "status": QUEUED, "progress": 0.0, "attempts": 0,
+            "cancel_requested": False, "created_by": created_by, "created_at": _now(),
+        }
+        with self.bind.begin() as conn:
+            conn.execute(self._table.insert().values(row))
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+        return self.get(row["id"])
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self.bind.connect() as conn:
+            return _row(conn.execute(select(self._table).where(self._table.c.id == job_id)).first())
+
+    def recent(self, status: Optional[str] = None, limit: int = 50) -> list[dict]:
+        stmt = select(self._table).order_by(self._table.c.created_at.desc()).limit(limit)
+        if status:
+            stmt = stmt.where(self._table.c.status == status)
+        with self.bind.connect() as conn:
+            return [_row(r) for r in conn.execute(stmt)]
+
+    def cancel(self, job_id: str) -> Optional[dict]:
+        """Cancel a queued job at once; ask a running one to stop (whichever
+        worker runs it sees the flag at its next heartbeat)."""
+        t = self._table
+        with self.bind.begin() as conn:
+            conn.execute(update(t).where(t.c.id == job_id, t.c.status == QUEUED)
+                         .values(status=CANCELLED, finished_at=_now()))
+            conn.execute(update(t).where(t.c.id == job_id, t.c.status == RUNNING)
+                         .values(cancel_requested=True))
+        local = self._running.get(job_id)
+        if local is not None:
+            local[1].stop_reason = CANCELLED
+        return self.get(job_id)
+
+    def _claim(self) -> Optional[dict]:
+        t, now = self._table, _now()
+        with self.bind.begin() as conn:
+            ids = conn.scalars(select(t.c.id).where(t.c.status == QUEUED)
+                               .order_by(t.c.created_at).limit(self.concurrency + 4)).all()
+            for job_id in ids:
+                # only one worker's UPDATE matches while the row is still queued
+                row = conn.execute(
+                    update(t).where(t.c.id == job_id, t.c.status == QUEUED)
+                    .values(status=RUNNING, owner=self.owner, attempts=t.c.attempts + 1,
+                            started_at=now, heartbeat_at=now, cancel_requested=False)
+                    .returning(*t.c)
+                ).first()
+                if row is not None:
+                    return _row(row)
+        return None
+
+    def _recover(self, own: bool = False) -> None:
+        """Re-queue (or fail, after ``JOB_MAX_ATTEMPTS``) running jobs whose
+        worker stopped heartbeating; with *own*, also those recorded under
+        this worker's name, which a previous process of the same host/pid
+        left behind."""
+        t, now = self._table, _now()
+        lost = t.c.heartbeat_at < now - timedelta(seconds=JOB_STALE_SECONDS)
+        if own:
+            lost = lost | (t.c.owner == self.owner)
+        lost = (t.c.status == RUNNING) & lost
+        with self.bind.begin() as conn:
+            conn.execute(update(t).where(lost, t.c.cancel_requested.is_(True))
+                         .values(status=CANCELLED, finished_at=now, owner=None))
+            conn.execute(update(t).where(lost, t.c.attempts < JOB_MAX_ATTEMPTS)
+                         .values(status=QUEUED, owner=None, message="re-queued after worker loss"))
+            conn.execute(update(t).where(lost)
+                         .values(status=FAILED, finished_at=now, owner=None,
+                                 error="worker lost; JOB_MAX_ATTEMPTS reached"))
+
+    def _heartbeat(self, ctx: JobContext) -> bool:
+        """Store progress and liveness; True if cancellation was requested."""
+        t = self._table
+        with self.bind.begin() as conn:
+            conn.execute(update(t).where(t.c.id == ctx.id, t.c.owner == self.owner)
+                         .values(heartbeat_at=_now(), progress=ctx.progress_value,
+                                 message=ctx.message))
+            return bool(conn.scalar(select(t.c.cancel_requested).where(t.c.id == ctx.id)))
+
+    def _finish(self, ctx: JobContext, **values) -> dict:
+        t = self._table
+        with self.bind.begin() as conn:
+            conn.execute(update(t).where(t.c.id == ctx.id, t.c.owner == self.owner)
+                         .values({"progress": ctx.progress_value, "message": ctx.message, **values}))
+        return self.get(ctx.id)
+
+    # -- process pool --------------------------------------------------------
+
+    def process_pool(self) -> Optional[concurrent.futures.ProcessPoolExecutor]:
+        """Created on first use. Children come from a fork server that has
+        ``app.database`` (and so the ML artefacts) imported once, instead
+        of being forked from this multi-threaded worker."""
+        if self.processes <= 0:
+            return None
+        with self._pool_lock:
+            if self._pool is None:
+                context = multiprocessing.get_context("forkserver")
+                context.set_forkserver_preload(["app.database"])
+                self._pool = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=self.processes, mp_context=context)
+            return self._pool
+
+    def discard_process_pool(self, pool: concurrent.futures.ProcessPoolExecutor) -> None:
+        with self._pool_lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    # -- lifecycle ------------------------------------------------------------
+
+    async def start(self) -> None:
+        self.owner   = f"{socket.gethostname()}:{os.getpid()}"   # after fork
+        self._loop   = asyncio.get_running_loop()
+        self._wake   = asyncio.Event()
+        self._stopping = False
+        self._threads = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.concurrency, thread_name_prefix="job")
+        await asyncio.to_thread(self._recover, True)
+        self._main = asyncio.create_task(self._claim_loop(), name="job-runner")
+
+    async def stop(self, timeout: float = JOB_DRAIN_SECONDS) -> None:
+        """Stop claiming, give running jobs *timeout* seconds, then interrupt
+        them at their next ``ctx.progress``; interrupted jobs go back to the
+        queue."""
+        if self._main is None:
+            return
+        # not cancelled: a claim in flight must reach ``_running`` to be drained
+        self._stopping = True
+        self._wake.set()
+        await self._main
+        self._main = None
+        if self._running:
+            tasks = [task for task, _ in self._running.values()]
+            _, pending = await asyncio.wait(tasks, timeout=timeout)
+            for _, ctx in self._running.values():
+                ctx.stop_reason = "shutdown"
+            if pending:
+                # a job that never reports progress cannot be interrupted;
+                # its row stays "running" until recovery re-queues it
+                _, stuck = await asyncio.wait(pending, timeout=JOB_INTERRUPT_SECONDS)
+                for task in stuck:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+        self._threads.shutdown(wait=False)
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+        self._loop = None
+
+    async def _claim_loop(self) -> None:
+        next_recovery = 0.0
+        while not self._stopping:
+            try:
+                if time.monotonic() >= next_recovery:
+                    await asyncio.to_thread(self._recover)
+                    next_recovery = time.monotonic() + JOB_STALE_SECONDS / 2
+                while len(self._running) < self.concurrency:
+                    row = await asyncio.to_thread(self._claim)
+                    if row is None:
+                        break
+                    ctx = JobContext(self, row)
+                    self._running[ctx.id] = (asyncio.create_task(self._execute(ctx)), ctx)
+            except Exception:           # database unavailable: retry next poll
+                logger.exception("job runner: claiming failed")
+            self._wake.clear()
+            await _wait(self._wake, JOB_POLL_SECONDS)
+
+    async def _execute(self, ctx: JobContext) -> None:
+        kind = ctx.row["kind"]
+        beat = asyncio.create_task(self._heartbeat_loop(ctx))
+        self._publish(ctx)
+        try:
+            fn = JOB_KINDS.get(kind)
+            if fn is None:
+                raise ValueError(f"Unknown job kind: {kind}")
+            result = await self._loop.run_in_executor(self._threads, fn, ctx, ctx.row["params"] or {})
+        except JobInterrupted as exc:
+            if str(exc) == CANCELLED:
+                final = dict(status=CANCELLED, finished_at=_now())
+            else:                       # shutdown: another worker / restart resumes it
+                final = dict(status=QUEUED, owner=None, message="re-queued at shutdown")
+        except Exception as exc:
+            logger.exception("job %s (%s) failed", ctx.id, kind)
+            final = dict(status=FAILED, finished_at=_now(), error=f"{type(exc).__name__}: {exc}")
+        else:
+            final = dict(status=SUCCEEDED, finished_at=_now(), result=result, progress=1.0)
+        finally:
+            beat.cancel()
+        row = await asyncio.to_thread(self._finish, ctx, **final)
+        JOBS_FINISHED.inc(kind=kind, status=final["status"])
+        del self._running[ctx.id]
+        ctx.row = row or {**ctx.row, **final}
+        self._publish(ctx)
+        self._wake.set()
+
+    async def _heartbeat_loop(self, ctx: JobContext) -> None:
+        while True:
+            await asyncio.sleep(JOB_HEARTBEAT_SECONDS)
+            try:
+                if await asyncio.to_thread(self._heartbeat, ctx):
+                    ctx.stop_reason = CANCELLED
+            except Exception:           # keep beating; a few misses are tolerated
+                logger.exception("job %s: heartbeat failed", ctx.id)
+
+    # -- progress streaming ----------------------------------------------------
+
+    def _publish(self, ctx: JobContext) -> None:
+        event = self._changed.pop(ctx.id, None)
+        if event is not None:
+            event.set()
+
+    def _publish_soon(self, ctx: JobContext) -> None:
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._publish, ctx)
+
+    async def watch(self, job_id: str, keepalive: float = 15.0) -> AsyncIterator[Optional[dict]]:
+        """Yield the job's state whenever it changes, until it has finished.
+
+        Jobs running in this process are followed as they report progress;
+        others are polled every ``JOB_POLL_SECONDS``. ``None`` is yielded
+        after *keepalive* seconds without a change.
+        """
+        last, idle = None, 0.0
+        try:
+            while True:
+                # set when this process starts, advances or finishes the job
+                changed = self._changed.setdefault(job_id, asyncio.Event())
+                local = self._running.get(job_id)
+                if local is not None:
+                    state = local[1].snapshot()
+                else:
+                    state = await asyncio.to_thread(self.get, job_id)
+                    if state is None:
+                        return
+                key = (state["status"], state["progress"], state["message"])
+                if key != last:
+                    last, idle = key, 0.0
+                    yield state
+                elif idle >= keepalive:
+                    idle = 0.0
+                    yield None
+                if state["status"] in FINISHED:
+                    return
+                t0 = time.monotonic()
+                await _wait(changed, JOB_POLL_SECONDS)
+                idle += time.monotonic() - t0
+        finally:
+            if job_id not in self._running:
+                self._changed.pop(job_id, None)
+
+
+runner = JobRunner(database.engine)
+
+# ---------------------------------------------------------------------------
+# Built-in kinds
+# ---------------------------------------------------------------------------
+
+@job_kind("backfill_targets")
+def _backfill_targets(ctx: JobContext, params: dict) -> dict:
+    """Recompute stale stored profile targets (``app.backfill`` as a job);
+    each batch's targets are derived on the process pool."""
+    total = database.count_stale_profiles(ctx.runner.bind)
+    ctx.progress(0.0, f"0/{total} profiles")
+    updated = database.backfill_profile_targets(
+        ctx.runner.bind,
+        batch_size=int(params.get("batch_size", 1000)),
+        derive=lambda rows: ctx.run_cpu(database.derive_targets, rows),
+        progress=lambda n: ctx.progress(n / max(total, 1), f"{n}/{total} profiles"),
+    )
+    return {"updated": updated, "targets_version": database.TARGETS_VERSION}
+
+
+@job_kind("export")
+def _export(ctx: JobContext, params: dict) -> dict:
+    """``app.export`` into a file under ``JOB_OUTPUT_DIR``."""
+    from app.export import FORMATS, stream_export
+    table, fmt = params.get("table", "users"), params.get("format", "ndjson")
+    since = params.get("since")
+    since = datetime.fromisoformat(since) if since else None
+    path, written = ctx.output_path(f".{fmt}"), 0
+    with open(path, "wb") as out:
+        for chunk in stream_export(ctx.runner.bind, table, fmt, since):
+            out.write(chunk)
+            written += len(chunk)
+            ctx.progress(message=f"{written} bytes")
+    return {"path": str(path), "bytes": written, "media_type": FORMATS[fmt]}
+
+
+@job_kind("retrain_clusters")
+def _retrain_clusters(ctx: JobContext, params: dict) -> dict:
+    """Refit the scaler and KMeans model on the process pool. Artefacts are
+    written under ``JOB_OUTPUT_DIR/<job id>/`` for review; point
+    ``SCALER_PATH`` / ``MODEL_PATH`` / ``RECIPES_PATH`` at them and run the
+    backfill to deploy."""
+    import train_model
+    out = ctx.output_path("")
+    out.mkdir(exist_ok=True)
+    ctx.progress(0.0, "training")
+    return ctx.run_cpu(
+        train_model.train,
+        os.getenv("TRAINING_DATA_PATH", train_model.INPUT_CSV),
+        str(out / "recipes_with_clusters.csv"),
+        str(out / "scaler.pkl"),
+        str(out / "meal_cluster_model.pkl"),
+        int(params.get("n_clusters", train_model.N_CLUSTERS)),
+    )
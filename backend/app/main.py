@@ -1,24 +1,40 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Request, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel, EmailStr, ConfigDict
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from datetime import timedelta
-from typing import Optional, List
+from datetime import datetime, timedelta
+from typing import Any, Optional, List, Literal
 from contextlib import asynccontextmanager
+import json
+import os
 
 from app.database import (
-    init_db, SessionLocal, Profile, User, Contact,
-    generate_meal_plan, pick_random_meal
+    init_db, Profile, User, Contact, upsert_profiles, insert_users_ignore_existing,
+    profiles_changed, generate_meal_plan_json, pick_random_meal, catalogue_ready,
+    profile_cluster_stats, save_served_plan, served_plan, swap_served_meal
 )
+from app import database
 from app.auth import (
-    authenticate_user, create_access_token,
-    get_password_hash, get_current_active_user,
-    get_db, get_user_by_email, ACCESS_TOKEN_EXPIRE_MINUTES,
-    update_user_password,
+    authenticate_user, issue_tokens, rotate_refresh_token,
+    revoke_refresh_family, prune_refresh_tokens, decode_refresh_token,
+    get_current_active_user, get_current_admin_user,
+    bulk_hash_limit, hash_password_async, hash_passwords_bulk,
+    get_db, get_read_db, get_user_by_email,
+    update_user_password, configure_password_hashing,
     save_security_questions, verify_security_answers,
     get_user_security_questions
 )
+from app.export import FORMATS, stream_export
+from app.metrics import REGISTRY, MetricsMiddleware
+from app.serialization import FastJSONResponse
+from app.compression import CompressionMiddleware
+from app.http_cache import make_etag, is_not_modified, not_modified, validator_headers
+from app.ratelimit import rate_limit
+from app import health, jobs, serialization, workers
 
 # ── Schemas ────────────────────────────────────────────────────────────────
 class ProfileCreate(BaseModel):
@@ -26,19 +42,47 @@ class ProfileCreate(BaseModel):
     weight: float
     height: float
     goal: str
+    sex: Optional[Literal["male", "female"]] = None
+    activity_level: Optional[Literal["sedentary", "light", "moderate", "active", "very_active"]] = None
     budget: Optional[float] = None
     dietary_restrictions: Optional[List[str]] = []
 
 class ProfileResponse(ProfileCreate):
     user_id: int
+    # derived on write; None for rows not yet backfilled
+    bmr: Optional[float] = None
+    tdee: Optional[float] = None
+    kcal_target: Optional[float] = None
+    protein_target: Optional[float] = None
+    carbs_target: Optional[float] = None
+    fat_target: Optional[float] = None
+    avg_price_per_meal: Optional[float] = None
+    cluster: Optional[int] = None
     model_config = ConfigDict(from_attributes=True)
 
+class ProfileImport(ProfileCreate):
+    user_id: int
+
+class ProfileImportResponse(BaseModel):
+    upserted: int
+    skipped_user_ids: list[int]  # no such user
+
+class ClusterStats(BaseModel):
+    cluster: Optional[int]       # None: targets not computed yet
+    profiles: int
+    avg_tdee: Optional[float]
+    avg_price_per_meal: Optional[float]
+
 class UserRegister(BaseModel):
     first_name: str
     last_name: str
     email: EmailStr
     password: str
 
+class BulkRegisterResponse(BaseModel):
+    created: list[dict]          # [{"id", "email"}]
+    existing_emails: list[str]
+
 class UserLogin(BaseModel):
     email: EmailStr
     password: str
@@ -46,6 +90,11 @@ class UserLogin(BaseModel):
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
+    expires_in: Optional[int] = None  # access token lifetime, seconds
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
 
 
 class ForgotPasswordRequest(BaseModel):
@@ -94,6 +143,24 @@ class ContactResponse(ContactCreate):
     id: int
     model_config = ConfigDict(from_attributes=True)
 
+class JobCreate(BaseModel):
+    kind: str                    # key of jobs.JOB_KINDS
+    params: dict = {}
+
+class JobResponse(BaseModel):
+    id: str
+    kind: str
+    params: Optional[dict] = None
+    status: str                  # queued | running | succeeded | failed | cancelled
+    progress: float
+    message: Optional[str] = None
+    result: Optional[Any] = None
+    error: Optional[str] = None
+    attempts: int
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
 # —— new schema for swapping one meal ——
 class SwapRequest(BaseModel):
     day_index:  int  # 0-based (Mon=0)
@@ -102,13 +169,25 @@ class SwapRequest(BaseModel):
 # ── App setup ──────────────────────────────────────────────────────────────
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    init_db()
+    if not workers.preforked:           # gunicorn's master did this (when_ready)
+        init_db()
+        configure_password_hashing()
+        with database.SessionLocal() as db:
+            prune_refresh_tokens(db)
+    if jobs.JOBS_ENABLED:
+        await jobs.runner.start()
+    health.started = True
+    health.invalidate()
     yield
+    health.started = False
+    health.invalidate()
+    await jobs.runner.stop()            # drain: unfinished jobs are re-queued
 
 app = FastAPI(
     title="NutriCart API",
     lifespan=lifespan,
     openapi_url="/openapi.json",
+    default_response_class=FastJSONResponse,
 )
 
 app.add_middleware(
@@ -119,28 +198,56 @@ app.add_middleware(
     allow_headers=["*"],
     expose_headers=["*"],
 )
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(MetricsMiddleware)
 
 @app.get("/")
 async def read_root():
     return {"message": "NutriCart backend up!"}
 
+@app.get("/healthz", include_in_schema=False)
+async def liveness():
+    return {"status": "ok"}
+
+@app.get("/readyz", include_in_schema=False)
+async def readiness():
+    ready, checks = await health.readiness()
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "not ready", "checks": checks},
+    )
+
+@app.get("/metrics", include_in_schema=False)
+def read_metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
 # ── Auth ───────────────────────────────────────────────────────────────────
-@app.post("/auth/register", response_model=UserResponse)
-def register_user(user: UserRegister, db: Session = Depends(get_db)):
-    if get_user_by_email(db, user.email):
+def _insert_user(db: Session, user: UserRegister, hashed_password: str):
+    """Single INSERT ... RETURNING; the unique index on ``email`` decides
+    duplicates, so concurrent sign-ups cannot both succeed."""
+    try:
+        row = db.execute(
+            insert(User.__table__).values(
+                first_name=user.first_name,
+                last_name=user.last_name,
+                email=user.email,
+                hashed_password=hashed_password,
+            ).returning(*User.__table__.c)
+        ).one()
+        db.commit()
+    except IntegrityError:
+        db.rollback()
         raise HTTPException(status_code=400, detail="Email already registered")
-    db_user = User(
-        first_name=user.first_name,
-        last_name=user.last_name,
-        email=user.email,
-        hashed_password=get_password_hash(user.password),
-    )
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
-    return db_user
+    return row
 
-@app.post("/auth/login", response_model=Token)
+@app.post("/auth/register", response_model=UserResponse)
+async def register_user(user: UserRegister, db: Session = Depends(get_db)):
+    # bcrypt runs on the hashing pool, the insert on the request thread pool
+    hashed = await hash_password_async(user.password)
+    return await run_in_threadpool(_insert_user, db, user, hashed)
+
+@app.post("/auth/login", response_model=Token,
+          dependencies=[Depends(rate_limit("login"))])
 def login_user(user: UserLogin, db: Session = Depends(get_db)):
     db_user = authenticate_user(db, user.email, user.password)
     if not db_user:
@@ -149,14 +256,35 @@ def login_user(user: UserLogin, db: Session = Depends(get_db)):
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    token = create_access_token(
-        {"sub": db_user.email},
-        timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES),
-    )
-    return {"access_token": token, "token_type": "bearer"}
+    return issue_tokens(db, db_user.id, db_user.email)
+
+@app.post("/auth/refresh", response_model=Token)
+def refresh_tokens(request: RefreshRequest, db: Session = Depends(get_db)):
+    tokens = rotate_refresh_token(db, request.refresh_token)
+    if tokens is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or expired refresh token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return tokens
+
+@app.post("/auth/logout", response_model=MessageResponse)
+def logout_user(request: RefreshRequest, db: Session = Depends(get_db)):
+    payload = decode_refresh_token(request.refresh_token)
+    if payload is not None:
+        revoke_refresh_family(db, payload["fam"])
+    return {"message": "Logged out"}
 
 @app.get("/auth/me", response_model=UserResponse)
-def get_current_user_info(current: User = Depends(get_current_active_user)):
+def get_current_user_info(
+    request: Request, response: Response,
+    current: User = Depends(get_current_active_user),
+):
+    etag = make_etag("user", current.id, current.updated_at)
+    if is_not_modified(request, etag, current.updated_at):
+        return not_modified(etag, current.updated_at)
+    response.headers.update(validator_headers(etag, current.updated_at))
     return current
 
 
@@ -191,7 +319,8 @@ def get_current_user_security_questions(
     return {"questions": questions}
 
 
-@app.post("/auth/get-security-questions", response_model=SecurityQuestionsResponse)
+@app.post("/auth/get-security-questions", response_model=SecurityQuestionsResponse,
+          dependencies=[Depends(rate_limit("get-security-questions"))])
 def get_security_questions_for_reset(request: ForgotPasswordRequest, db: Session = Depends(get_db)):
     user = get_user_by_email(db, request.email)
     if not user:
@@ -210,7 +339,8 @@ def get_security_questions_for_reset(request: ForgotPasswordRequest, db: Session
     return {"questions": questions}
 
 
-@app.post("/auth/verify-security-answers", response_model=MessageResponse)
+@app.post("/auth/verify-security-answers", response_model=MessageResponse,
+          dependencies=[Depends(rate_limit("verify-security-answers"))])
 def verify_security_questions(request: SecurityAnswersRequest, db: Session = Depends(get_db)):
     user = get_user_by_email(db, request.email)
     if not user:
@@ -253,55 +383,98 @@ def reset_password_after_verification(request: ResetPasswordVerifiedRequest, db:
 def upsert_profile(
     data: ProfileCreate,
     current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db),
 ):
-    db: Session = SessionLocal()
-    db_profile = db.query(Profile).filter(Profile.user_id == current_user.id).first()
-
-    if db_profile:                              # update
-        for k, v in data.model_dump().items():
-            setattr(db_profile, k, v)
-        db.commit(); db.refresh(db_profile)
-        return db_profile
-
-    new_prof = Profile(user_id=current_user.id, **data.model_dump())
-    db.add(new_prof); db.commit(); db.refresh(new_prof)
-    return new_prof
+    # single INSERT ... ON CONFLICT DO UPDATE ... RETURNING round-trip
+    (row,) = upsert_profiles(db, [{"user_id": current_user.id, **data.model_dump()}])
+    db.commit()
+    profiles_changed([row.user_id])
+    return row
 
 @app.get("/profile", response_model=ProfileResponse)
-def read_profile(current_user: User = Depends(get_current_active_user)):
-    db = SessionLocal()
+def read_profile(
+    request: Request, response: Response,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_read_db),
+):
     prof = db.query(Profile).filter(Profile.user_id == current_user.id).first()
     if not prof:
         raise HTTPException(status_code=404, detail="Profile not found")
+    etag = make_etag("profile", prof.user_id, prof.updated_at)
+    if is_not_modified(request, etag, prof.updated_at):
+        return not_modified(etag, prof.updated_at)
+    response.headers.update(validator_headers(etag, prof.updated_at))
     return prof
 
 # ── Meal-plan & swap ───────────────────────────────────────────────────────
 @app.get("/generate_plan/{user_id}")
 def get_plan(
-    user_id: int, current_user: User = Depends(get_current_active_user)
+    user_id: int, request: Request,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_read_db),
+    primary: Session = Depends(get_db),
 ):
     if user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized")
-    db = SessionLocal()
+    if not catalogue_ready():
+        raise HTTPException(status_code=503, detail="Meal catalogue not loaded")
     profile = db.query(Profile).filter(Profile.user_id == user_id).first()
     if not profile:
         raise HTTPException(status_code=404, detail="Profile not found")
-    plan = generate_meal_plan(profile.__dict__)
-    return JSONResponse(content=plan)
+    # any plan for the same profile and catalogue is equally valid, hence
+    # a weak validator; checked before the plan pipeline runs
+    etag = make_etag("plan", user_id, profile.updated_at, database.CATALOGUE_FINGERPRINT,
+                     database.TARGETS_VERSION, weak=True)
+    if is_not_modified(request, etag, profile.updated_at):
+        return not_modified(etag, profile.updated_at)
+
+    # assembled from cached per-recipe JSON fragments; kept for /plan_summary
+    body = generate_meal_plan_json(profile.__dict__)
+    save_served_plan(primary, user_id, json.loads(body))
+    primary.commit()
+    return Response(
+        content=body,
+        media_type="application/json",
+        headers=validator_headers(etag, profile.updated_at),
+    )
+
+@app.get("/plan_summary/{user_id}")
+def get_plan_summary(
+    user_id: int, request: Request, response: Response,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_read_db),
+):
+    """Header and per-day / weekly totals of the plan last served to the
+    user (swaps included), without the meals; for dashboard widgets."""
+    if user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    plan = served_plan(db, user_id)
+    if plan is None:
+        raise HTTPException(status_code=404, detail="No plan served yet")
+    etag = make_etag("plan_summary", user_id, plan.id, plan.created_at)
+    if is_not_modified(request, etag, plan.created_at):
+        return not_modified(etag, plan.created_at)
+    response.headers.update(validator_headers(etag, plan.created_at))
+    return {k: v for k, v in plan.plan_json.items() if k != "weekly_plan"}
 
 @app.post("/swap_meal/{user_id}")
 def swap_meal(
     user_id: int, req: SwapRequest,
-    current_user: User = Depends(get_current_active_user)
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_read_db),
+    primary: Session = Depends(get_db),
 ):
     if user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorised")
-    db = SessionLocal()
+    if not catalogue_ready():
+        raise HTTPException(status_code=503, detail="Meal catalogue not loaded")
     profile = db.query(Profile).filter(Profile.user_id == user_id).first()
     if not profile:
         raise HTTPException(status_code=404, detail="Profile not found")
     meal = pick_random_meal(profile.__dict__)
-    # frontend performs the in-memory replacement
+    # frontend performs the in-memory replacement; the served copy follows
+    if swap_served_meal(primary, profile.__dict__, req.day_index, req.meal_index, meal):
+        primary.commit()
     return meal
 
 # ── Contact ────────────────────────────────────────────────────────────────
@@ -310,3 +483,144 @@ def create_contact(contact: ContactCreate, db: Session = Depends(get_db)):
     db_contact = Contact(**contact.model_dump())
     db.add(db_contact); db.commit(); db.refresh(db_contact)
     return db_contact
+
+# ── Admin export ───────────────────────────────────────────────────────────
+@app.get("/admin/export/{table}")
+def export_table(
+    table: Literal["users", "contacts"],
+    format: Literal["ndjson", "csv"] = "ndjson",
+    since: Optional[datetime] = None,
+    admin: User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db),
+):
+    # stream on the session's engine; every page opens its own connection
+    return StreamingResponse(
+        stream_export(db.get_bind(), table, format, since),
+        media_type=FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{table}.{format}"'},
+    )
+
+
+@app.post("/admin/profiles", response_model=ProfileImportResponse)
+def import_profiles(
+    profiles: List[ProfileImport],
+    admin: User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db),
+):
+    ids = {p.user_id for p in profiles}
+    known = set()
+    id_list = list(ids)
+    for start in range(0, len(id_list), 900):       # stay under SQLite's bind limit
+        known.update(db.scalars(
+            select(User.id).where(User.id.in_(id_list[start:start + 900]))))
+    rows = [p.model_dump() for p in profiles if p.user_id in known]
+    written = upsert_profiles(db, rows)
+    db.commit()
+    profiles_changed([r.user_id for r in written])
+    return {"upserted": len(written), "skipped_user_ids": sorted(ids - known)}
+
+
+@app.get("/admin/analytics/clusters", response_model=List[ClusterStats])
+def cluster_analytics(
+    admin: User = Depends(get_current_admin_user),
+    db: Session = Depends(get_read_db),
+):
+    return profile_cluster_stats(db)
+
+
+# ── Admin background jobs ──────────────────────────────────────────────────
+@app.post("/admin/jobs", response_model=JobResponse, status_code=202)
+def submit_job(job: JobCreate, admin: User = Depends(get_current_admin_user)):
+    if job.kind not in jobs.JOB_KINDS:
+        raise HTTPException(status_code=422, detail=f"Unknown job kind: {job.kind}")
+    return jobs.runner.submit(job.kind, job.params, created_by=admin.id)
+
+
+@app.get("/admin/jobs", response_model=List[JobResponse])
+def list_jobs(
+    status: Optional[Literal["queued", "running", "succeeded", "failed", "cancelled"]] = None,
+    limit: int = 50,
+    admin: User = Depends(get_current_admin_user),
+):
+    return jobs.runner.recent(status, min(limit, 500))
+
+
+def _job_or_404(job_id: str) -> dict:
+    row = jobs.runner.get(job_id)
+    if row is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return row
+
+
+@app.get("/admin/jobs/{job_id}", response_model=JobResponse)
+def read_job(job_id: str, admin: User = Depends(get_current_admin_user)):
+    return _job_or_404(job_id)
+
+
+@app.post("/admin/jobs/{job_id}/cancel", response_model=JobResponse)
+def cancel_job(job_id: str, admin: User = Depends(get_current_admin_user)):
+    _job_or_404(job_id)
+    return jobs.runner.cancel(job_id)
+
+
+@app.get("/admin/jobs/{job_id}/events")
+async def job_events(job_id: str, admin: User = Depends(get_current_admin_user)):
+    """Server-sent events: one ``event: <status>`` per change of the job's
+    status / progress / message, ending once it has finished."""
+    await run_in_threadpool(_job_or_404, job_id)
+
+    async def stream():
+        async for state in jobs.runner.watch(job_id):
+            if state is None:
+                yield b": keep-alive\n\n"
+                continue
+            data = {k: state.get(k) for k in JobResponse.model_fields}
+            yield b"event: " + state["status"].encode() + b"\ndata: " + serialization.dumps(data) + b"\n\n"
+
+    return StreamingResponse(
+        stream(), media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/admin/jobs/{job_id}/download")
+def download_job_output(job_id: str, admin: User = Depends(get_current_admin_user)):
+    row = _job_or_404(job_id)
+    path = (row["result"] or {}).get("path") if row["status"] == jobs.SUCCEEDED else None
+    if not path or not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Job has no output file")
+    return FileResponse(path, media_type=row["result"].get("media_type"),
+                        filename=os.path.basename(path))
+
+
+# bcrypt runs in the request: keep a batch to a few seconds of the hashing pool
+BULK_REGISTER_LIMIT = int(os.getenv("BULK_REGISTER_LIMIT", "0")) or bulk_hash_limit()
+
+@app.post("/admin/users/bulk", response_model=BulkRegisterResponse)
+async def bulk_register(
+    users: List[UserRegister],
+    admin: User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db),
+):
+    if len(users) > BULK_REGISTER_LIMIT:
+        raise HTTPException(status_code=413, detail=f"At most {BULK_REGISTER_LIMIT} users per request")
+    users = list({u.email: u for u in users}.values())
+    hashes = await hash_passwords_bulk([u.password for u in users])
+    rows = [
+        {"first_name": u.first_name, "last_name": u.last_name,
+         "email": u.email, "hashed_password": h}
+        for u, h in zip(users, hashes)
+    ]
+
+    def _insert():
+        created = insert_users_ignore_existing(db, rows)
+        db.commit()
+        return created
+
+    created = await run_in_threadpool(_insert)
+    new = {r.email for r in created}
+    return {
+        "created": [{"id": r.id, "email": r.email} for r in created],
+        "existing_emails": [u.email for u in users if u.email not in new],
+    }
+
@@ -0,0 +1,260 @@
+"""
+Minimal in-process metrics with Prometheus text exposition.
+
+Recording is a dictionary lookup, a bisect and an integer increment under a
+per-metric lock; all formatting happens in ``render()``, i.e. only when
+``/metrics`` is scraped.
+
+    REQUESTS = histogram("nutricart_http_request_duration_seconds", "...")
+    REQUESTS.observe(0.012, route="/profile", method="GET")
+"""
+from __future__ import annotations
+
+# ---------- stdlib ---------------------------------------------------------
+import threading
+import time
+from   bisect      import bisect_left
+from   contextlib  import contextmanager
+from   typing      import Callable, Iterable, Iterator
+
+# ---------------------------------------------------------------------------
+# Metric types
+# ---------------------------------------------------------------------------
+
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+def _labelkey(labels: dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+
+def _fmt_labels(key: tuple, extra: tuple = ()) -> str:
+    pairs = key + extra
+    if not pairs:
+        return ""
+    body = ",".join(
+        '{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"'))
+        for k, v in pairs
+    )
+    return "{" + body + "}"
+
+
+class Counter:
+    """Monotonic counter, optionally labelled."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str):
+        self.name    = name
+        self.help    = help
+        self._values: dict[tuple, float] = {}
+        self._lock   = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = _labelkey(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_labelkey(labels), 0.0)
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            items = list(self._values.items())
+        for key, val in items:
+            yield f"{self.name}{_fmt_labels(key)} {val}"
+
+
+class Histogram:
+    """Fixed-bucket histogram; bucket counts are cumulated at render time."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.name    = name
+        self.help    = help
+        self.buckets = tuple(sorted(buckets))
+        self._series: dict[tuple, list] = {}   # key -> [counts..., +Inf, sum]
+        self._lock   = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = _labelkey(labels)
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[idx] += 1
+            series[-1]  += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        series = self._series.get(_labelkey(labels))
+        return sum(series[:-1]) if series else 0
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._series.items()]
+        for key, series in items:
+            running = 0
+            for bound, n in zip(self.buckets + (float("inf"),), series[:-1]):
+                running += n
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                yield f"{self.name}_bucket{_fmt_labels(key, (('le', le),))} {running}"
+            yield f"{self.name}_sum{_fmt_labels(key)} {series[-1]}"
+            yield f"{self.name}_count{_fmt_labels(key)} {running}"
+
+
+class StageTimer:
+    """Record consecutive stages of a pipeline into one histogram.
+
+        timer = StageTimer(PLAN_STAGE_SECONDS)
+        ...;  timer.lap("targets")
+        ...;  timer.lap("sampling")
+    """
+
+    __slots__ = ("_hist", "_last")
+
+    def __init__(self, hist: Histogram):
+        self._hist = hist
+        self._last = time.perf_counter()
+
+    def lap(self, stage: str) -> None:
+        now = time.perf_counter()
+        self._hist.observe(now - self._last, stage=stage)
+        self._last = now
+
+# ---------------------------------------------------------------------------
+# Registry
+# ---------------------------------------------------------------------------
+
+class Registry:
+    def __init__(self):
+        self._metrics: list = []
+        self._collectors: list[Callable[[], Iterable[str]]] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, fn: Callable[[], Iterable[str]]) -> None:
+        """*fn* is called on every scrape and returns exposition lines."""
+        self._collectors.append(fn)
+
+    def render(self) -> str:
+        lines: list[str] = []
+        for m in self._metrics:
+            lines.append(f"# HELP {m.name} {m.help}")
+            lines.append(f"# TYPE {m.name} {m.kind}")
+            lines.extend(m.samples())
+        for fn in self._collectors:
+            lines.extend(fn())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, help: str) -> Counter:
+    return REGISTRY.register(Counter(name, help))
+
+
+def histogram(name: str, help: str, buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, help, buckets))
+
+# ---------------------------------------------------------------------------
+# Application metrics
+# ---------------------------------------------------------------------------
+
+HTTP_REQUEST_SECONDS = histogram(
+    "nutricart_http_request_duration_seconds",
+    "HTTP request latency by route template, method and status.",
+)
+DB_QUERY_SECONDS = histogram(
+    "nutricart_db_query_duration_seconds",
+    "SQL statement execution time by statement kind.",
+)
+PASSWORD_HASH_SECONDS = histogram(
+    "nutricart_password_hash_duration_seconds",
+    "Time spent in password hashing (op=hash|verify).",
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 2.0, 5.0),
+)
+PLAN_STAGE_SECONDS = histogram(
+    "nutricart_plan_stage_duration_seconds",
+    "Time spent in each stage of generate_meal_plan.",
+    buckets=(0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025,
+             0.005, 0.01, 0.025, 0.05, 0.1, 0.25),
+)
+PLAN_POOLS = counter(
+    "nutricart_plan_pool_total",
+    "Plans and swaps by meal pool: nearest = the nearest cluster alone had enough "
+    "meals, blended = only the blended clusters had, fallback = static catalogue.",
+)
+
+# ---------------------------------------------------------------------------
+# Instrumentation hooks
+# ---------------------------------------------------------------------------
+
+class MetricsMiddleware:
+    """Pure ASGI middleware timing every HTTP request.
+
+    Requests are labelled by the matched route *template* (``/profile``,
+    ``/generate_plan/{user_id}``) so label cardinality stays bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - start,
+                route=getattr(route, "path", "unmatched"),
+                method=scope["method"],
+                status=status_code,
+            )
+
+
+def instrument_sqlalchemy(engine_cls) -> None:
+    """Time every statement executed through *engine_cls* (an Engine or the class)."""
+    from sqlalchemy import event
+
+    @event.listens_for(engine_cls, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        context._nutricart_start = time.perf_counter()
+
+    @event.listens_for(engine_cls, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_nutricart_start", None)
+        if started is None:
+            return
+        kind = statement.lstrip()[:6].upper()
+        if kind not in ("SELECT", "INSERT", "UPDATE", "DELETE"):
+            kind = "OTHER"
+        DB_QUERY_SECONDS.observe(time.perf_counter() - started, kind=kind)
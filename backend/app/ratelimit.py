@@ -0,0 +1,251 @@
+"""
+Token-bucket rate limiting for the unauthenticated auth endpoints.
+
+Each protected endpoint has a bucket per client IP and one per e-mail
+address in the request body. The check is an ``async`` dependency, so it
+runs before the (sync) endpoint is handed to the thread pool: a rejected
+request never reaches a DB lookup or bcrypt. In-memory buckets are checked
+on the event loop; backends doing I/O (``blocking``) on the thread pool.
+
+Buckets live in a bounded LRU in process memory by default. With several
+workers, ``RATE_LIMIT_BACKEND=sqlite:///path/to/ratelimit.db`` shares them
+through a local SQLite file (a stand-in for Redis or similar; the backend
+interface is a single ``take`` call).
+
+    @app.post("/auth/login", dependencies=[Depends(rate_limit("login"))])
+"""
+from __future__ import annotations
+
+# ---------- stdlib ---------------------------------------------------------
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from   collections import OrderedDict
+from   dataclasses import dataclass
+from   typing      import Optional, Protocol
+
+# ---------- 3rd-party ------------------------------------------------------
+from   fastapi import HTTPException, Request, status
+from   fastapi.concurrency import run_in_threadpool
+
+# ---------- local ----------------------------------------------------------
+from   app.metrics import counter
+
+# ---------------------------------------------------------------------------
+# Configuration
+# ---------------------------------------------------------------------------
+
+@dataclass(frozen=True)
+class Limit:
+    capacity: float     # burst size
+    per_second: float   # refill rate
+
+    @classmethod
+    def per_minute(cls, capacity: float, per_minute: float) -> "Limit":
+        return cls(capacity, per_minute / 60.0)
+
+
+# endpoint -> {key kind -> limit}
+LIMITS: dict[str, dict[str, Limit]] = {
+    "login": {
+        "ip":    Limit.per_minute(30, 30),
+        "email": Limit.per_minute(5, 2),
+    },
+    "verify-security-answers": {
+        "ip":    Limit.per_minute(10, 10),
+        "email": Limit.per_minute(5, 1),
+    },
+    "get-security-questions": {
+        "ip":    Limit.per_minute(20, 20),
+        "email": Limit.per_minute(10, 5),
+    },
+}
+
+ENABLED  = os.getenv("RATE_LIMIT_ENABLED", "1") != "0"
+MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+
+RATE_LIMITED = counter(
+    "nutricart_rate_limited_total",
+    "Requests rejected by the auth rate limiter (endpoint, key=ip|email).",
+)
+
+# ---------------------------------------------------------------------------
+# Backends
+# ---------------------------------------------------------------------------
+
+def _refill(tokens: float, updated: float, now: float, limit: Limit) -> float:
+    return min(limit.capacity, tokens + (now - updated) * limit.per_second)
+
+
+def _spend(tokens: float, limit: Limit) -> tuple[float, float]:
+    """``(tokens left, retry after)``; retry after 0 means allowed."""
+    if tokens >= 1.0:
+        return tokens - 1.0, 0.0
+    return tokens, (1.0 - tokens) / limit.per_second
+
+
+class Backend(Protocol):
+    blocking: bool      # ``take`` may wait on I/O or locks of other processes
+
+    def take(self, key: str, limit: Limit) -> float:
+        """Spend one token from *key*'s bucket; seconds to wait, 0 if allowed."""
+
+    def reset(self) -> None: ...
+
+
+class MemoryBackend:
+    """Buckets in an LRU ``OrderedDict`` capped at *max_keys*.
+
+    Evicting the least recently used bucket only forgets a client that has
+    been quiet the longest, i.e. the one most likely to be full anyway.
+    """
+
+    blocking = False
+
+    def __init__(self, max_keys: int = MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str, limit: Limit) -> float:
+        now = time.monotonic()
+        with self._lock:
+            state = self._buckets.pop(key, None)
+            tokens = limit.capacity if state is None else _refill(*state, now, limit)
+            tokens, retry = _spend(tokens, limit)
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return retry
+
+    def reset(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class SQLiteBackend:
+    """Buckets shared by all workers on one host through a SQLite file.
+
+    Every ``take`` is one ``BEGIN IMMEDIATE`` transaction, so concurrent
+    workers serialise on the file lock. Rows idle long enough to have
+    refilled completely carry no information and are pruned, which keeps
+    the table bounded by the number of recently active keys.
+    """
+
+    PRUNE_EVERY = 1000      # takes between prunes
+    blocking    = True      # BEGIN IMMEDIATE waits up to 5 s for the file lock
+
+    def __init__(self, path: str, max_idle_seconds: float = 3600.0):
+        self.path = path
+        self.max_idle_seconds = max_idle_seconds
+        self._local = threading.local()
+        self._takes = 0
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets ("
+                " key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def take(self, key: str, limit: Limit) -> float:
+        # wall clock: monotonic clocks are not comparable across processes
+        now  = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT tokens, updated FROM buckets WHERE key = ?", (key,)
+            ).fetchone()
+            tokens = limit.capacity if row is None else _refill(*row, now, limit)
+            tokens, retry = _spend(tokens, limit)
+            conn.execute(
+                "INSERT INTO buckets (key, tokens, updated) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated",
+                (key, tokens, now),
+            )
+            self._takes += 1
+            if self._takes % self.PRUNE_EVERY == 0:
+                conn.execute("DELETE FROM buckets WHERE updated < ?",
+                             (now - self.max_idle_seconds,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return retry
+
+    def reset(self) -> None:
+        self._connect().execute("DELETE FROM buckets")
+
+
+def backend_from_url(url: str) -> Backend:
+    if url in ("", "memory"):
+        return MemoryBackend()
+    if url.startswith("sqlite:///"):
+        return SQLiteBackend(url[len("sqlite:///"):])
+    raise ValueError(f"unsupported RATE_LIMIT_BACKEND: {url!r}")
+
+
+backend: Backend = backend_from_url(os.getenv("RATE_LIMIT_BACKEND", "memory"))
+
+# ---------------------------------------------------------------------------
+# FastAPI dependency
+# ---------------------------------------------------------------------------
+
+def client_ip(request: Request) -> str:
+    # uvicorn/gunicorn already resolve X-Forwarded-For from trusted proxies
+    return request.client.host if request.client else "unknown"
+
+
+async def _body_email(request: Request) -> Optional[str]:
+    try:
+        body = json.loads(await request.body() or b"null")
+    except ValueError:
+        return None
+    email = body.get("email") if isinstance(body, dict) else None
+    return email.strip().lower() if isinstance(email, str) and email.strip() else None
+
+
+def check(endpoint: str, ip: str, email: Optional[str]) -> None:
+    """Spend one token per key of *endpoint*; 429 on the first empty bucket."""
+    if not ENABLED:
+        return
+    keys = {"ip": ip, "email": email}
+    for kind, limit in LIMITS[endpoint].items():
+        if keys.get(kind) is None:
+            continue
+        retry = backend.take(f"{endpoint}:{kind}:{keys[kind]}", limit)
+        if retry:
+            RATE_LIMITED.inc(endpoint=endpoint, key=kind)
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many attempts, please try again later",
+                headers={"Retry-After": str(max(1, math.ceil(retry)))},
+            )
+
+
+def rate_limit(endpoint: str):
+    """Dependency enforcing ``LIMITS[endpoint]`` by client IP and body e-mail."""
+    if endpoint not in LIMITS:
+        raise KeyError(endpoint)
+
+    async def dependency(request: Request) -> None:
+        ip, email = client_ip(request), await _body_email(request)
+        if backend.blocking:
+            await run_in_threadpool(check, endpoint, ip, email)
+        else:
+            check(endpoint, ip, email)
+
+    return dependency
@@ -0,0 +1,122 @@
+"""
+JSON encoding for API responses.
+
+``dumps`` is the single entry point; it uses ``orjson`` (which understands
+NumPy scalars and arrays natively) when installed and falls back to the
+standard library otherwise. Another encoder can be plugged in with
+``set_encoder``.
+
+Plan responses are not encoded as dicts at all: every recipe row is
+serialised once into a byte fragment (``FragmentCache``), cached until the
+catalogue version changes, and a weekly plan is assembled by joining 21
+fragments.
+"""
+from __future__ import annotations
+
+# ---------- stdlib ---------------------------------------------------------
+import json
+from   typing import Any, Callable, Sequence
+
+# ---------- 3rd-party ------------------------------------------------------
+import numpy as np
+from   fastapi.responses import JSONResponse
+
+try:                                    # optional fast path
+    import orjson
+except ImportError:                     # pragma: no cover - depends on env
+    orjson = None
+
+# ---------------------------------------------------------------------------
+# Encoders
+# ---------------------------------------------------------------------------
+
+def _numpy_default(obj: Any):
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _stdlib_dumps(obj: Any) -> bytes:
+    # same settings as starlette's JSONResponse
+    return json.dumps(
+        obj, ensure_ascii=False, allow_nan=False,
+        separators=(",", ":"), default=_numpy_default,
+    ).encode("utf-8")
+
+
+def _orjson_dumps(obj: Any) -> bytes:
+    return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY)
+
+
+dumps: Callable[[Any], bytes] = _orjson_dumps if orjson is not None else _stdlib_dumps
+ENCODER = "orjson" if orjson is not None else "json"
+
+
+def set_encoder(fn: Callable[[Any], bytes], name: str = "custom") -> None:
+    """Replace the encoder used by ``dumps`` and ``FastJSONResponse``."""
+    global dumps, ENCODER
+    dumps, ENCODER = fn, name
+
+
+class FastJSONResponse(JSONResponse):
+    """``JSONResponse`` rendered through the pluggable ``dumps``."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+# ---------------------------------------------------------------------------
+# Pre-serialised meal fragments
+# ---------------------------------------------------------------------------
+
+MEAL_FIELDS = ("name", "calories", "protein", "carbs", "fat", "price")
+
+
+def meal_dict(name, calories, protein, carbs, fat, price) -> dict:
+    """The public shape of one meal (fixed key order and types)."""
+    return {
+        "name":     str(name),
+        "calories": int(calories),
+        "protein":  float(protein),
+        "carbs":    float(carbs),
+        "fat":      float(fat),
+        "price":    float(price),
+    }
+
+
+class FragmentCache:
+    """Lazily encoded ``meal_dict`` bytes for each catalogue row.
+
+    Only rows that are actually served get encoded, from the catalogue's
+    ``meals(rows)``. The cache belongs to one catalogue object; passing a
+    different one (a new catalogue version was installed) drops it.
+    """
+
+    def __init__(self):
+        # (catalogue, fragments) swapped as one tuple so concurrent readers
+        # never mix two catalogues
+        self._state: tuple = (None, [])
+
+    def get(self, catalogue, rows: Sequence[int]) -> list[bytes]:
+        state = self._state
+        if state[0] is not catalogue:
+            state = self._state = (catalogue, [None] * len(catalogue))
+        frags = state[1]
+        missing = [r for r in rows if frags[r] is None]
+        if missing:
+            for r, meal in zip(missing, catalogue.meals(missing)):
+                frags[r] = dumps(meal)
+        return [frags[r] for r in rows]
+
+
+def render_plan(header: dict, days: Sequence[str], meals: Sequence[Sequence[bytes]]) -> bytes:
+    """``{**header, "weekly_plan": [{"day", "meals"}...]}`` from fragments."""
+    head  = dumps(header)
+    parts = [head[:-1], b',"weekly_plan":[' if header else b'"weekly_plan":[']
+    for i, (day, frags) in enumerate(zip(days, meals)):
+        if i:
+            parts.append(b",")
+        parts += [b'{"day":', dumps(day), b',"meals":[', b",".join(frags), b"]}"]
+    parts.append(b"]}")
+    return b"".join(parts)
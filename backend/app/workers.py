@@ -0,0 +1,189 @@
+"""
+Pre-fork multi-worker support.
+
+``gunicorn -c gunicorn.conf.py app.main:app`` imports the application once in
+the master, so the ML artefacts, the recipe catalogue and its indexes (all
+built at ``app.database`` import time) are inherited copy-on-write by every
+worker instead of being loaded N times. The hooks here keep those pages
+shared:
+
+* ``prefork``  – moves everything allocated so far into the permanent GC
+  generation (``gc.freeze``) so collections in the workers never write to
+  the inherited object headers, and sets ``preforked`` so the workers'
+  lifespans skip the startup work the master has already done;
+* ``postfork`` – drops connections inherited from the master and reseeds
+  the random generators, which would otherwise produce the same "random"
+  plans in every worker.
+
+``default_workers`` sizes the pool from the container CPU quota, and
+``memory_report`` reads per-process RSS/PSS from ``/proc`` to show how much
+of each worker is actually private::
+
+    python -m app.workers report <master-pid>
+"""
+from __future__ import annotations
+
+# ---------- stdlib ---------------------------------------------------------
+import argparse
+import gc
+import math
+import os
+import random
+import sys
+from   pathlib import Path
+from   typing  import Optional
+
+# ---------- 3rd-party ------------------------------------------------------
+import numpy as np
+
+# ---------------------------------------------------------------------------
+# Sizing
+# ---------------------------------------------------------------------------
+
+CGROUP_ROOT = Path("/sys/fs/cgroup")
+
+
+def cpu_quota(root: Path = CGROUP_ROOT) -> Optional[float]:
+    """CPUs granted by the cgroup CPU quota (v2 ``cpu.max`` or v1 CFS), or
+    None when the container is not limited."""
+    try:
+        quota, period = (root / "cpu.max").read_text().split()[:2]
+        if quota != "max":
+            return int(quota) / int(period)
+        return None
+    except (OSError, ValueError):
+        pass
+    try:
+        quota  = int((root / "cpu" / "cpu.cfs_quota_us").read_text())
+        period = int((root / "cpu" / "cpu.cfs_period_us").read_text())
+        return quota / period if quota > 0 and period > 0 else None
+    except (OSError, ValueError):
+        return None
+
+
+def available_cpus(root: Path = CGROUP_ROOT) -> int:
+    """CPUs this process may use: affinity mask capped by the cgroup quota."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:              # pragma: no cover - non-Linux
+        cpus = os.cpu_count() or 1
+    quota = cpu_quota(root)
+    if quota is not None:
+        cpus = min(cpus, math.ceil(quota))
+    return max(1, cpus)
+
+
+def default_workers() -> int:
+    """``WEB_CONCURRENCY`` if set, else one worker per available CPU.
+
+    Requests are CPU-bound (bcrypt, NumPy), so extra workers beyond the
+    CPU count only add memory and context switches.
+    """
+    env = os.getenv("WEB_CONCURRENCY")
+    if env:
+        return max(1, int(env))
+    return available_cpus()
+
+# ---------------------------------------------------------------------------
+# Fork hooks
+# ---------------------------------------------------------------------------
+
+preforked = False       # inherited by the workers; False under plain uvicorn
+
+
+def prefork() -> None:
+    """Run in the master after the app is imported and the one-off startup
+    work (tables, bcrypt cost, token pruning) is done, before any fork."""
+    global preforked
+    preforked = True
+    gc.collect()
+    gc.freeze()
+
+
+def postfork() -> None:
+    """Run in each worker right after it is forked."""
+    from app import database
+
+    # pooled connections must not be shared across processes
+    database.engine.dispose(close=False)
+    database.read_engine.dispose(close=False)
+    database._rng = np.random.default_rng()
+    np.random.seed()                    # pandas .sample() draws from here
+    random.seed()
+
+# ---------------------------------------------------------------------------
+# Memory report
+# ---------------------------------------------------------------------------
+
+SMAPS_FIELDS = {
+    "Rss": "rss_kb", "Pss": "pss_kb",
+    "Shared_Clean": "shared_clean_kb", "Shared_Dirty": "shared_dirty_kb",
+    "Private_Clean": "private_clean_kb", "Private_Dirty": "private_dirty_kb",
+}
+
+
+def memory_usage(pid: int) -> dict[str, int]:
+    """RSS/PSS breakdown (KiB) of *pid* from ``/proc/<pid>/smaps_rollup``."""
+    usage = {}
+    for line in Path(f"/proc/{pid}/smaps_rollup").read_text().splitlines():
+        key, _, rest = line.partition(":")
+        if key in SMAPS_FIELDS:
+            usage[SMAPS_FIELDS[key]] = int(rest.split()[0])
+    return usage
+
+
+def child_pids(pid: int) -> list[int]:
+    children = []
+    for task in Path(f"/proc/{pid}/task").iterdir():
+        try:
+            children += map(int, (task / "children").read_text().split())
+        except OSError:
+            continue
+    return sorted(children)
+
+
+def memory_report(master_pid: int) -> dict:
+    """Per-process usage of a master and its workers plus worker averages.
+
+    PSS splits shared pages between the processes mapping them, so the
+    workers' ``pss_kb`` is what each one really costs; if copy-on-write
+    sharing holds it stays roughly flat as workers are added.
+    """
+    workers = {pid: memory_usage(pid) for pid in child_pids(master_pid)}
+    report = {"master": memory_usage(master_pid), "workers": workers}
+    if workers:
+        for key in ("rss_kb", "pss_kb", "private_dirty_kb"):
+            report[f"worker_avg_{key}"] = round(
+                sum(w.get(key, 0) for w in workers.values()) / len(workers))
+        report["total_pss_kb"] = report["master"]["pss_kb"] + sum(
+            w["pss_kb"] for w in workers.values())
+    return report
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="NutriCart worker utilities.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    report = sub.add_parser("report", help="memory of a gunicorn master and its workers")
+    report.add_argument("pid", type=int)
+    sub.add_parser("workers", help="print the default worker count")
+    args = parser.parse_args(argv)
+
+    if args.cmd == "workers":
+        print(default_workers())
+        return 0
+
+    r = memory_report(args.pid)
+    print(f"{'pid':>8} {'role':<7} {'rss MiB':>9} {'pss MiB':>9} {'private MiB':>12}")
+    rows = [(args.pid, "master", r["master"])] + [
+        (pid, "worker", u) for pid, u in r["workers"].items()]
+    for pid, role, u in rows:
+        private = u.get("private_clean_kb", 0) + u.get("private_dirty_kb", 0)
+        print(f"{pid:>8} {role:<7} {u['rss_kb'] / 1024:>9.1f} "
+              f"{u['pss_kb'] / 1024:>9.1f} {private / 1024:>12.1f}")
+    if r["workers"]:
+        print(f"total PSS: {r['total_pss_kb'] / 1024:.1f} MiB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+"""
+Benchmark runner.
+
+    python -m benchmarks                              # in-process, 1k + 100k rows
+    python -m benchmarks --mode all --sizes 1000,1000000
+    python -m benchmarks --save benchmarks/baseline.json
+    python -m benchmarks --compare benchmarks/baseline.json --threshold 0.2
+    python -m benchmarks --mode memory --workers 1,2,4    # per-worker RSS/PSS
+
+Exits with status 1 when ``--compare`` finds a regression beyond the
+threshold.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import warnings
+from   pathlib import Path
+
+from benchmarks.harness import compare, save_baseline
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="NutriCart API benchmarks.")
+    parser.add_argument("--mode", choices=["inprocess", "http", "memory", "all"], default="inprocess")
+    parser.add_argument("--sizes", default="1000,100000",
+                        help="comma-separated synthetic catalogue sizes")
+    parser.add_argument("--iterations", type=int, default=200,
+                        help="iterations per pipeline benchmark (scaled down for big catalogues)")
+    parser.add_argument("--auth-iterations", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=500, help="HTTP requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--workers", default="1,2,4",
+                        help="comma-separated gunicorn worker counts for --mode memory")
+    parser.add_argument("--save", type=Path, help="write results as the new baseline")
+    parser.add_argument("--compare", type=Path, help="baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.20,
+                        help="allowed relative regression (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    warnings.filterwarnings("ignore", message="X does not have valid feature names")
+
+    results: dict = {}
+    if args.mode in ("inprocess", "all"):
+        from benchmarks.inprocess import (
+            auth_benchmarks, catalogue_benchmarks, energy_benchmarks, pipeline_benchmarks,
+            security_answer_benchmarks, token_benchmarks,
+        )
+        results.update(pipeline_benchmarks(sizes, args.iterations))
+        results.update(catalogue_benchmarks(max(sizes), args.iterations))
+        results.update(auth_benchmarks(args.auth_iterations))
+        results.update(security_answer_benchmarks(args.auth_iterations))
+        results.update(token_benchmarks(args.iterations * 50))
+        results.update(energy_benchmarks(max(sizes), args.iterations))
+    if args.mode in ("http", "all"):
+        from benchmarks.loadgen import http_benchmarks
+        for size in sizes:
+            results.update(http_benchmarks(
+                size, args.requests, args.auth_iterations, args.concurrency))
+    if args.mode == "memory":
+        from benchmarks.memory import memory_benchmarks
+        counts = [int(w) for w in args.workers.split(",") if w]
+        for size in sizes:
+            results.update(memory_benchmarks(size, counts, args.requests, args.concurrency))
+
+    print(json.dumps(results, indent=2, sort_keys=True))
+
+    if args.save:
+        save_baseline(results, args.save)
+    if args.compare:
+        problems = compare(results, json.loads(args.compare.read_text()), args.threshold)
+        for p in problems:
+            print(f"REGRESSION {p}", file=sys.stderr)
+        return 1 if problems else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,53 @@
+"""
+Synthetic recipe catalogues of arbitrary size.
+
+Rows are bootstrapped from ``recipes_with_clusters.csv``: names are drawn
+from the real catalogue (so the dietary keyword filters hit at realistic
+rates), nutrition and price get ±15 % multiplicative noise, and clusters are
+re-assigned with the production scaler/model so cluster pools keep their
+real proportions.
+"""
+from __future__ import annotations
+
+import numpy  as np
+import pandas as pd
+
+from app import database
+
+FEATURES = ["calories", "protein", "carbs", "fat", "price"]
+
+
+def synthetic_catalogue(rows: int, seed: int = 0) -> pd.DataFrame:
+    """Return a catalogue DataFrame with *rows* recipes (deterministic per seed)."""
+    base = pd.read_csv(database.RECIPES_PATH)
+    rng  = np.random.default_rng(seed)
+
+    picks = rng.integers(0, len(base), size=rows)
+    df    = base.iloc[picks].reset_index(drop=True)
+
+    noise = rng.uniform(0.85, 1.15, size=(rows, len(FEATURES)))
+    feats = df[FEATURES].to_numpy(dtype=float) * noise
+    feats[:, 0] = np.round(feats[:, 0])          # calories are integers
+    feats[:, 4] = np.round(feats[:, 4], 2)       # prices in cents
+    df[FEATURES] = feats
+    df["calories"] = df["calories"].astype(int)
+
+    df["cluster"] = database.model.predict(
+        database.scaler.transform(df[FEATURES].to_numpy())
+    )
+    return df
+
+
+def sample_profile(user_id: int = 1, **overrides) -> dict:
+    """A representative profile dict as read from the ``profiles`` table."""
+    profile = {
+        "user_id": user_id,
+        "age": 32,
+        "weight": 72.0,
+        "height": 176.0,
+        "goal": "maintain",
+        "budget": 180.0,
+        "dietary_restrictions": ["vegetarian"],
+    }
+    profile.update(overrides)
+    return profile
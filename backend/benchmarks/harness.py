@@ -0,0 +1,67 @@
+"""
+Timing, statistics and baseline comparison shared by the benchmark modes.
+"""
+from __future__ import annotations
+
+import json
+import time
+from   pathlib import Path
+from   typing  import Callable
+
+import numpy as np
+
+
+def summarize(durations: list[float], wall_seconds: float) -> dict:
+    """Latency percentiles (ms) and throughput (ops/s) for one benchmark."""
+    arr = np.asarray(durations) * 1000.0
+    return {
+        "n":          int(arr.size),
+        "mean_ms":    round(float(arr.mean()), 4),
+        "p50_ms":     round(float(np.percentile(arr, 50)), 4),
+        "p95_ms":     round(float(np.percentile(arr, 95)), 4),
+        "p99_ms":     round(float(np.percentile(arr, 99)), 4),
+        "throughput": round(arr.size / wall_seconds, 2) if wall_seconds else 0.0,
+    }
+
+
+def measure(fn: Callable[[], object], iterations: int, warmup: int = 3) -> dict:
+    """Call *fn* sequentially and summarise per-call latency."""
+    for _ in range(warmup):
+        fn()
+    durations = []
+    start = time.perf_counter()
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - t0)
+    return summarize(durations, time.perf_counter() - start)
+
+# ---------------------------------------------------------------------------
+# Baselines
+# ---------------------------------------------------------------------------
+
+COMPARED = ("p50_ms", "p95_ms")
+
+
+def save_baseline(results: dict, path: Path) -> None:
+    path.write_text(json.dumps(results, indent=2, sort_keys=True) + "\n")
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """Regressions where a latency grew or throughput fell by more than
+    *threshold* (0.2 = 20 %). Benchmarks missing on either side are skipped."""
+    problems = []
+    for name, cur in results.items():
+        ref = baseline.get(name)
+        if not ref:
+            continue
+        for key in COMPARED:
+            if ref.get(key) and cur[key] > ref[key] * (1 + threshold):
+                problems.append(
+                    f"{name}: {key} {cur[key]:.3f} > baseline {ref[key]:.3f} (+{threshold:.0%})"
+                )
+        if ref.get("throughput") and cur["throughput"] < ref["throughput"] * (1 - threshold):
+            problems.append(
+                f"{name}: throughput {cur['throughput']:.1f} < baseline {ref['throughput']:.1f} (-{threshold:.0%})"
+            )
+    return problems
@@ -0,0 +1,204 @@
+"""
+In-process benchmarks: call the pipeline functions directly and drive the
+auth endpoints through ``TestClient`` against a throw-away SQLite file.
+"""
+from __future__ import annotations
+
+import itertools
+import tempfile
+from   pathlib import Path
+
+from fastapi.testclient import TestClient
+from sqlalchemy         import create_engine
+from sqlalchemy.orm     import sessionmaker
+
+from app          import database, ratelimit
+from app.auth     import get_db, get_read_db
+from app.main     import app
+from benchmarks.catalogue import sample_profile, synthetic_catalogue
+from benchmarks.harness   import measure
+
+
+def _scaled(iterations: int, size: int) -> int:
+    """Fewer iterations for big catalogues so a 1M-row run stays bounded."""
+    return max(5, int(iterations * min(1.0, 10_000 / size)))
+
+
+def pipeline_benchmarks(sizes: list[int], iterations: int) -> dict:
+    results  = {}
+    original = database.recipes
+    profile  = sample_profile()
+    try:
+        for size in sizes:
+            frame = synthetic_catalogue(size)
+            database.use_catalogue(frame)
+            n = _scaled(iterations, size)
+
+            results[f"generate_meal_plan[{size}]"] = measure(
+                lambda: database.generate_meal_plan(profile), n)
+            results[f"generate_meal_plan_json[{size}]"] = measure(
+                lambda: database.generate_meal_plan_json(profile), n)
+            results[f"pick_random_meal[{size}]"] = measure(
+                lambda: database.pick_random_meal(profile), n)
+            # as read from the profiles table: targets stored on write
+            stored = {**profile, **database.derive_targets([profile])[0]}
+            results[f"generate_meal_plan_stored[{size}]"] = measure(
+                lambda: database.generate_meal_plan(stored), n)
+            results[f"pick_random_meal_stored[{size}]"] = measure(
+                lambda: database.pick_random_meal(stored), n)
+            results[f"apply_dietary_restrictions[{size}]"] = measure(
+                lambda: database.apply_dietary_restrictions(frame, ["vegan", "nut-free"]), n)
+    finally:
+        database.use_catalogue(original)
+    return results
+
+
+def catalogue_benchmarks(size: int, iterations: int) -> dict:
+    """The columnar ``RecipeCatalogue`` against the DataFrame it replaced:
+    bytes held (deep, names included) and the request-path operations,
+    cluster pool + budget filter + gathering one week of meals."""
+    import numpy as np
+    from app.catalogue import RecipeCatalogue
+
+    frame     = synthetic_catalogue(size)
+    catalogue = RecipeCatalogue.from_frame(frame)
+    cluster   = int(np.bincount(catalogue.cluster).argmax())
+    rows      = np.flatnonzero(catalogue.cluster == cluster)
+    ceiling   = float(np.median(catalogue.price))
+    n         = _scaled(iterations, size)
+
+    def with_frame():
+        pool = frame.iloc[rows]
+        pool = pool[pool.price <= ceiling]
+        week = pool.sample(21, replace=len(pool) < 21)
+        return week.to_dict("records")
+
+    def with_columns():
+        pool = rows[catalogue.price[rows] <= ceiling]
+        week = np.random.default_rng().choice(pool, 21, replace=len(pool) < 21)
+        return catalogue.meals(week)
+
+    return {
+        f"catalogue_memory[dataframe][{size}]": {"bytes": int(frame.memory_usage(deep=True).sum())},
+        f"catalogue_memory[columnar][{size}]":  {"bytes": catalogue.nbytes},
+        f"catalogue_week[dataframe][{size}]":   measure(with_frame, n),
+        f"catalogue_week[columnar][{size}]":    measure(with_columns, n),
+    }
+
+
+def auth_benchmarks(iterations: int) -> dict:
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        engine  = create_engine(f"sqlite:///{Path(tmp) / 'bench.db'}",
+                                connect_args={"check_same_thread": False})
+        Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        database.Base.metadata.create_all(bind=engine)
+
+        def _override_get_db():
+            db = Session()
+            try:
+                yield db
+            finally:
+                db.close()
+
+        app.dependency_overrides[get_db] = _override_get_db
+        app.dependency_overrides[get_read_db] = _override_get_db
+        enabled = ratelimit.ENABLED
+        ratelimit.ENABLED = False           # measure hashing, not the limiter
+        try:
+            client = TestClient(app)
+            seq    = itertools.count()
+
+            def register():
+                client.post("/auth/register", json={
+                    "first_name": "Bench", "last_name": "User",
+                    "email": f"bench{next(seq)}@example.com", "password": "benchpass123",
+                })
+
+            def login():
+                client.post("/auth/login", json={
+                    "email": "bench0@example.com", "password": "benchpass123",
+                })
+
+            results["register"] = measure(register, iterations, warmup=1)
+            results["login"]    = measure(login, iterations, warmup=1)
+
+            # cost of a request the limiter turns away (bucket kept empty)
+            ratelimit.ENABLED = True
+            results["login_rate_limited"] = measure(login, iterations * 10, warmup=50)
+        finally:
+            ratelimit.ENABLED = enabled
+            ratelimit.backend.reset()
+            app.dependency_overrides.pop(get_db, None)
+            engine.dispose()
+    return results
+
+
+def security_answer_benchmarks(iterations: int) -> dict:
+    """Reset-time answer check: legacy per-answer bcrypt vs one scrypt."""
+    from app.auth import check_security_answers, get_password_hash, hash_security_answers
+
+    answers = {"First pet?": "Rex", "Birth city?": "Lisbon", "Favourite food?": "Pizza"}
+    legacy  = {q: get_password_hash(a.lower().strip()) for q, a in answers.items()}
+    current = hash_security_answers(answers)
+    return {
+        "security_answers[legacy]": measure(
+            lambda: check_security_answers(legacy, answers), iterations, warmup=1),
+        "security_answers[scrypt]": measure(
+            lambda: check_security_answers(current, answers), iterations, warmup=1),
+    }
+
+
+def token_benchmarks(iterations: int) -> dict:
+    """Per-request bearer-token check: full JWT decode vs verify cache hit."""
+    from app import auth
+
+    token = auth.create_access_token({"sub": "bench@example.com"})
+    auth.clear_token_cache()
+
+    def cold():
+        auth.clear_token_cache()
+        auth.verify_token(token)
+
+    results = {
+        "verify_token[decode]": measure(cold, iterations),
+        "verify_token[cached]": measure(lambda: auth.verify_token(token), iterations),
+    }
+    auth.clear_token_cache()
+    return results
+
+
+def energy_benchmarks(rows: int, iterations: int) -> dict:
+    """BMR -> TDEE -> per-meal targets for *rows* profiles: the vectorised
+    energy model on string categories and on pre-encoded codes, against the
+    per-profile scalar wrappers (timed on 1 % of the rows)."""
+    import numpy as np
+    from app import energy
+
+    rng    = np.random.default_rng(0)
+    age    = rng.integers(18, 80, rows)
+    weight = rng.uniform(45, 120, rows)
+    height = rng.uniform(150, 200, rows)
+    sex    = rng.choice(np.array([*energy.SEXES, None], dtype=object), rows)
+    active = rng.choice(np.array(list(energy.ACTIVITY_FACTORS), dtype=object), rows)
+    goal   = rng.choice(np.array(list(energy.GOAL_OFFSETS), dtype=object), rows)
+    codes  = [energy.encode(sex, energy.SEXES), energy.encode(active, energy.ACTIVITY_FACTORS),
+              energy.encode(goal, energy.GOAL_OFFSETS)]
+
+    def vectorised(s, a, g):
+        return energy.meal_targets(energy.tdee(energy.bmr(age, weight, height, s), a, g))
+
+    sample = max(1, rows // 100)
+
+    def scalar():
+        for i in range(sample):
+            tdee = database.adjust_tdee(
+                database.calculate_bmr(age[i], weight[i], height[i], sex[i]), goal[i], active[i])
+            energy.meal_targets(tdee)
+
+    n = max(3, iterations // 20)
+    return {
+        f"energy[vectorised][{rows}]":       measure(lambda: vectorised(sex, active, goal), n, warmup=1),
+        f"energy[vectorised_codes][{rows}]": measure(lambda: vectorised(*codes), n, warmup=1),
+        f"energy[scalar][{sample}]":         measure(scalar, n, warmup=1),
+    }
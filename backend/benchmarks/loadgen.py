@@ -0,0 +1,133 @@
+"""
+HTTP load generation against a real ``uvicorn`` process.
+
+The server runs in a temporary working directory (so its SQLite file is
+throw-away) with ``RECIPES_PATH`` pointing at a synthetic catalogue.
+"""
+from __future__ import annotations
+
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from   concurrent.futures import ThreadPoolExecutor
+from   pathlib import Path
+from   typing  import Callable
+
+import httpx
+
+from app import database
+from benchmarks.catalogue import sample_profile, synthetic_catalogue
+from benchmarks.harness   import summarize
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_ready(base_url: str, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{base_url}/readyz", timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"server at {base_url} did not become ready")
+
+
+def hammer(
+    base_url: str,
+    request: Callable[[httpx.Client, int], httpx.Response],
+    total: int,
+    concurrency: int,
+) -> dict:
+    """Issue *total* requests from *concurrency* threads; latency per request."""
+    durations: list[float] = []
+    errors = 0
+    lock = threading.Lock()
+    local = threading.local()
+
+    def one(i: int) -> None:
+        nonlocal errors
+        client = getattr(local, "client", None)
+        if client is None:
+            client = local.client = httpx.Client(base_url=base_url, timeout=30.0)
+        t0 = time.perf_counter()
+        response = request(client, i)
+        elapsed = time.perf_counter() - t0
+        with lock:
+            durations.append(elapsed)
+            errors += response.status_code >= 400
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(total)))
+    stats = summarize(durations, time.perf_counter() - start)
+    stats["errors"] = errors
+    return stats
+
+
+def http_benchmarks(size: int, requests: int, auth_requests: int, concurrency: int) -> dict:
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = Path(tmp) / "recipes.csv"
+        synthetic_catalogue(size).to_csv(csv_path, index=False)
+
+        port = _free_port()
+        base = f"http://127.0.0.1:{port}"
+        env  = {
+            **os.environ,
+            "PYTHONPATH":   str(BACKEND_DIR),
+            "RECIPES_PATH": str(csv_path),
+            "SCALER_PATH":  str((BACKEND_DIR / database.SCALER_PATH).resolve()),
+            "MODEL_PATH":   str((BACKEND_DIR / database.MODEL_PATH).resolve()),
+            "RATE_LIMIT_ENABLED": "0",
+        }
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app",
+             "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+            cwd=tmp, env=env,
+        )
+        try:
+            _wait_ready(base)
+            creds = {"email": "load@example.com", "password": "loadpass123"}
+            with httpx.Client(base_url=base, timeout=30.0) as c:
+                user_id = c.post("/auth/register", json={
+                    "first_name": "Load", "last_name": "Test", **creds,
+                }).json()["id"]
+                token = c.post("/auth/login", json=creds).json()["access_token"]
+                headers = {"Authorization": f"Bearer {token}"}
+                profile = sample_profile(user_id)
+                c.post("/profile", headers=headers, json={
+                    k: v for k, v in profile.items() if k != "user_id"
+                })
+
+            results[f"http:generate_plan[{size}]"] = hammer(
+                base, lambda c, i: c.get(f"/generate_plan/{user_id}", headers=headers),
+                requests, concurrency)
+            results[f"http:swap_meal[{size}]"] = hammer(
+                base, lambda c, i: c.post(f"/swap_meal/{user_id}", headers=headers,
+                                          json={"day_index": 0, "meal_index": 0}),
+                requests, concurrency)
+            results["http:login"] = hammer(
+                base, lambda c, i: c.post("/auth/login", json=creds),
+                auth_requests, concurrency)
+            results["http:register"] = hammer(
+                base, lambda c, i: c.post("/auth/register", json={
+                    "first_name": "Load", "last_name": "Test",
+                    "email": f"load{i}@example.com", "password": "loadpass123",
+                }),
+                auth_requests, concurrency)
+        finally:
+            proc.terminate()
+            proc.wait(timeout=10)
+    return results
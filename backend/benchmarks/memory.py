@@ -0,0 +1,94 @@
+"""
+Per-worker memory of the pre-fork deployment.
+
+Starts ``gunicorn -c gunicorn.conf.py`` with 1, 2, 4 … workers on a
+synthetic catalogue, drives some plan/swap traffic through it (so workers
+touch the catalogue the way production does) and reads RSS/PSS of the
+master and every worker from ``/proc``. With copy-on-write sharing working,
+``worker_avg_pss_kb`` stays roughly flat as workers are added while the
+inherited catalogue shows up in RSS only.
+"""
+from __future__ import annotations
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from   pathlib import Path
+
+import httpx
+
+from app import database
+from app.workers import memory_report
+from benchmarks.catalogue import sample_profile, synthetic_catalogue
+from benchmarks.loadgen   import BACKEND_DIR, _free_port, _wait_ready, hammer
+
+
+def _wait_workers(master_pid: int, count: int, timeout: float = 60.0) -> None:
+    from app.workers import child_pids
+    deadline = time.monotonic() + timeout
+    while len(child_pids(master_pid)) < count:
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"gunicorn did not start {count} workers")
+        time.sleep(0.2)
+
+
+def memory_benchmarks(size: int, worker_counts: list[int], requests: int, concurrency: int) -> dict:
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = Path(tmp) / "recipes.csv"
+        synthetic_catalogue(size).to_csv(csv_path, index=False)
+
+        for count in worker_counts:
+            port = _free_port()
+            base = f"http://127.0.0.1:{port}"
+            env  = {
+                **os.environ,
+                "PYTHONPATH":      str(BACKEND_DIR),
+                "RECIPES_PATH":    str(csv_path),
+                "SCALER_PATH":     str((BACKEND_DIR / database.SCALER_PATH).resolve()),
+                "MODEL_PATH":      str((BACKEND_DIR / database.MODEL_PATH).resolve()),
+                "WEB_CONCURRENCY": str(count),
+                "HOST":            "127.0.0.1",
+                "PORT":            str(port),
+                "LOG_LEVEL":       "warning",
+            }
+            proc = subprocess.Popen(
+                [sys.executable, "-m", "gunicorn",
+                 "-c", str(BACKEND_DIR / "gunicorn.conf.py"), "app.main:app"],
+                cwd=tmp, env=env,
+            )
+            try:
+                _wait_ready(base)
+                _wait_workers(proc.pid, count)
+                creds = {"email": f"mem{count}@example.com", "password": "mempass123"}
+                with httpx.Client(base_url=base, timeout=30.0) as c:
+                    user_id = c.post("/auth/register", json={
+                        "first_name": "Mem", "last_name": "Test", **creds,
+                    }).json()["id"]
+                    token = c.post("/auth/login", json=creds).json()["access_token"]
+                    headers = {"Authorization": f"Bearer {token}"}
+                    profile = sample_profile(user_id)
+                    c.post("/profile", headers=headers, json={
+                        k: v for k, v in profile.items() if k != "user_id"
+                    })
+                hammer(base, lambda c, i: c.get(f"/generate_plan/{user_id}", headers=headers),
+                       requests, concurrency)
+                hammer(base, lambda c, i: c.post(f"/swap_meal/{user_id}", headers=headers,
+                                                 json={"day_index": 0, "meal_index": 0}),
+                       requests, concurrency)
+
+                report = memory_report(proc.pid)
+                results[f"memory:workers={count}[{size}]"] = {
+                    "workers":               len(report["workers"]),
+                    "master_rss_kb":         report["master"]["rss_kb"],
+                    "worker_avg_rss_kb":     report["worker_avg_rss_kb"],
+                    "worker_avg_pss_kb":     report["worker_avg_pss_kb"],
+                    "worker_avg_private_dirty_kb": report["worker_avg_private_dirty_kb"],
+                    "total_pss_kb":          report["total_pss_kb"],
+                }
+            finally:
+                proc.terminate()
+                proc.wait(timeout=30)
+    return results
@@ -0,0 +1,256 @@
+"""
+Deterministic synthetic data at production scale.
+
+Users/profiles are bulk-inserted straight into the database; recipe
+catalogues are written as CSV for ``RECIPES_PATH``::
+
+    python -m benchmarks.synthetic users   --count 1000000 --seed 42
+    python -m benchmarks.synthetic recipes --count 1000000 -o recipes_1m.csv
+
+Everything is generated in fixed-size chunks, each from its own
+``default_rng((seed, chunk))`` stream, so the output for a given seed and
+count is identical across runs and memory stays flat. All synthetic users
+share one bcrypt hash of ``SYNTHETIC_PASSWORD`` (hashing millions of
+passwords would dominate the run), so any of them can log in for load tests.
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+from   datetime import datetime, timedelta
+from   typing   import Iterator, Optional
+
+import numpy  as np
+import pandas as pd
+from   sqlalchemy import func, insert, select
+
+from app import database
+from app.database import Base, Profile, User
+
+CHUNK = 50_000
+REFERENCE_TIME = datetime(2025, 1, 1)      # created_at is spread over 2 years before this
+SYNTHETIC_PASSWORD = "synthetic-pass-123"
+EMAIL_DOMAIN       = "synthetic.nutricart.test"
+
+# ---------------------------------------------------------------------------
+# Distributions
+# ---------------------------------------------------------------------------
+
+FIRST_NAMES = np.array([
+    "Alex", "Sam", "Jordan", "Taylor", "Maria", "Wei", "Aisha", "Noah",
+    "Priya", "Liam", "Sofia", "Omar", "Emma", "Diego", "Yuki", "Fatima",
+])
+LAST_NAMES = np.array([
+    "Smith", "Garcia", "Chen", "Khan", "Johnson", "Nguyen", "Patel", "Brown",
+    "Silva", "Kim", "Martin", "Ali", "Lopez", "Cohen", "Singh", "Muller",
+])
+
+GOALS        = np.array(["lose", "maintain", "gain"])
+GOAL_WEIGHTS = np.array([0.50, 0.32, 0.18])
+
+ACTIVITY_LEVELS  = np.array(["sedentary", "light", "moderate", "active", "very_active"])
+ACTIVITY_WEIGHTS = np.array([0.35, 0.30, 0.20, 0.10, 0.05])
+ENERGY_SET_RATE  = 0.85      # share of profiles with sex / activity (older ones lack them)
+
+# independent prevalence of each restriction (vegan implies not vegetarian)
+RESTRICTION_RATES = {
+    "vegetarian":  0.08,
+    "vegan":       0.03,
+    "gluten-free": 0.05,
+    "dairy-free":  0.06,
+    "nut-free":    0.03,
+    "halal":       0.04,
+    "kosher":      0.02,
+}
+BUDGET_SET_RATE = 0.70       # share of profiles with a weekly budget
+
+
+def _profile_columns(rng: np.random.Generator, n: int) -> dict[str, np.ndarray]:
+    """Vectorised draw of *n* profiles' numeric/categorical fields."""
+    age    = np.clip(rng.normal(38, 13, n), 18, 80).round().astype(int)
+    female = rng.random(n) < 0.5
+    height = np.where(female, rng.normal(163, 7, n), rng.normal(176, 7.5, n))
+    height = np.clip(height, 140, 210).round(1)
+    bmi    = np.clip(rng.lognormal(np.log(26), 0.17, n), 16, 50)
+    weight = (bmi * (height / 100) ** 2).round(1)
+    goal   = rng.choice(GOALS, size=n, p=GOAL_WEIGHTS)
+    budget = np.clip(rng.lognormal(np.log(150), 0.45, n), 40, 600).round(0)
+    has_budget = rng.random(n) < BUDGET_SET_RATE
+    restrictions = {r: rng.random(n) < p for r, p in RESTRICTION_RATES.items()}
+    restrictions["vegetarian"] &= ~restrictions["vegan"]
+    activity = rng.choice(ACTIVITY_LEVELS, size=n, p=ACTIVITY_WEIGHTS)
+    has_energy = rng.random(n) < ENERGY_SET_RATE
+    return {
+        "age": age, "height": height, "weight": weight, "goal": goal,
+        "sex": np.where(has_energy, np.where(female, "female", "male"), None),
+        "activity_level": np.where(has_energy, activity, None),
+        "budget": np.where(has_budget, budget, np.nan), "restrictions": restrictions,
+    }
+
+
+def user_chunks(count: int, first_id: int, seed: int, hashed_password: str) -> Iterator[tuple[list, list]]:
+    """Yield ``(user_rows, profile_rows)`` in chunks of at most ``CHUNK``."""
+    for chunk, start in enumerate(range(0, count, CHUNK)):
+        n   = min(CHUNK, count - start)
+        rng = np.random.default_rng((seed, chunk))
+        ids = np.arange(first_id + start, first_id + start + n)
+
+        first = rng.choice(FIRST_NAMES, n)
+        last  = rng.choice(LAST_NAMES, n)
+        age_s = rng.integers(0, 2 * 365 * 24 * 3600, n)   # created within 2 years
+        cols  = _profile_columns(rng, n)
+        names = list(RESTRICTION_RATES)
+        rmask = np.column_stack([cols["restrictions"][r] for r in names])
+
+        users, profiles = [], []
+        for i in range(n):
+            uid     = int(ids[i])
+            created = REFERENCE_TIME - timedelta(seconds=int(age_s[i]))
+            users.append({
+                "id": uid,
+                "first_name": str(first[i]),
+                "last_name": str(last[i]),
+                "email": f"user{uid}@{EMAIL_DOMAIN}",
+                "hashed_password": hashed_password,
+                "is_active": True,
+                "is_verified": bool(i % 3),
+                "created_at": created,
+                "updated_at": created,
+            })
+            budget = cols["budget"][i]
+            profiles.append({
+                "user_id": uid,
+                "age": int(cols["age"][i]),
+                "weight": float(cols["weight"][i]),
+                "height": float(cols["height"][i]),
+                "goal": str(cols["goal"][i]),
+                "sex": cols["sex"][i],
+                "activity_level": cols["activity_level"][i],
+                "budget": None if np.isnan(budget) else float(budget),
+                "dietary_restrictions": [names[j] for j in np.flatnonzero(rmask[i])],
+            })
+        yield users, profiles
+
+
+def load_users(database_url: str, count: int, seed: int = 42) -> int:
+    """Bulk-insert *count* users with profiles, their targets derived like
+    ``upsert_profiles`` stores them; returns the first new id."""
+    from app.auth import get_password_hash
+
+    engine = database.make_engine(database_url)
+    Base.metadata.create_all(bind=engine)
+    hashed = get_password_hash(SYNTHETIC_PASSWORD)
+
+    with engine.connect() as conn:
+        first_id = (conn.execute(select(func.max(User.id))).scalar() or 0) + 1
+
+    for users, profiles in user_chunks(count, first_id, seed, hashed):
+        # stored targets: plans then take the production path, not the fallback
+        profiles = [{**p, **t} for p, t in zip(profiles, database.derive_targets(profiles))]
+        with engine.begin() as conn:           # one transaction per chunk
+            conn.execute(insert(User.__table__), users)
+            conn.execute(insert(Profile.__table__), profiles)
+    engine.dispose()
+    return first_id
+
+# ---------------------------------------------------------------------------
+# Recipes
+# ---------------------------------------------------------------------------
+
+# (word, kcal, protein, carbs, fat, price) – per-serving contributions
+PROTEINS = [
+    ("Chicken", 220, 35, 0, 8, 3.2),   ("Beef", 280, 30, 0, 17, 4.5),
+    ("Pork", 260, 28, 0, 16, 3.6),     ("Turkey", 200, 32, 0, 7, 3.4),
+    ("Salmon", 250, 27, 0, 15, 5.8),   ("Tuna", 180, 30, 0, 5, 3.9),
+    ("Shrimp", 150, 28, 1, 2, 5.2),    ("Cod", 160, 30, 0, 2, 4.8),
+    ("Lamb", 300, 27, 0, 21, 6.0),     ("Egg", 160, 13, 1, 11, 1.2),
+    ("Tofu", 170, 18, 4, 10, 1.9),     ("Tempeh", 210, 20, 9, 11, 2.4),
+    ("Chickpea", 210, 11, 35, 4, 1.1), ("Lentil", 230, 18, 40, 1, 1.0),
+    ("Black Bean", 220, 15, 40, 1, 1.0), ("Paneer", 290, 18, 4, 22, 3.0),
+]
+DISHES = [
+    ("Salad", 120, 3, 12, 7, 2.0),     ("Bowl", 230, 6, 40, 6, 2.2),
+    ("Wrap", 260, 8, 38, 8, 2.4),      ("Sandwich", 280, 9, 40, 9, 2.3),
+    ("Pasta", 330, 11, 60, 6, 2.1),    ("Curry", 260, 5, 30, 13, 2.6),
+    ("Stir Fry", 220, 5, 28, 10, 2.5), ("Tacos", 280, 8, 34, 12, 2.7),
+    ("Soup", 150, 5, 20, 5, 1.8),      ("Burrito", 360, 12, 52, 11, 2.9),
+    ("Noodles", 310, 9, 55, 6, 2.2),   ("Toast", 200, 7, 30, 6, 1.5),
+]
+SIDES = [
+    ("", 0, 0, 0, 0, 0.0),             ("with Quinoa", 120, 4, 21, 2, 1.1),
+    ("with Brown Rice", 110, 3, 23, 1, 0.6), ("with Cheese", 110, 7, 1, 9, 0.9),
+    ("with Yogurt Sauce", 60, 4, 4, 3, 0.7), ("with Almonds", 90, 3, 3, 8, 1.0),
+    ("with Peanut Sauce", 110, 4, 6, 9, 0.8), ("with Avocado", 120, 2, 6, 11, 1.3),
+    ("with Garlic Bread", 150, 4, 20, 6, 0.8), ("with Roasted Vegetables", 80, 2, 12, 3, 1.0),
+]
+PREPS = np.array(["Grilled", "Spicy", "Roasted", "Teriyaki", "Lemon Herb", "Smoky", "Garlic", "Classic"])
+
+
+def recipe_catalogue(count: int, seed: int = 42) -> Iterator[pd.DataFrame]:
+    """Yield catalogue chunks with realistic, keyword-bearing names."""
+    tables = [np.array([row[1:] for row in t], dtype=float) for t in (PROTEINS, DISHES, SIDES)]
+    words  = [np.array([row[0] for row in t]) for t in (PROTEINS, DISHES, SIDES)]
+
+    for chunk, start in enumerate(range(0, count, CHUNK)):
+        n   = min(CHUNK, count - start)
+        rng = np.random.default_rng((seed, chunk, 1))
+        p, d, s = (rng.integers(0, len(t), n) for t in tables)
+        prep    = rng.choice(PREPS, n)
+
+        feats = (tables[0][p] + tables[1][d] + tables[2][s]) * rng.uniform(0.85, 1.15, (n, 5))
+        feats[:, 4] += 2.5                                  # preparation overhead
+        names = np.char.add(np.char.add(np.char.add(prep, " "), words[0][p]), " ")
+        names = np.char.strip(np.char.add(np.char.add(names, words[1][d]), np.char.add(" ", words[2][s])))
+
+        df = pd.DataFrame({
+            "name":     names,
+            "calories": feats[:, 0].round().astype(int),
+            "protein":  feats[:, 1].round(),
+            "carbs":    feats[:, 2].round(),
+            "fat":      feats[:, 3].round(),
+            "price":    feats[:, 4].round(2),
+        })
+        df["cluster"] = database.model.predict(
+            database.scaler.transform(df[["calories", "protein", "carbs", "fat", "price"]].to_numpy())
+        )
+        yield df
+
+
+def write_recipes(path: str, count: int, seed: int = 42) -> None:
+    for i, df in enumerate(recipe_catalogue(count, seed)):
+        df.to_csv(path, mode="w" if i == 0 else "a", header=(i == 0), index=False)
+
+# ---------------------------------------------------------------------------
+# CLI
+# ---------------------------------------------------------------------------
+
+def main(argv: Optional[list[str]] = None) -> int:
+    import warnings
+    warnings.filterwarnings("ignore", message="X does not have valid feature names")
+
+    parser = argparse.ArgumentParser(description="Generate synthetic NutriCart data.")
+    sub = parser.add_subparsers(dest="kind", required=True)
+
+    users = sub.add_parser("users", help="bulk-insert users + profiles")
+    users.add_argument("--count", type=int, required=True)
+    users.add_argument("--seed", type=int, default=42)
+    users.add_argument("--database-url", default=database.SQLALCHEMY_DATABASE_URL)
+
+    recipes = sub.add_parser("recipes", help="write a recipe catalogue CSV")
+    recipes.add_argument("--count", type=int, required=True)
+    recipes.add_argument("--seed", type=int, default=42)
+    recipes.add_argument("-o", "--output", required=True)
+
+    args = parser.parse_args(argv)
+    if args.kind == "users":
+        first = load_users(args.database_url, args.count, args.seed)
+        print(f"inserted {args.count} users (ids {first}..{first + args.count - 1}); "
+              f"password: {SYNTHETIC_PASSWORD}")
+    else:
+        write_recipes(args.output, args.count, args.seed)
+        print(f"wrote {args.count} recipes to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,42 @@
+"""
+Gunicorn settings for the multi-worker deployment.
+
+    gunicorn -c gunicorn.conf.py app.main:app
+
+The app is imported once in the master (``preload_app``) and workers are
+forked from it, sharing the catalogue copy-on-write; see ``app/workers.py``.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import workers as _workers  # noqa: E402
+
+bind          = f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', '8000')}"
+workers       = _workers.default_workers()
+worker_class  = "uvicorn.workers.UvicornWorker"
+preload_app   = True
+timeout       = int(os.getenv("GUNICORN_TIMEOUT", "30"))
+graceful_timeout = 20
+keepalive     = 5
+accesslog     = None
+errorlog      = "-"
+loglevel      = os.getenv("LOG_LEVEL", "info")
+
+
+def when_ready(server):
+    # startup work once here rather than racing in every worker's lifespan,
+    # which skips it once ``prefork`` has run
+    from app.auth import configure_password_hashing, prune_refresh_tokens
+    from app.database import SessionLocal, init_db
+    init_db()
+    configure_password_hashing()        # calibrate once; workers inherit the cost
+    with SessionLocal() as db:
+        prune_refresh_tokens(db)
+    _workers.prefork()
+    server.log.info("Pre-fork done; starting %d workers", server.num_workers)
+
+
+def post_fork(server, worker):
+    _workers.postfork()
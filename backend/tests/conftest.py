@@ -1,8 +1,12 @@
 """
 Test configuration and fixtures for pytest.
+
+Every pytest-xdist worker (``pytest -n auto``) is its own process with its
+own in-memory databases, so workers never share state. The schema is
+created once per worker and each test runs inside a transaction that is
+rolled back afterwards; requests commit to SAVEPOINTs within it.
 """
 import pytest
-import tempfile
 import os
 import sys
 from pathlib import Path
@@ -10,40 +14,85 @@ from pathlib import Path
 backend_dir = Path(__file__).parent.parent
 sys.path.insert(0, str(backend_dir))
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+# Must be set before ``app`` is imported: the engine, the bcrypt cost and the
+# ML artefact paths are read at import time. The artefacts themselves are
+# loaded by that import, i.e. once per worker process.
+os.environ["DATABASE_URL"] = "sqlite://"
+os.environ.pop("DATABASE_REPLICA_URL", None)
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+os.environ.setdefault("SCALER_PATH", str(backend_dir / "scaler.pkl"))
+os.environ.setdefault("MODEL_PATH", str(backend_dir / "meal_cluster_model.pkl"))
+os.environ.setdefault("RECIPES_PATH", str(backend_dir / "recipes_with_clusters.csv"))
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
 from app.database import Base
-from app.auth import get_db
+from app.auth import get_db, get_read_db
 from app.main import app
+from app import ratelimit
 
-# Test database setup
-SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Test database: one in-memory SQLite connection per worker
+engine = create_engine(
+    "sqlite://",
+    connect_args={"check_same_thread": False},
+    poolclass=StaticPool,
+)
 
-@pytest.fixture(scope="function")
-def test_db():
-    """Create a test database for each test function."""
-    Base.metadata.create_all(bind=engine)
+@event.listens_for(engine, "connect")
+def _disable_pysqlite_transactions(dbapi_connection, connection_record):
+    # pysqlite's implicit BEGIN breaks SAVEPOINT; let SQLAlchemy emit it
+    dbapi_connection.isolation_level = None
+
+@event.listens_for(engine, "begin")
+def _begin(conn):
+    conn.exec_driver_sql("BEGIN")
+
+@pytest.fixture(autouse=True)
+def reset_rate_limits():
+    """Start every test with full rate-limit buckets."""
+    ratelimit.backend.reset()
     yield
+
+@pytest.fixture(scope="session")
+def test_schema():
+    """Create the schema once per worker."""
+    Base.metadata.create_all(bind=engine)
+    yield engine
     Base.metadata.drop_all(bind=engine)
 
+@pytest.fixture(scope="function")
+def test_db(test_schema):
+    """Session inside a per-test transaction that is rolled back afterwards.
+
+    ``commit()`` only releases a SAVEPOINT, so endpoints behave as usual
+    while nothing outlives the test.
+    """
+    connection = test_schema.connect()
+    transaction = connection.begin()
+    session = Session(bind=connection, autoflush=False,
+                      join_transaction_mode="create_savepoint")
+    yield session
+    session.close()
+    transaction.rollback()
+    connection.close()
+
 @pytest.fixture
-def override_get_db():
+def override_get_db(test_db):
     """Override the get_db dependency for testing."""
     def _override_get_db():
         try:
-            db = TestingSessionLocal()
-            yield db
+            yield test_db
         finally:
-            db.close()
+            test_db.close()             # ends the request's SAVEPOINT
     return _override_get_db
 
 @pytest.fixture
-def client_with_test_db(test_db, override_get_db):
+def client_with_test_db(override_get_db):
     """FastAPI test client with test database."""
     from fastapi.testclient import TestClient
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
     with TestClient(app) as client:
         yield client
     app.dependency_overrides.clear()
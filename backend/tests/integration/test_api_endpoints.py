@@ -1,6 +1,7 @@
 """
 Integration tests for API endpoints with database interactions.
 """
+import json
 import pytest
 import sys
 from pathlib import Path
@@ -260,3 +261,443 @@ def test_protected_endpoint_with_invalid_token(client_with_test_db):
     headers = {"Authorization": "Bearer invalid_token_here"}
     response = client_with_test_db.get("/profile", headers=headers)
     assert response.status_code == 401
+
+def test_admin_export_requires_admin(client_with_test_db):
+    """Non-admin users cannot export tables."""
+    user_data = {
+        "first_name": "Plain",
+        "last_name": "User",
+        "email": "plain@test.com",
+        "password": "testpass123"
+    }
+    client_with_test_db.post("/auth/register", json=user_data)
+    login_response = client_with_test_db.post("/auth/login", json={
+        "email": "plain@test.com",
+        "password": "testpass123"
+    })
+    headers = {"Authorization": f"Bearer {login_response.json()['access_token']}"}
+
+    response = client_with_test_db.get("/admin/export/users", headers=headers)
+    assert response.status_code == 403
+
+def test_admin_export_contacts(client_with_test_db, monkeypatch):
+    """Admins can stream contacts as NDJSON and CSV."""
+    monkeypatch.setattr("app.auth.ADMIN_EMAILS", frozenset({"admin@test.com"}))
+    user_data = {
+        "first_name": "Admin",
+        "last_name": "User",
+        "email": "admin@test.com",
+        "password": "testpass123"
+    }
+    client_with_test_db.post("/auth/register", json=user_data)
+    login_response = client_with_test_db.post("/auth/login", json={
+        "email": "admin@test.com",
+        "password": "testpass123"
+    })
+    headers = {"Authorization": f"Bearer {login_response.json()['access_token']}"}
+
+    for i in range(3):
+        client_with_test_db.post("/contact", json={
+            "first_name": f"Contact{i}",
+            "last_name": "Test",
+            "email": f"contact{i}@test.com",
+            "message": "Hello"
+        })
+
+    response = client_with_test_db.get("/admin/export/contacts", headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = response.text.strip().splitlines()
+    assert len(lines) == 3
+    assert json.loads(lines[0])["first_name"] == "Contact0"
+
+    response = client_with_test_db.get("/admin/export/users?format=csv", headers=headers)
+    assert response.status_code == 200
+    header, row = response.text.strip().splitlines()
+    assert "hashed_password" not in header
+    assert "admin@test.com" in row
+
+def _login_with_profile(client, email):
+    client.post("/auth/register", json={
+        "first_name": "Cache",
+        "last_name": "Test",
+        "email": email,
+        "password": "testpass123"
+    })
+    login_response = client.post("/auth/login", json={"email": email, "password": "testpass123"})
+    headers = {"Authorization": f"Bearer {login_response.json()['access_token']}"}
+    client.post("/profile", headers=headers, json={
+        "age": 30, "weight": 70.0, "height": 175.0, "goal": "maintain"
+    })
+    user_id = client.get("/auth/me", headers=headers).json()["id"]
+    return user_id, headers
+
+def test_conditional_get_profile_and_me(client_with_test_db):
+    """ETags on /profile and /auth/me are answered with 304 until the row changes."""
+    _, headers = _login_with_profile(client_with_test_db, "etag@test.com")
+
+    for path in ("/profile", "/auth/me"):
+        first = client_with_test_db.get(path, headers=headers)
+        assert first.status_code == 200
+        etag = first.headers["etag"]
+        assert "last-modified" in first.headers
+
+        again = client_with_test_db.get(path, headers={**headers, "If-None-Match": etag})
+        assert again.status_code == 304
+        assert again.content == b""
+
+    etag = client_with_test_db.get("/profile", headers=headers).headers["etag"]
+    client_with_test_db.post("/profile", headers=headers, json={
+        "age": 31, "weight": 70.0, "height": 175.0, "goal": "maintain"
+    })
+    changed = client_with_test_db.get("/profile", headers={**headers, "If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.json()["age"] == 31
+
+def test_profile_update_forgets_recent_meals(client_with_test_db):
+    """Saving a profile drops the meals recently served from its old pool."""
+    from app import database
+    user_id, headers = _login_with_profile(client_with_test_db, "history@test.com")
+    client_with_test_db.get(f"/generate_plan/{user_id}", headers=headers)
+    assert len(database.meal_history.recent(user_id, database.CATALOGUE_VERSION)) == 21
+
+    client_with_test_db.post("/profile", headers=headers, json={
+        "age": 30, "weight": 70.0, "height": 175.0, "goal": "lose"
+    })
+    assert len(database.meal_history.recent(user_id, database.CATALOGUE_VERSION)) == 0
+
+def test_conditional_get_plan_and_compression(client_with_test_db):
+    """Plans carry a weak ETag, revalidate with 304 and are compressed."""
+    user_id, headers = _login_with_profile(client_with_test_db, "plancache@test.com")
+
+    response = client_with_test_db.get(
+        f"/generate_plan/{user_id}", headers={**headers, "Accept-Encoding": "gzip"}
+    )
+    assert response.status_code == 200
+    assert response.headers["etag"].startswith('W/"')
+    assert response.headers["content-encoding"] == "gzip"
+    assert len(response.json()["weekly_plan"]) == 7
+
+    again = client_with_test_db.get(
+        f"/generate_plan/{user_id}",
+        headers={**headers, "If-None-Match": response.headers["etag"]},
+    )
+    assert again.status_code == 304
+
+    # the ETag follows the catalogue's content, not how often it was loaded
+    from app import database
+    original = database.recipes
+    conditional = {**headers, "If-None-Match": response.headers["etag"]}
+    try:
+        database.use_catalogue(original.frame())
+        assert client_with_test_db.get(f"/generate_plan/{user_id}", headers=conditional).status_code == 304
+        repriced = original.frame()
+        repriced["price"] = repriced["price"] * 1.1
+        database.use_catalogue(repriced)
+        assert client_with_test_db.get(f"/generate_plan/{user_id}", headers=conditional).status_code == 200
+    finally:
+        database.use_catalogue(original)
+
+def test_small_responses_are_not_compressed(client_with_test_db):
+    """Bodies under the size threshold are sent as-is."""
+    response = client_with_test_db.get("/", headers={"Accept-Encoding": "gzip, br"})
+    assert "content-encoding" not in response.headers
+
+def test_brotli_preferred_when_available(client_with_test_db):
+    """Clients accepting br get brotli when the package is installed."""
+    brotli = pytest.importorskip("brotli")
+    user_id, headers = _login_with_profile(client_with_test_db, "brotli@test.com")
+    response = client_with_test_db.get(
+        f"/generate_plan/{user_id}", headers={**headers, "Accept-Encoding": "gzip, br"}
+    )
+    assert response.headers["content-encoding"] == "br"
+    assert len(response.json()["weekly_plan"]) == 7
+
+def test_login_rate_limited_before_hashing(client_with_test_db, monkeypatch):
+    """Once an account's bucket is empty, logins get 429 without running bcrypt."""
+    from app import auth, ratelimit
+    creds = {"email": "limited@test.com", "password": "wrongpass"}
+    client_with_test_db.post("/auth/register", json={
+        "first_name": "Rate", "last_name": "Limit",
+        "email": creds["email"], "password": "testpass123",
+    })
+
+    calls = []
+    real_verify = auth.verify_password
+    monkeypatch.setattr(auth, "verify_password", lambda *a: calls.append(1) or real_verify(*a))
+
+    capacity = int(ratelimit.LIMITS["login"]["email"].capacity)
+    for _ in range(capacity):
+        assert client_with_test_db.post("/auth/login", json=creds).status_code == 401
+    assert len(calls) == capacity
+
+    response = client_with_test_db.post("/auth/login", json=creds)
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+    assert len(calls) == capacity
+
+def test_security_question_lookup_rate_limited(client_with_test_db):
+    """Enumerating accounts through get-security-questions is throttled per IP."""
+    from app import ratelimit
+    capacity = int(ratelimit.LIMITS["get-security-questions"]["ip"].capacity)
+    statuses = [
+        client_with_test_db.post("/auth/get-security-questions",
+                                 json={"email": f"probe{i}@test.com"}).status_code
+        for i in range(capacity + 1)
+    ]
+    assert statuses[:capacity] == [404] * capacity
+    assert statuses[-1] == 429
+
+def _login(client, email):
+    creds = {"email": email, "password": "testpass123"}
+    client.post("/auth/register", json={"first_name": "R", "last_name": "T", **creds})
+    return client.post("/auth/login", json=creds).json()
+
+def test_refresh_rotates_without_password(client_with_test_db, monkeypatch):
+    """/auth/refresh mints new tokens without any bcrypt work."""
+    from app import auth
+    tokens = _login(client_with_test_db, "refresh@test.com")
+    assert tokens["refresh_token"] and tokens["expires_in"] == auth.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+
+    monkeypatch.setattr(auth.pwd_context, "verify", lambda *a: pytest.fail("bcrypt used"))
+    response = client_with_test_db.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert response.status_code == 200
+    renewed = response.json()
+    assert renewed["refresh_token"] != tokens["refresh_token"]
+
+    me = client_with_test_db.get("/auth/me", headers={"Authorization": f"Bearer {renewed['access_token']}"})
+    assert me.status_code == 200
+    assert me.json()["email"] == "refresh@test.com"
+
+def test_refresh_token_cannot_authenticate_requests(client_with_test_db):
+    """A refresh token is not accepted as a bearer access token."""
+    tokens = _login(client_with_test_db, "typed@test.com")
+    response = client_with_test_db.get("/auth/me", headers={"Authorization": f"Bearer {tokens['refresh_token']}"})
+    assert response.status_code == 401
+
+def test_refresh_token_reuse_revokes_family(client_with_test_db):
+    """Replaying a rotated token kills every token descended from that login."""
+    first = _login(client_with_test_db, "reuse@test.com")["refresh_token"]
+    second = client_with_test_db.post("/auth/refresh", json={"refresh_token": first}).json()["refresh_token"]
+
+    assert client_with_test_db.post("/auth/refresh", json={"refresh_token": first}).status_code == 401
+    assert client_with_test_db.post("/auth/refresh", json={"refresh_token": second}).status_code == 401
+
+def test_logout_and_password_reset_revoke_refresh_tokens(client_with_test_db):
+    """Logout revokes the session's family; a password reset revokes all of them."""
+    a = _login(client_with_test_db, "revoke@test.com")["refresh_token"]
+    b = client_with_test_db.post("/auth/login", json={
+        "email": "revoke@test.com", "password": "testpass123"}).json()["refresh_token"]
+
+    assert client_with_test_db.post("/auth/logout", json={"refresh_token": a}).status_code == 200
+    assert client_with_test_db.post("/auth/refresh", json={"refresh_token": a}).status_code == 401
+
+    client_with_test_db.post("/auth/reset-password-verified", json={
+        "email": "revoke@test.com", "password": "newpass123"})
+    assert client_with_test_db.post("/auth/refresh", json={"refresh_token": b}).status_code == 401
+
+def test_admin_profile_import(client_with_test_db, monkeypatch):
+    """Admins bulk-upsert profiles; unknown user ids are reported, not stored."""
+    monkeypatch.setattr("app.auth.ADMIN_EMAILS", frozenset({"importer@test.com"}))
+    admin = _login(client_with_test_db, "importer@test.com")
+    user = client_with_test_db.post("/auth/register", json={
+        "first_name": "P", "last_name": "I", "email": "imported@test.com", "password": "testpass123",
+    }).json()
+    profile = {"age": 41, "weight": 80, "height": 180, "goal": "lose",
+               "budget": 90, "dietary_restrictions": ["halal"]}
+
+    response = client_with_test_db.post(
+        "/admin/profiles",
+        headers={"Authorization": f"Bearer {admin['access_token']}"},
+        json=[{"user_id": user["id"], **profile}, {"user_id": 999999, **profile}],
+    )
+    assert response.status_code == 200
+    assert response.json() == {"upserted": 1, "skipped_user_ids": [999999]}
+
+    token = client_with_test_db.post("/auth/login", json={
+        "email": "imported@test.com", "password": "testpass123"}).json()["access_token"]
+    stored = client_with_test_db.get("/profile", headers={"Authorization": f"Bearer {token}"}).json()
+    assert stored["goal"] == "lose" and stored["dietary_restrictions"] == ["halal"]
+
+    forbidden = client_with_test_db.post("/admin/profiles", json=[],
+                                         headers={"Authorization": f"Bearer {token}"})
+    assert forbidden.status_code == 403
+
+def test_registration_duplicate_relies_on_unique_index(client_with_test_db, test_db):
+    """Registration never looks the e-mail up first; the insert conflict decides."""
+    from sqlalchemy import event
+    engine = test_db.get_bind().engine     # not the job runner's polling engine
+    statements = []
+    def record(conn, cursor, statement, *args):
+        keyword = statement.split()[0].upper()
+        if keyword not in ("SAVEPOINT", "RELEASE", "ROLLBACK"):    # test transaction
+            statements.append(keyword)
+    user = {"first_name": "U", "last_name": "Q", "email": "unique@test.com", "password": "testpass123"}
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        first = client_with_test_db.post("/auth/register", json=user)
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    assert statements == ["INSERT"]
+    assert first.status_code == 200 and first.json()["is_active"] is True
+    second = client_with_test_db.post("/auth/register", json=user)
+    assert second.status_code == 400
+    assert second.json()["detail"] == "Email already registered"
+
+def test_admin_bulk_registration(client_with_test_db, monkeypatch):
+    """Partners' users are inserted in one transaction; existing e-mails are skipped."""
+    from passlib.context import CryptContext
+    monkeypatch.setattr("app.auth.ADMIN_EMAILS", frozenset({"partner-admin@test.com"}))
+    # cheap hashes: this test is about the insert path, not bcrypt
+    monkeypatch.setattr("app.auth.pwd_context", CryptContext(schemes=["bcrypt"], bcrypt__rounds=4))
+    monkeypatch.setattr("app.main.BULK_REGISTER_LIMIT", 30)
+    admin = _login(client_with_test_db, "partner-admin@test.com")
+    headers = {"Authorization": f"Bearer {admin['access_token']}"}
+    users = [{"first_name": "P", "last_name": str(i), "email": f"partner{i}@test.com",
+              "password": f"pass{i}word"} for i in range(25)]
+    users.append({**users[0], "first_name": "Dup"})               # duplicate inside request
+
+    response = client_with_test_db.post("/admin/users/bulk", headers=headers, json=users)
+    assert response.status_code == 200
+    body = response.json()
+    assert len(body["created"]) == 25 and body["existing_emails"] == []
+
+    again = client_with_test_db.post("/admin/users/bulk", headers=headers, json=users[:3] + [
+        {"first_name": "N", "last_name": "W", "email": "partner-new@test.com", "password": "newpass123"}])
+    assert [u["email"] for u in again.json()["created"]] == ["partner-new@test.com"]
+    assert again.json()["existing_emails"] == [u["email"] for u in users[:3]]
+
+    login = client_with_test_db.post("/auth/login", json={"email": "partner7@test.com", "password": "pass7word"})
+    assert login.status_code == 200
+
+    too_many = client_with_test_db.post("/admin/users/bulk", headers=headers, json=users * 2)
+    assert too_many.status_code == 413
+
+def test_read_paths_use_replica_session(client_with_test_db, override_get_db):
+    """Auth lookups and GET-style reads use the replica session; writes the primary."""
+    from app.auth import get_db, get_read_db
+    used = []
+    def tagged(name):
+        def dependency():
+            used.append(name)
+            yield from override_get_db()
+        return dependency
+    user_id, headers = _login_with_profile(client_with_test_db, "replica@test.com")
+    client_with_test_db.get(f"/generate_plan/{user_id}", headers=headers)
+    app.dependency_overrides[get_db] = tagged("primary")
+    app.dependency_overrides[get_read_db] = tagged("replica")
+
+    for path in ("/profile", "/auth/me", f"/plan_summary/{user_id}"):
+        used.clear()
+        assert client_with_test_db.get(path, headers=headers).status_code == 200
+        assert used == ["replica"], path
+
+    used.clear()                                    # reads the profile, saves the served plan
+    assert client_with_test_db.get(f"/generate_plan/{user_id}", headers=headers).status_code == 200
+    assert sorted(used) == ["primary", "replica"]
+
+    used.clear()
+    client_with_test_db.post("/profile", headers=headers, json={
+        "age": 32, "weight": 70.0, "height": 175.0, "goal": "maintain"})
+    assert "primary" in used
+
+def test_profile_targets_and_cluster_analytics(client_with_test_db, monkeypatch):
+    """Targets are returned with the profile; admins see profiles per cluster."""
+    monkeypatch.setattr("app.auth.ADMIN_EMAILS", frozenset({"analytics@test.com"}))
+    _, headers = _login_with_profile(client_with_test_db, "targets@test.com")
+    profile = client_with_test_db.get("/profile", headers=headers).json()
+    assert profile["tdee"] > profile["bmr"] > 0
+    assert profile["kcal_target"] == pytest.approx(profile["tdee"] / 3)
+    assert isinstance(profile["cluster"], int)
+
+    admin = _login(client_with_test_db, "analytics@test.com")
+    admin_headers = {"Authorization": f"Bearer {admin['access_token']}"}
+    stats = client_with_test_db.get("/admin/analytics/clusters", headers=admin_headers).json()
+    assert stats == [{"cluster": profile["cluster"], "profiles": 1,
+                      "avg_tdee": pytest.approx(profile["tdee"]),
+                      "avg_price_per_meal": pytest.approx(profile["avg_price_per_meal"])}]
+    assert client_with_test_db.get("/admin/analytics/clusters", headers=headers).status_code == 403
+
+def test_profile_sex_and_activity_level(client_with_test_db):
+    """Sex and activity level are stored and drive the energy targets."""
+    _, headers = _login_with_profile(client_with_test_db, "activity@test.com")
+    sedentary = client_with_test_db.get("/profile", headers=headers).json()
+    assert sedentary["sex"] is None and sedentary["activity_level"] is None
+
+    saved = client_with_test_db.post("/profile", headers=headers, json={
+        "age": 30, "weight": 70.0, "height": 175.0, "goal": "maintain",
+        "sex": "female", "activity_level": "moderate",
+    }).json()
+    assert saved["sex"] == "female" and saved["activity_level"] == "moderate"
+    assert saved["bmr"] == pytest.approx(sedentary["bmr"] - 166)
+    assert saved["tdee"] == pytest.approx(saved["bmr"] * 1.55)
+
+    invalid = client_with_test_db.post("/profile", headers=headers, json={
+        "age": 30, "weight": 70.0, "height": 175.0, "goal": "maintain",
+        "activity_level": "couch",
+    })
+    assert invalid.status_code == 422
+
+def test_plan_summary_endpoint(client_with_test_db):
+    """/plan_summary reports on the plan last served, swaps included, and revalidates."""
+    user_id, headers = _login_with_profile(client_with_test_db, "summary@test.com")
+    assert client_with_test_db.get(f"/plan_summary/{user_id}", headers=headers).status_code == 404
+
+    plan = client_with_test_db.get(f"/generate_plan/{user_id}", headers=headers).json()
+    response = client_with_test_db.get(f"/plan_summary/{user_id}", headers=headers)
+    assert response.status_code == 200
+    body = response.json()
+    assert "weekly_plan" not in body
+    assert body == {k: v for k, v in plan.items() if k != "weekly_plan"}
+    assert client_with_test_db.get(f"/plan_summary/{user_id}", headers=headers).json() == body
+
+    again = client_with_test_db.get(f"/plan_summary/{user_id}",
+                                    headers={**headers, "If-None-Match": response.headers["etag"]})
+    assert again.status_code == 304
+
+    old = plan["weekly_plan"][2]["meals"][1]
+    meal = client_with_test_db.post(f"/swap_meal/{user_id}", headers=headers,
+                                    json={"day_index": 2, "meal_index": 1}).json()
+    swapped = client_with_test_db.get(f"/plan_summary/{user_id}",
+                                      headers={**headers, "If-None-Match": response.headers["etag"]})
+    assert swapped.status_code == 200
+    day = swapped.json()["summary"]["days"][2]["totals"]
+    assert day["price"] == pytest.approx(
+        body["summary"]["days"][2]["totals"]["price"] - old["price"] + meal["price"], abs=0.01)
+    assert client_with_test_db.get(f"/plan_summary/{user_id + 1}", headers=headers).status_code == 403
+
+def test_admin_background_job_with_progress_stream(client_with_test_db, monkeypatch, tmp_path):
+    """Admins queue a job, follow it over server-sent events and download its output."""
+    from app import jobs
+    monkeypatch.setattr("app.auth.ADMIN_EMAILS", frozenset({"jobs-admin@test.com"}))
+    monkeypatch.setattr(jobs, "JOB_OUTPUT_DIR", tmp_path)
+    _, headers = _login_with_profile(client_with_test_db, "jobs-admin@test.com")
+    _, user_headers = _login_with_profile(client_with_test_db, "jobs-user@test.com")
+
+    assert client_with_test_db.post("/admin/jobs", headers=user_headers,
+                                    json={"kind": "export"}).status_code == 403
+    assert client_with_test_db.post("/admin/jobs", headers=headers,
+                                    json={"kind": "nope"}).status_code == 422
+    response = client_with_test_db.post("/admin/jobs", headers=headers, json={
+        "kind": "export", "params": {"table": "contacts", "format": "csv"}})
+    assert response.status_code == 202
+    job_id = response.json()["id"]
+
+    events = []
+    with client_with_test_db.stream("GET", f"/admin/jobs/{job_id}/events", headers=headers) as stream:
+        assert stream.headers["content-type"].startswith("text/event-stream")
+        for line in stream.iter_lines():
+            if line.startswith("event: "):
+                events.append(line[len("event: "):])
+            elif line.startswith("data: "):
+                data = json.loads(line[len("data: "):])
+    assert events[-1] == "succeeded" and data["progress"] == 1.0
+
+    job = client_with_test_db.get(f"/admin/jobs/{job_id}", headers=headers).json()
+    assert job["status"] == "succeeded" and job["result"]["media_type"] == "text/csv"
+    assert job_id in [j["id"] for j in client_with_test_db.get(
+        "/admin/jobs?status=succeeded", headers=headers).json()]
+    download = client_with_test_db.get(f"/admin/jobs/{job_id}/download", headers=headers)
+    assert download.status_code == 200
+    assert download.text.splitlines()[0].startswith("id,first_name")
+    assert client_with_test_db.get("/admin/jobs/missing", headers=headers).status_code == 404
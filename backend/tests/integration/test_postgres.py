@@ -0,0 +1,79 @@
+"""
+End-to-end flows against a real PostgreSQL server.
+
+Skipped unless ``TEST_POSTGRES_URL`` points at a scratch database, e.g.
+``TEST_POSTGRES_URL=postgresql://postgres@127.0.0.1:5432/nutricart_test``.
+The tables are created and dropped by the test.
+"""
+import os
+import pytest
+import sys
+from pathlib import Path
+
+backend_dir = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import sessionmaker
+from app.auth import get_db, get_read_db
+from app.database import Base, make_engine
+from app.main import app
+
+POSTGRES_URL = os.getenv("TEST_POSTGRES_URL")
+
+pytestmark = pytest.mark.skipif(not POSTGRES_URL, reason="TEST_POSTGRES_URL not set")
+
+
+@pytest.fixture
+def pg_client():
+    engine = make_engine(POSTGRES_URL)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    def override():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override
+    app.dependency_overrides[get_read_db] = override
+    try:
+        with TestClient(app) as client:
+            yield client
+    finally:
+        app.dependency_overrides.clear()
+        Base.metadata.drop_all(bind=engine)
+        engine.dispose()
+
+
+def test_postgres_user_flow(pg_client, monkeypatch):
+    """Register, log in, upsert a profile, plan, swap and refresh on PostgreSQL."""
+    creds = {"email": "pg@test.com", "password": "testpass123"}
+    user = pg_client.post("/auth/register", json={"first_name": "P", "last_name": "G", **creds})
+    assert user.status_code == 200
+    duplicate = pg_client.post("/auth/register", json={"first_name": "P", "last_name": "G", **creds})
+    assert duplicate.status_code == 400
+
+    tokens = pg_client.post("/auth/login", json=creds).json()
+    headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+    for age in (30, 31):                                # insert, then ON CONFLICT update
+        saved = pg_client.post("/profile", headers=headers, json={
+            "age": age, "weight": 70.0, "height": 175.0, "goal": "maintain",
+            "dietary_restrictions": ["vegetarian"],
+        })
+        assert saved.status_code == 200
+    assert pg_client.get("/profile", headers=headers).json()["age"] == 31
+
+    user_id = user.json()["id"]
+    assert pg_client.get(f"/generate_plan/{user_id}", headers=headers).status_code == 200
+    swap = pg_client.post(f"/swap_meal/{user_id}", headers=headers,
+                          json={"day_index": 0, "meal_index": 0})
+    assert swap.status_code == 200
+
+    rotated = pg_client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert rotated.status_code == 200
+    reused = pg_client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert reused.status_code == 401
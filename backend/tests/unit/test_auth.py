@@ -187,3 +187,206 @@ def test_get_current_active_user_inactive():
     
     assert exc_info.value.status_code == 400
     assert "Inactive user" in exc_info.value.detail
+
+QA = {"First pet?": "Rex", "Birth city?": " São  Paulo ", "Favourite food?": "Pizza"}
+
+def test_security_answers_single_digest():
+    """Answers are stored as one scrypt digest and normalised on verify."""
+    from app.auth import hash_security_answers, check_security_answers, stored_questions
+    stored = hash_security_answers(QA)
+    assert stored["v"] == 2 and stored["kdf"] == "scrypt"
+    assert stored_questions(stored) == list(QA)
+    assert "Rex" not in str(stored)
+
+    assert check_security_answers(stored, {
+        "First pet?": "rex", "Birth city?": "são paulo", "Favourite food?": "PIZZA",
+    })
+    assert not check_security_answers(stored, {**QA, "Favourite food?": "Pasta"})
+
+def test_security_answers_require_every_question():
+    """A subset (or extra keys) never verifies."""
+    from app.auth import hash_security_answers, check_security_answers
+    stored = hash_security_answers(QA)
+    subset = {k: QA[k] for k in list(QA)[:2]}
+    assert not check_security_answers(stored, subset)
+    assert not check_security_answers(stored, {**QA, "Extra?": "x"})
+    assert not check_security_answers(None, QA)
+
+def test_legacy_security_answers_migrate_on_success(tmp_path):
+    """Per-answer bcrypt rows are re-keyed after the next successful verify."""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from app.database import Base
+    from app.auth import verify_security_answers, get_user_security_questions
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'qa.db'}")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    legacy = {q: get_password_hash(a.lower().strip()) for q, a in QA.items()}
+    user = User(first_name="A", last_name="B", email="qa@example.com",
+                hashed_password="x", security_qa_json=legacy)
+    db.add(user)
+    db.commit()
+
+    assert get_user_security_questions(db, user.id) == list(QA)
+    assert not verify_security_answers(db, user.id, {**QA, "First pet?": "Max"})
+    db.refresh(user)
+    assert user.security_qa_json == legacy                   # failure keeps the old format
+
+    assert verify_security_answers(db, user.id, QA)
+    db.refresh(user)
+    assert user.security_qa_json["v"] == 2
+    assert get_user_security_questions(db, user.id) == list(QA)
+    assert verify_security_answers(db, user.id, QA)
+    db.close()
+    engine.dispose()
+
+def test_calibrate_bcrypt_rounds_extrapolates(monkeypatch):
+    """The probe time is extrapolated at 2x per round and clamped."""
+    from app import auth
+    ticks = iter([0.0, 0.01] * 3)       # every probe hash "takes" 10 ms
+    monkeypatch.setattr(auth.time, "perf_counter", lambda: next(ticks))
+    assert auth.calibrate_bcrypt_rounds(0.08) == auth.BCRYPT_PROBE_ROUNDS + 3
+
+    ticks = iter([0.0, 0.01] * 3)
+    monkeypatch.setattr(auth.time, "perf_counter", lambda: next(ticks))
+    assert auth.calibrate_bcrypt_rounds(0.001) == auth.BCRYPT_MIN_ROUNDS
+
+def test_login_rehashes_outdated_cost(monkeypatch):
+    """A hash below the current cost is replaced after a successful login; costlier ones are kept."""
+    from app import auth
+    monkeypatch.setattr(auth, "BCRYPT_ROUNDS", None)
+    old_rounds = auth.pwd_context.to_dict().get("bcrypt__rounds", 12)
+    old_hash = auth.pwd_context.handler("bcrypt").using(rounds=10).hash("pw123456")
+    user = User(email="cost@example.com", hashed_password=old_hash)
+    db = Mock()
+    try:
+        auth.configure_password_hashing(11)
+        assert auth.pwd_context.needs_update(old_hash)
+        with patch("app.auth.get_user_by_email", return_value=user):
+            assert auth.authenticate_user(db, user.email, "pw123456") is user
+        assert user.hashed_password != old_hash
+        assert user.hashed_password.startswith("$2b$11$")
+        db.commit.assert_called_once()
+
+        db.commit.reset_mock()
+        with patch("app.auth.get_user_by_email", return_value=user):
+            assert auth.authenticate_user(db, user.email, "wrong-password") is None
+        db.commit.assert_not_called()
+
+        auth.configure_password_hashing(10)             # e.g. calibrated on a busy start-up
+        assert not auth.pwd_context.needs_update(user.hashed_password)
+        assert auth.pwd_context.needs_update(auth.pwd_context.handler("bcrypt").using(rounds=9).hash("x"))
+        with patch("app.auth.get_user_by_email", return_value=user):
+            assert auth.authenticate_user(db, user.email, "pw123456") is user
+        assert user.hashed_password.startswith("$2b$11$")
+        db.commit.assert_not_called()
+    finally:
+        auth.configure_password_hashing(old_rounds)
+
+def test_hash_cost_metrics(tmp_path, monkeypatch):
+    """/metrics exposes how many users sit at each bcrypt cost."""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from app import auth, database
+    from app.metrics import REGISTRY
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'cost.db'}")
+    database.Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    for i, h in enumerate(["$2b$10$abc", "$2b$12$def", "$2b$12$ghi", "plain"]):
+        db.add(User(first_name="C", last_name="U", email=f"c{i}@example.com", hashed_password=h))
+    db.commit()
+    db.close()
+
+    monkeypatch.setattr(database, "engine", engine)
+    monkeypatch.setattr(auth, "_hash_costs", (0.0, []))
+    text = REGISTRY.render()
+    assert 'nutricart_password_hash_cost_users{scheme="bcrypt",cost="10"} 1' in text
+    assert 'nutricart_password_hash_cost_users{scheme="bcrypt",cost="12"} 2' in text
+    assert 'nutricart_password_hash_cost_users{scheme="other",cost=""} 1' in text
+    monkeypatch.setattr(auth, "_hash_costs", (0.0, []))
+    engine.dispose()
+
+def test_verify_token_cache_hit_skips_decode(monkeypatch):
+    """A token verified once is answered from the cache until it expires."""
+    from app import auth
+    auth.clear_token_cache()
+    token = create_access_token({"sub": "cached@example.com"})
+    assert verify_token(token) == "cached@example.com"
+
+    monkeypatch.setattr(auth, "decode_jwt", lambda t: pytest.fail("decoded again"))
+    assert verify_token(token) == "cached@example.com"
+
+    # past its exp the entry is dropped and the token verified again
+    digest = auth.hashlib.sha256(token.encode()).digest()
+    auth._token_cache[digest] = ("cached@example.com", 0.0)
+    def expired(t):
+        raise auth.InvalidTokenError("expired")
+    monkeypatch.setattr(auth, "decode_jwt", expired)
+    assert verify_token(token) is None
+    assert digest not in auth._token_cache
+
+def test_verify_token_cache_is_bounded(monkeypatch):
+    """The LRU never grows past TOKEN_CACHE_SIZE."""
+    from app import auth
+    auth.clear_token_cache()
+    monkeypatch.setattr(auth, "TOKEN_CACHE_SIZE", 5)
+    for i in range(20):
+        verify_token(create_access_token({"sub": f"u{i}@example.com"}))
+    assert len(auth._token_cache) == 5
+    auth.clear_token_cache()
+
+def test_signing_key_rotation(monkeypatch):
+    """Tokens signed with a retired-but-listed key stay valid; unknown kids fail."""
+    import jwt as pyjwt
+    from app import auth
+    auth.clear_token_cache()
+    monkeypatch.setattr(auth, "SIGNING_KEYS", {"old": "old-secret"})
+    monkeypatch.setattr(auth, "ACTIVE_KID", "old")
+    old_token = create_access_token({"sub": "rotate@example.com"})
+    assert pyjwt.get_unverified_header(old_token)["kid"] == "old"
+
+    monkeypatch.setattr(auth, "SIGNING_KEYS", {"new": "new-secret", "old": "old-secret"})
+    monkeypatch.setattr(auth, "ACTIVE_KID", "new")
+    new_token = create_access_token({"sub": "rotate@example.com"})
+    assert pyjwt.get_unverified_header(new_token)["kid"] == "new"
+    assert verify_token(old_token) == "rotate@example.com"
+    assert verify_token(new_token) == "rotate@example.com"
+
+    auth.clear_token_cache()
+    monkeypatch.setattr(auth, "SIGNING_KEYS", {"new": "new-secret"})
+    assert verify_token(old_token) is None
+    forged = pyjwt.encode({"sub": "x@example.com", "exp": 9999999999}, "new-secret",
+                          algorithm="HS256", headers={"kid": "other"})
+    assert verify_token(forged) is None
+    auth.clear_token_cache()
+
+def test_hashing_pool_runs_off_the_event_loop():
+    """Async hashing uses the dedicated pool and leaves nothing pending."""
+    import asyncio
+    import threading
+    from app import auth
+
+    seen = []
+    real_hash = auth.get_password_hash
+    def tracking_hash(password):
+        seen.append(threading.current_thread().name)
+        return real_hash(password)
+
+    with patch("app.auth.get_password_hash", tracking_hash):
+        hashes = asyncio.run(auth.hash_passwords_bulk(["pw-one-1", "pw-two-2"]))
+    assert all(name.startswith("bcrypt") for name in seen)
+    assert verify_password("pw-two-2", hashes[1])
+    busy, queued, workers = auth.hashing_pool_load()
+    assert (busy, queued) == (0, 0) and workers == auth.HASH_WORKERS
+
+def test_bulk_hash_limit_fits_the_time_budget(monkeypatch):
+    """A bulk batch is sized to finish in ``BULK_HASH_SECONDS`` on half the pool."""
+    from app import auth
+    monkeypatch.setattr(auth, "BULK_HASH_WORKERS", 2)
+    monkeypatch.setattr(auth, "BULK_HASH_SECONDS", 5.0)
+    monkeypatch.setattr(auth, "PASSWORD_HASH_TARGET_SECONDS", 0.25)
+    assert auth.bulk_hash_limit() == 40
+    monkeypatch.setattr(auth, "PASSWORD_HASH_TARGET_SECONDS", 60.0)
+    assert auth.bulk_hash_limit() == 1
@@ -0,0 +1,90 @@
+"""
+Unit tests for the benchmark harness (statistics and regression gate).
+"""
+import sys
+from pathlib import Path
+
+backend_dir = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from benchmarks.catalogue import synthetic_catalogue
+from benchmarks.harness import compare, summarize
+
+def test_summarize_percentiles():
+    """Percentiles are reported in milliseconds, throughput per second."""
+    stats = summarize([0.001] * 99 + [0.1], wall_seconds=0.199)
+    assert stats["n"] == 100
+    assert stats["p50_ms"] == 1.0
+    assert stats["p99_ms"] > 1.0
+    assert round(stats["throughput"]) == 503
+
+def test_compare_flags_regressions_only_beyond_threshold():
+    """Latency growth / throughput loss beyond the threshold is reported."""
+    baseline = {"plan": {"p50_ms": 1.0, "p95_ms": 2.0, "throughput": 100.0}}
+    ok   = {"plan": {"p50_ms": 1.1, "p95_ms": 2.2, "throughput": 95.0}}
+    slow = {"plan": {"p50_ms": 1.5, "p95_ms": 2.1, "throughput": 60.0},
+            "new": {"p50_ms": 9.0, "p95_ms": 9.0, "throughput": 1.0}}
+
+    assert compare(ok, baseline, threshold=0.2) == []
+    problems = compare(slow, baseline, threshold=0.2)
+    assert len(problems) == 2
+    assert all(p.startswith("plan:") for p in problems)
+
+def test_synthetic_catalogue_is_deterministic():
+    """Same seed, same rows; clusters come from the production model."""
+    a = synthetic_catalogue(500, seed=7)
+    b = synthetic_catalogue(500, seed=7)
+    assert len(a) == 500
+    assert a.equals(b)
+    assert set(a.columns) >= {"name", "calories", "price", "cluster"}
+
+def test_synthetic_users_are_deterministic_and_plausible():
+    """User/profile chunks depend only on the seed and stay in realistic ranges."""
+    from app.energy import ACTIVITY_FACTORS
+    from benchmarks.synthetic import user_chunks
+
+    a_users, a_profiles = next(user_chunks(2000, first_id=10, seed=3, hashed_password="x"))
+    b_users, b_profiles = next(user_chunks(2000, first_id=10, seed=3, hashed_password="x"))
+    assert a_users == b_users and a_profiles == b_profiles
+    assert a_users[0]["id"] == a_profiles[0]["user_id"] == 10
+    assert len({u["email"] for u in a_users}) == 2000
+    assert all(18 <= p["age"] <= 80 for p in a_profiles)
+    assert {p["goal"] for p in a_profiles} == {"lose", "maintain", "gain"}
+    assert any("vegan" in p["dietary_restrictions"] for p in a_profiles)
+    assert not any({"vegan", "vegetarian"} <= set(p["dietary_restrictions"]) for p in a_profiles)
+    assert {p["sex"] for p in a_profiles} == {"male", "female", None}
+    assert {p["activity_level"] for p in a_profiles} - {None} <= set(ACTIVITY_FACTORS)
+
+def test_synthetic_recipes_trigger_restriction_keywords():
+    """Generated names carry the keywords the diet filters look for."""
+    from app.database import apply_dietary_restrictions
+    from benchmarks.synthetic import recipe_catalogue
+
+    df = next(recipe_catalogue(5000, seed=1))
+    vegan = apply_dietary_restrictions(df, ["vegan"])
+    assert 0 < len(vegan) < len(df)
+    assert not vegan.name.str.contains("Chicken").any()
+    assert df.cluster.nunique() > 1
+
+def test_load_users_bulk_inserts(tmp_path):
+    """Users and profiles land in the target database with matching ids."""
+    from sqlalchemy import create_engine, text
+    from app import database
+    from benchmarks.synthetic import load_users
+
+    url = f"sqlite:///{tmp_path / 'synthetic.db'}"
+    first = load_users(url, 150, seed=1)
+    engine = create_engine(url)
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT count(*) FROM users")).scalar() == 150
+        assert conn.execute(text(
+            "SELECT count(*) FROM profiles p JOIN users u ON u.id = p.user_id"
+        )).scalar() == 150
+        assert conn.execute(text(
+            "SELECT count(*) FROM profiles WHERE sex IS NOT NULL AND activity_level IS NOT NULL"
+        )).scalar() > 0
+        assert conn.execute(text(
+            "SELECT count(*) FROM profiles WHERE targets_version = :v AND kcal_target > 0"
+        ), {"v": database.TARGETS_VERSION}).scalar() == 150
+    engine.dispose()
+    assert first == 1
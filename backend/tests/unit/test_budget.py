@@ -0,0 +1,99 @@
+"""
+Unit tests for budget-aware meal packing.
+"""
+import math
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+backend_dir = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from app.budget import BUDGET_SLACK, PricedPool, pack, slot_cap
+
+
+def test_slot_cap_rolls_savings_forward():
+    """A slot may take the slack over the average left, minus the reserve for the rest."""
+    assert slot_cap(210.0, 21, 0.0) == pytest.approx(10.0 * BUDGET_SLACK)
+    assert slot_cap(30.0, 2, 0.0) == pytest.approx(15.0 * BUDGET_SLACK)   # cheap meals so far
+    assert slot_cap(20.0, 2, 12.0) == pytest.approx(12.0)                 # reserve wins, floored at cheapest
+    assert slot_cap(math.inf, 5, 1.0) == math.inf
+
+
+def test_price_of_nth_and_cheapest_except():
+    """The n-th cheapest price spans arrays; the fallback skips excluded rows."""
+    pool = PricedPool([np.array([10, 11, 12]), np.array([20, 21])],
+                      [np.array([1.0, 2.0, 8.0]), np.array([1.5, 9.0])])
+    assert [pool.price_of_nth(n) for n in (1, 2, 3, 9)] == [1.0, 1.5, 2.0, 9.0]
+    assert pool.cheapest_except(2.0, {10, 20}) == (11, 2.0)
+    assert pool.cheapest_except(1.5, {10, 20}) is None
+
+
+def test_draw_is_bounded_by_binary_search():
+    """Only rows priced at most the cap are drawn, weighted per array."""
+    pool = PricedPool([np.array([10, 11, 12]), np.array([20, 21])],
+                      [np.array([1.0, 2.0, 8.0]), np.array([3.0, 9.0])], [1.0, 4.0])
+    assert pool.available(3.0).tolist() == [2, 1] and pool.cheapest == 1.0
+    rng = np.random.default_rng(0)
+    rows = [pool.draw(3.0, rng)[0] for _ in range(3000)]
+    assert set(rows) == {10, 11, 20}
+    assert rows.count(20) / len(rows) == pytest.approx(4 / 6, abs=0.05)
+    assert pool.draw(0.5, rng) is None
+
+
+def test_pack_keeps_the_week_within_budget():
+    """Cumulative spend stays within budget; cheap picks leave room for pricier ones."""
+    prices = np.round(np.linspace(2.0, 20.0, 400), 2)
+    pool = PricedPool.from_rows(np.arange(400), prices)
+    rng = np.random.default_rng(1)
+    dearest = []
+    for _ in range(50):
+        rows, spent = pack(pool, 21 * 8.0, 21, rng)
+        assert len(set(rows.tolist())) == 21
+        assert spent == pytest.approx(prices[rows].sum())
+        assert spent <= 21 * 8.0
+        dearest.append(prices[rows].max())
+    assert max(dearest) > 8.0 * BUDGET_SLACK          # above the old flat per-meal ceiling
+
+
+def test_pack_overspends_only_when_nothing_fits():
+    """When the budget cannot buy *distinct* meals the cheapest ones are used anyway."""
+    pool = PricedPool.from_rows(np.array([1, 2, 3, 4]), np.array([6.0, 7.0, 9.0, 12.0]))
+    rows, spent = pack(pool, 15.0, 3, np.random.default_rng(0))
+    assert sorted(rows.tolist()) == [1, 2, 3] and spent == 22.0
+
+
+def test_pack_keeps_distinct_meals_near_the_minimum_budget():
+    """A tight budget still leaves *distinct* rows eligible, so days never repeat a meal."""
+    prices = np.round(np.linspace(4.0, 12.0, 60), 2)
+    # every other row in a barely weighted array: redraws rarely reach it
+    pool = PricedPool([np.arange(0, 60, 2), np.arange(1, 60, 2)],
+                      [prices[0::2], prices[1::2]], [1.0, 0.001])
+    rng = np.random.default_rng(4)
+    for _ in range(50):
+        rows, spent = pack(pool, 21 * 4.1, 21, rng, distinct=3)
+        assert all(len(set(day)) == 3 for day in rows.reshape(7, 3).tolist())
+        assert spent == pytest.approx(21 * 4.1, rel=0.05)      # overspends by little
+
+
+def test_pack_down_weights_recent_rows():
+    """Recent rows are redrawn unless kept with probability ``recent_weight``."""
+    pool = PricedPool.from_rows(np.arange(10), np.ones(10))
+    rng = np.random.default_rng(2)
+    picks = [pack(pool, None, 1, rng, recent={0, 1, 2, 3, 4}, recent_weight=0.1)[0][0]
+             for _ in range(2000)]
+    assert np.mean(np.array(picks) < 5) == pytest.approx(0.5 / 5.5, abs=0.04)
+
+
+def test_pack_ceiling_caps_every_slot():
+    """Without a budget only *ceiling* applies, to every slot; below the cheapest meal that meal is used."""
+    prices = np.round(np.linspace(1.0, 20.0, 200), 2)
+    pool = PricedPool.from_rows(np.arange(200), prices)
+    rng = np.random.default_rng(3)
+    rows, spent = pack(pool, None, 21, rng, ceiling=6.0)
+    assert prices[rows].max() <= 6.0
+    assert spent > 21 * 3.0                      # no weekly total pulls picks down
+    rows, _ = pack(pool, None, 2, rng, ceiling=0.5)
+    assert sorted(rows.tolist()) == [0, 1]
@@ -0,0 +1,66 @@
+"""
+Unit tests for the columnar recipe catalogue.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+import sys
+from pathlib import Path
+
+backend_dir = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from app.catalogue import RecipeCatalogue
+from app.serialization import meal_dict
+
+@pytest.fixture
+def frame():
+    return pd.DataFrame({
+        "name":     ["Tofu Bowl", "Chicken Wrap", "Tofu Bowl", "Oats"],
+        "calories": [410.7, 520.0, 398.2, 300.0],
+        "protein":  [22, 38, 21.5, 8],
+        "carbs":    [40, 45, 41, 65],
+        "fat":      [18, 22, 17, 7],
+        "price":    [7.5, 9.25, 7.1, 3.0],
+        "cluster":  [2, 0, 2, 1],
+    })
+
+def test_names_are_interned(frame):
+    """Each distinct name is stored once; rows refer to it by int32 id."""
+    cat = RecipeCatalogue.from_frame(frame)
+    assert len(cat) == 4 and list(cat.names) == ["Tofu Bowl", "Chicken Wrap", "Oats"]
+    assert cat.name_id.dtype == np.int32 and list(cat.name_id) == [0, 1, 0, 2]
+    assert list(cat["name"]) == list(frame["name"])
+    assert not cat.price.flags.writeable
+
+def test_meals_match_meal_dict(frame):
+    """Gathered rows serialise exactly like ``meal_dict`` on the frame rows."""
+    cat = RecipeCatalogue.from_frame(frame)
+    expected = [meal_dict(*frame.loc[r, ["name", "calories", "protein", "carbs", "fat", "price"]])
+                for r in (3, 0)]
+    assert cat.meals([3, 0]) == expected
+    assert cat.recipe(0).meal() == expected[1]
+    assert cat.recipe(1).price == 9.25 and cat.recipe(1).name == "Chicken Wrap"
+    with pytest.raises(AttributeError):
+        cat.recipe(0).extra = 1                          # __slots__
+
+def test_take_and_frame_round_trip(frame):
+    """Subsets share the name table; ``frame`` restores the columns."""
+    cat = RecipeCatalogue.from_frame(frame)
+    sub = cat.take([2, 1])
+    assert sub.names is cat.names and list(sub["name"]) == ["Tofu Bowl", "Chicken Wrap"]
+    assert len(cat.take([])) == 0 and RecipeCatalogue.empty().mean_price == 0.0
+    back = cat.frame()
+    assert list(back.columns) == list(frame.columns)
+    assert back["calories"].tolist() == [410, 520, 398, 300]
+    assert back["price"].tolist() == frame["price"].tolist()
+
+def test_fingerprint_follows_content(frame):
+    """Equal catalogues share a fingerprint; any changed value changes it."""
+    a = RecipeCatalogue.from_frame(frame)
+    assert a.fingerprint() == RecipeCatalogue.from_frame(frame.copy()).fingerprint()
+    assert a.fingerprint() == a.take(np.arange(len(a))).fingerprint()
+    repriced = frame.assign(price=frame.price.where(frame.index != 3, 3.5))
+    assert RecipeCatalogue.from_frame(repriced).fingerprint() != a.fingerprint()
+    renamed = frame.assign(name=frame.name.replace("Oats", "Porridge"))
+    assert RecipeCatalogue.from_frame(renamed).fingerprint() != a.fingerprint()
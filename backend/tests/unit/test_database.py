@@ -1,6 +1,7 @@
 """
 Unit tests for database models and functions.
 """
+import numpy as np
 import pytest
 import sys
 import warnings
@@ -200,3 +201,281 @@ def test_init_db():
         assert True
     except Exception as e:
         pytest.fail(f"init_db() raised an exception: {e}")
+
+def test_add_missing_columns(tmp_path):
+    """Columns added to a model since a table was created are ALTERed in."""
+    from sqlalchemy import create_engine, inspect, text
+    from app.database import _add_missing_columns
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE profiles (user_id INTEGER PRIMARY KEY, age INTEGER NOT NULL, "
+            "weight FLOAT NOT NULL, height FLOAT NOT NULL, goal VARCHAR NOT NULL)"
+        ))
+        conn.execute(text("INSERT INTO profiles VALUES (1, 30, 70, 175, 'maintain')"))
+
+    _add_missing_columns(engine)
+
+    columns = {c["name"] for c in inspect(engine).get_columns("profiles")}
+    assert {"budget", "dietary_restrictions", "updated_at"} <= columns
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT age FROM profiles")).scalar() == 30
+    engine.dispose()
+
+def test_upsert_profiles_single_statement(tmp_path):
+    """Insert and update both go through one INSERT ... ON CONFLICT statement."""
+    from sqlalchemy import event
+    from app import database
+    from app.database import upsert_profiles
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'upsert.db'}")
+    Base.metadata.create_all(bind=engine)
+    statements = []
+    event.listen(engine, "before_cursor_execute",
+                 lambda conn, cur, stmt, *a: statements.append(stmt))
+    changed = []
+    database._profile_listeners.append(changed.extend)
+    base = {"age": 30, "weight": 70.0, "height": 175.0, "goal": "maintain",
+            "budget": None, "dietary_restrictions": ["vegan"]}
+    try:
+        with engine.begin() as conn:
+            (row,) = upsert_profiles(conn, [{"user_id": 1, **base}])
+        assert row.age == 30 and row.dietary_restrictions == ["vegan"]
+        first_update = row.updated_at
+
+        statements.clear()
+        with engine.begin() as conn:
+            rows = upsert_profiles(conn, [
+                {"user_id": 1, **base, "goal": "lose"},
+                {"user_id": 2, **base},
+                {"user_id": 1, **base, "goal": "gain"},      # last write wins
+            ])
+        assert [s.split()[0] for s in statements if not s.startswith(("BEGIN", "COMMIT"))] == ["INSERT"]
+        assert [(r.user_id, r.goal) for r in rows] == [(1, "gain"), (2, "maintain")]
+        assert rows[0].updated_at >= first_update
+        assert changed == []                                  # not before the caller commits
+        database.profiles_changed([r.user_id for r in rows])
+        assert changed == [1, 2]
+    finally:
+        database._profile_listeners.remove(changed.extend)
+        engine.dispose()
+
+def test_normalize_url_and_engine_settings():
+    """postgres URLs use psycopg 3; only client-server engines get a sized pool."""
+    from sqlalchemy.pool import QueuePool
+    from app.database import make_engine, normalize_url
+
+    assert normalize_url("postgres://u:p@db/app") == "postgresql+psycopg://u:p@db/app"
+    assert normalize_url("postgresql://u@db/app") == "postgresql+psycopg://u@db/app"
+    assert normalize_url("postgresql+psycopg2://u@db/app") == "postgresql+psycopg2://u@db/app"
+    assert normalize_url("sqlite:///./x.db") == "sqlite:///./x.db"
+
+    sqlite = make_engine("sqlite://")
+    assert sqlite.dialect.name == "sqlite"
+    pg = make_engine("postgres://u@localhost/app")       # lazy: never connects
+    assert pg.dialect.driver == "psycopg"
+    assert isinstance(pg.pool, QueuePool) and pg.pool._pre_ping
+    sqlite.dispose()
+    pg.dispose()
+
+def test_derive_targets_match_per_profile_formulas():
+    """Batch derivation agrees with the scalar formulas and nearest-centre search."""
+    import numpy as np
+    from app import database
+    from app.database import derive_targets, profile_targets
+
+    profiles = [
+        {"user_id": 1, "age": 30, "weight": 70, "height": 175, "goal": "maintain", "budget": None},
+        {"user_id": 2, "age": 55, "weight": 95, "height": 168, "goal": "lose", "budget": 105.0},
+        {"user_id": 3, "age": 22, "weight": 60, "height": 190, "goal": "gain", "budget": 300.0},
+    ]
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", message="X does not have valid feature names")
+        derived = derive_targets(profiles)
+        for p, t in zip(profiles, derived):
+            tdee = adjust_tdee(calculate_bmr(p["age"], p["weight"], p["height"]), p["goal"])
+            price = p["budget"] / 21 if p["budget"] else database.recipes["price"].mean()
+            feats = [tdee / 3, 0.30 * tdee / 12, 0.40 * tdee / 12, 0.30 * tdee / 27, price]
+            scaled = database.scaler.transform(np.array([feats]))
+            expected = int(np.argmin([np.linalg.norm(scaled - c) for c in database.model.cluster_centers_]))
+            assert t["tdee"] == pytest.approx(tdee)
+            assert t["avg_price_per_meal"] == pytest.approx(price)
+            assert t["cluster"] == expected
+            assert t["targets_version"] == database.TARGETS_VERSION
+
+        stored = {**profiles[0], **derived[0], "cluster": -1}       # current version: trusted
+        assert profile_targets(stored)["cluster"] == -1
+        stale = {**stored, "targets_version": "old"}
+        assert profile_targets(stale)["cluster"] == derived[0]["cluster"]
+
+def test_backfill_profile_targets(tmp_path):
+    """Rows without (or with stale) targets are filled in batches; analytics group by cluster."""
+    from sqlalchemy import insert, text
+    from app.database import backfill_profile_targets, profile_cluster_stats
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'backfill.db'}")
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(Profile), [
+            {"user_id": i, "age": 20 + i, "weight": 60.0 + i, "height": 170.0,
+             "goal": ("lose", "maintain", "gain")[i % 3], "budget": None}
+            for i in range(1, 8)
+        ])
+        conn.execute(Profile.__table__.update().where(Profile.user_id == 7)
+                     .values(targets_version="stale", cluster=99))
+    try:
+        with warnings.catch_warnings():
+            warnings.filterwarnings("ignore", message="X does not have valid feature names")
+            assert backfill_profile_targets(engine, batch_size=3) == 7
+            assert backfill_profile_targets(engine, batch_size=3) == 0
+        with engine.connect() as conn:
+            stats = profile_cluster_stats(conn)
+            assert sum(s["profiles"] for s in stats) == 7
+            assert None not in {s["cluster"] for s in stats} and 99 not in {s["cluster"] for s in stats}
+            plan = conn.execute(text(
+                "EXPLAIN QUERY PLAN SELECT cluster, count(*) FROM profiles GROUP BY cluster"
+            )).fetchall()
+            assert any("ix_profiles_cluster" in str(row) for row in plan)
+    finally:
+        engine.dispose()
+
+def test_plan_summary_matches_weekly_plan():
+    """Summary totals equal the sums of the returned meals, for catalogue and fallback plans."""
+    from app import database
+    profile = {"user_id": 1, "age": 30, "weight": 70, "height": 175, "goal": "maintain",
+               "budget": 150.0, "dietary_restrictions": []}
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", message="X does not have valid feature names")
+        plans = [generate_meal_plan(profile)]
+        original = database.recipes
+        try:
+            database.use_catalogue(original.take([]))            # empty pools: static fallback
+            plans.append(generate_meal_plan(profile))
+        finally:
+            database.use_catalogue(original)
+
+    for plan in plans:
+        summary = plan["summary"]
+        for day, totals in zip(plan["weekly_plan"], summary["days"]):
+            assert totals["day"] == day["day"]
+            for field in ("calories", "protein", "carbs", "fat", "price"):
+                assert totals["totals"][field] == pytest.approx(sum(m[field] for m in day["meals"]), abs=0.01)
+        week = summary["week"]["totals"]
+        assert week["price"] == pytest.approx(sum(d["totals"]["price"] for d in summary["days"]), abs=0.01)
+        target = summary["target_per_day"]["calories"]
+        assert summary["week"]["deviation_pct"]["calories"] == pytest.approx(
+            (week["calories"] / (7 * target) - 1) * 100, abs=0.1)
+        assert summary["within_budget"] == (week["price"] <= 150.0)
+
+def test_sample_week_avoids_recent_meals(monkeypatch):
+    """Weeks from 21+ rows never repeat a meal, and recent meals are down-weighted."""
+    from app import database
+    from app.budget import PricedPool
+    from app.history import MealHistory
+    monkeypatch.setattr(database, "meal_history", MealHistory(size=21, max_users=4))
+
+    rows = np.arange(0, 84, 2)                                   # 42 row positions
+    pool = PricedPool.from_rows(rows, np.full(42, 5.0))
+    first = database.sample_week(pool, user_id=7)
+    assert first.shape == (7, 3) and len(np.unique(first)) == 21
+    assert set(first.ravel()) <= set(rows)
+
+    # with the history weight at 0.1 the other 21 rows are far more likely
+    repeats = [np.isin(database.sample_week(pool, 7, record=False), first).sum()
+               for _ in range(200)]
+    assert np.mean(repeats) < 5
+
+    small = database.sample_week(PricedPool.from_rows(np.array([3, 5, 8, 13]), np.ones(4)), user_id=8)
+    assert small.shape == (7, 3)
+    assert all(len(set(day)) == 3 for day in small)
+
+def _targets_at(point):
+    """Profile targets whose scaled features sit at *point*."""
+    from app import database
+    values = point * database.scaler.scale_ + database.scaler.mean_
+    keys = ("kcal_target", "protein_target", "carbs_target", "fat_target", "avg_price_per_meal")
+    return dict(zip(keys, values.tolist()))
+
+def test_cluster_blend_only_near_boundaries():
+    """A profile on a centroid keeps one cluster; one between two blends both."""
+    from app import database
+    centres = database.model.cluster_centers_
+    a = 0
+    b = int(np.argsort(((centres - centres[a]) ** 2).sum(axis=1))[1])     # a's closest neighbour
+
+    clusters, weights = database.cluster_blend({**_targets_at(centres[a]), "cluster": a})
+    assert clusters == [a] and weights.tolist() == [1.0]
+
+    between = 0.55 * centres[a] + 0.45 * centres[b]
+    clusters, weights = database.cluster_blend({**_targets_at(between), "cluster": a})
+    assert clusters[:2] == [a, b]
+    assert weights[0] == 1.0 and 0.8 < weights[1] < 1.0
+
+def test_plan_pool_blends_before_falling_back(monkeypatch):
+    """Neighbouring clusters fill a pool the nearest one cannot, and are counted."""
+    from app import database
+    from app.metrics import PLAN_POOLS
+    centres = database.model.cluster_centers_
+    a = 0
+    b = int(np.argsort(((centres - centres[a]) ** 2).sum(axis=1))[1])
+    targets = {**_targets_at(0.55 * centres[a] + 0.45 * centres[b]), "cluster": a}
+    index  = {a: np.array([5], dtype=np.int32), b: np.array([1, 7, 9], dtype=np.int32)}
+    prices = {a: np.array([4.0]), b: np.array([3.0, 4.0, 90.0])}
+    monkeypatch.setattr(database, "CLUSTER_INDEX", index)
+    monkeypatch.setattr(database, "CLUSTER_PRICES", prices)
+
+    before = PLAN_POOLS.value(endpoint="plan", pool="blended")
+    pool = database.plan_pool(targets, [], 5.0, need=3, endpoint="plan")
+    assert [r.tolist() for r in pool.rows][:2] == [[5], [1, 7, 9]]
+    assert pool.weights[0] == 1.0 and pool.weights[1] < 1.0 / 3   # cluster shares, not row counts
+    assert PLAN_POOLS.value(endpoint="plan", pool="blended") == before + 1
+
+    week = database.sample_week(pool, None, budget=21 * 4.0)
+    assert set(week.ravel()) <= {1, 5, 7}                         # row 9 never fits
+
+    monkeypatch.setattr(database, "PLAN_CLUSTER_K", 1)
+    before = PLAN_POOLS.value(endpoint="plan", pool="fallback")
+    assert database.plan_pool(targets, [], 5.0, need=3, endpoint="plan") is None
+    assert PLAN_POOLS.value(endpoint="plan", pool="fallback") == before + 1
+
+def test_budget_less_plans_and_swaps_share_the_slot_ceiling():
+    """Without a budget every meal stays under ``BUDGET_SLACK`` × the mean price; swaps use the same cap."""
+    from app import database
+    from app.budget import BUDGET_SLACK
+    profile = {"user_id": None, "age": 30, "weight": 70, "height": 175, "goal": "maintain",
+               "budget": None, "dietary_restrictions": []}
+    ceiling = database.recipes.mean_price * BUDGET_SLACK
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", message="X does not have valid feature names")
+        plan = generate_meal_plan(profile)
+        swaps = [database.pick_random_meal(profile) for _ in range(50)]
+        budgeted = [database.pick_random_meal({**profile, "budget": 210.0}) for _ in range(200)]
+
+    assert plan["summary"]["within_budget"] is None
+    assert all(m["price"] <= ceiling + 0.01 for day in plan["weekly_plan"] for m in day["meals"])
+    assert all(m["price"] <= ceiling + 0.01 for m in swaps)
+    assert all(m["price"] <= 10.0 * BUDGET_SLACK + 0.01 for m in budgeted)
+
+def test_tight_budgets_keep_three_distinct_meals_per_day():
+    """Near the minimum budget, catalogue and static-fallback plans still vary within each day."""
+    from app import database
+    from app.metrics import PLAN_STAGE_SECONDS, StageTimer
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", message="X does not have valid feature names")
+        weeks = []
+        for budget in (40.0, 60.0, 100.0):
+            profile = {"user_id": None, "age": 30, "weight": 70, "height": 175, "goal": "maintain",
+                       "budget": budget, "dietary_restrictions": []}
+            weeks.append(database._select_plan(profile, StageTimer(PLAN_STAGE_SECONDS))[2])
+            plan = generate_meal_plan(profile)
+            assert all(len({m["name"] for m in day["meals"]}) == 3 for day in plan["weekly_plan"])
+        original = database.recipes
+        try:
+            database.use_catalogue(original.take([]))            # empty pools: static fallback
+            fallback = generate_meal_plan({**profile, "budget": 40.0})
+        finally:
+            database.use_catalogue(original)
+
+    assert all(len(set(day)) == 3 for week in weeks for day in week.tolist())
+    assert all(len({m["name"] for m in day["meals"]}) == 3 for day in fallback["weekly_plan"])
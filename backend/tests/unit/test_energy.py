@@ -0,0 +1,73 @@
+"""
+Unit tests for the vectorised energy model.
+"""
+import numpy as np
+import pytest
+import sys
+from pathlib import Path
+
+backend_dir = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from app import energy
+from app.database import adjust_tdee, calculate_bmr, derive_targets
+
+def test_bmr_formulas_by_sex():
+    """Published Mifflin–St Jeor and revised Harris–Benedict values."""
+    assert energy.bmr(25, 70, 175, "male") == pytest.approx(1673.75)
+    assert energy.bmr(25, 70, 175, "female") == pytest.approx(1507.75)
+    assert energy.bmr(25, 70, 175, "male", "harris_benedict") == pytest.approx(1724.052, abs=1e-3)
+    assert energy.bmr(25, 70, 175, "female", "harris_benedict") == pytest.approx(1528.783, abs=1e-3)
+
+def test_unknown_categories_keep_previous_defaults():
+    """Missing sex / activity / goal mean male, sedentary and no offset."""
+    assert energy.bmr(30, 80, 180, None) == energy.bmr(30, 80, 180, "male")
+    assert energy.tdee(1000, None, None) == pytest.approx(1200)
+    assert energy.tdee(1000, "unknown", "sideways") == pytest.approx(1200)
+    assert calculate_bmr(30, 80, 180) == pytest.approx(10 * 80 + 6.25 * 180 - 5 * 30 + 5)
+    assert adjust_tdee(1500, "lose") == pytest.approx(1500 * 1.2 - 500)
+
+def test_encode_passes_integer_codes_through():
+    """Integer codes are returned as given, whether array, list or scalar."""
+    assert energy.encode(np.array([1, 0]), energy.SEXES).tolist() == [1, 0]
+    assert energy.encode([1, 0, 1], energy.SEXES).tolist() == [1, 0, 1]
+    assert int(energy.encode(1, energy.SEXES)) == 1
+    assert int(energy.encode(np.uint8(3), energy.ACTIVITY_FACTORS)) == 3
+    assert energy.encode(["female", None, "other"], energy.SEXES).tolist() == [1, 0, 0]
+    assert int(energy.encode("female", energy.SEXES)) == 1
+    assert energy.bmr(25, 70, 175, 1) == energy.bmr(25, 70, 175, "female")
+
+def test_arrays_match_scalars():
+    """One call over arrays equals the per-profile results, codes included."""
+    age    = np.array([20, 45, 70, 33])
+    weight = np.array([55.0, 90.0, 70.0, 62.5])
+    height = np.array([160.0, 185.0, 170.0, 172.0])
+    sex    = np.array(["female", "male", None, "female"], dtype=object)
+    active = np.array(["very_active", "light", None, "moderate"], dtype=object)
+    goal   = np.array(["gain", "lose", "maintain", None], dtype=object)
+
+    tdee = energy.tdee(energy.bmr(age, weight, height, sex), active, goal)
+    expected = [
+        adjust_tdee(calculate_bmr(a, w, h, s), g, x)
+        for a, w, h, s, x, g in zip(age, weight, height, sex, active, goal)
+    ]
+    np.testing.assert_allclose(tdee, expected)
+
+    codes = energy.tdee(
+        energy.bmr(age, weight, height, energy.encode(sex, energy.SEXES)),
+        energy.encode(active, energy.ACTIVITY_FACTORS),
+        energy.encode(goal, energy.GOAL_OFFSETS),
+    )
+    np.testing.assert_allclose(codes, tdee)
+
+    kcal, protein, carbs, fat = energy.meal_targets(tdee)
+    np.testing.assert_allclose(protein * 4 + carbs * 4 + fat * 9, kcal)
+
+def test_derive_targets_use_sex_and_activity():
+    """Stored targets follow the profile's sex and activity level."""
+    base = {"user_id": 1, "age": 30, "weight": 60, "height": 165, "goal": "maintain"}
+    default, female_active = derive_targets([
+        base, {**base, "sex": "female", "activity_level": "active"},
+    ])
+    assert female_active["bmr"] == pytest.approx(default["bmr"] - 166)
+    assert female_active["tdee"] == pytest.approx(female_active["bmr"] * 1.725)
@@ -0,0 +1,73 @@
+"""
+Unit tests for the liveness / readiness probes.
+"""
+import sys
+from pathlib import Path
+
+backend_dir = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from fastapi.testclient import TestClient
+from app.main import app
+from app import database, health
+
+def test_healthz():
+    """Liveness never depends on external state."""
+    client = TestClient(app)
+    response = client.get("/healthz")
+    assert response.status_code == 200
+    assert response.json() == {"status": "ok"}
+
+def test_readyz_ready_after_startup():
+    """Readiness reports every check once the lifespan has run."""
+    health.invalidate()
+    with TestClient(app) as client:
+        response = client.get("/readyz")
+    assert response.status_code == 200
+    body = response.json()
+    assert body["status"] == "ready"
+    assert set(body["checks"]) >= {"startup", "catalogue", "indexes", "database", "replica", "threadpool", "hashing"}
+
+def test_readyz_reports_missing_catalogue(monkeypatch):
+    """A missing scaler makes the worker unready (503)."""
+    health.invalidate()
+    monkeypatch.setattr(database, "scaler", None)
+    monkeypatch.setattr(database, "CATALOGUE_ERROR", "FileNotFoundError: scaler.pkl")
+    with TestClient(app) as client:
+        response = client.get("/readyz")
+    health.invalidate()
+    assert response.status_code == 503
+    assert response.json()["checks"]["catalogue"]["ok"] is False
+
+def test_readyz_is_cached(monkeypatch):
+    """Probes inside the cache window reuse the previous verdict."""
+    health.invalidate()
+    calls = []
+    monkeypatch.setitem(health._checks, "counting", lambda: calls.append(1) or (True, "ok"))
+    with TestClient(app) as client:
+        client.get("/readyz")
+        client.get("/readyz")
+    health.invalidate()
+    assert len(calls) == 1
+
+def test_readyz_probes_the_replica(monkeypatch, tmp_path):
+    """An unreachable replica fails readiness and is reported on its own."""
+    health.invalidate()
+    replica = database.make_engine(f"sqlite:///{tmp_path / 'missing' / 'replica.db'}")
+    monkeypatch.setattr(database, "read_engine", replica)
+    with TestClient(app) as client:
+        response = client.get("/readyz")
+    health.invalidate()
+    checks = response.json()["checks"]
+    assert response.status_code == 503
+    assert checks["replica"]["ok"] is False
+    assert checks["database"]["ok"] is True
+
+def test_load_catalogue_failure_keeps_previous(tmp_path):
+    """A failed reload records the error and leaves the live catalogue intact."""
+    version = database.CATALOGUE_VERSION
+    assert database.load_catalogue(scaler_path=str(tmp_path / "missing.pkl")) is False
+    assert "missing.pkl" in database.CATALOGUE_ERROR
+    assert database.CATALOGUE_VERSION == version
+    assert database.catalogue_ready()
+    database.CATALOGUE_ERROR = None
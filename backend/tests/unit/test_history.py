@@ -0,0 +1,53 @@
+"""
+Unit tests for the per-user recent-meal history.
+"""
+import numpy as np
+import sys
+from pathlib import Path
+
+backend_dir = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from app.history import MealHistory
+
+def test_ring_buffer_keeps_the_latest_rows():
+    """Only the last ``size`` rows are kept once the buffer wraps."""
+    h = MealHistory(size=4, max_users=2)
+    h.record(1, "v1", [1, 2, 3])
+    h.record(1, "v1", [4, 5])
+    assert sorted(h.recent(1, "v1")) == [2, 3, 4, 5]
+    h.record(1, "v1", np.arange(10, 20))
+    assert sorted(h.recent(1, "v1")) == [16, 17, 18, 19]
+    assert len(h.recent(2, "v1")) == 0
+
+def test_least_recently_used_user_is_evicted():
+    """Beyond ``max_users`` the slot of the longest-idle user is recycled."""
+    h = MealHistory(size=3, max_users=2)
+    h.record(1, "v1", [1])
+    h.record(2, "v1", [2])
+    h.record(1, "v1", [11])                  # user 1 is now the most recent
+    h.record(3, "v1", [3])
+    assert len(h) == 2
+    assert len(h.recent(2, "v1")) == 0
+    assert sorted(h.recent(1, "v1")) == [1, 11]
+    assert list(h.recent(3, "v1")) == [3]
+
+def test_new_catalogue_version_drops_history():
+    """Rows refer to catalogue positions, so a new catalogue starts afresh."""
+    h = MealHistory(size=3, max_users=2)
+    h.record(1, "v1", [1, 2])
+    assert len(h.recent(1, "v2")) == 0
+    h.record(2, "v2", [5])
+    assert len(h.recent(1, "v1")) == 0 and len(h) == 1
+    h.clear()
+    assert len(h) == 0 and len(h.recent(2, "v2")) == 0
+
+def test_forgotten_users_free_their_slot():
+    """``forget`` drops a user's rows and the slot is reused without evicting others."""
+    h = MealHistory(size=3, max_users=2)
+    h.record(1, "v1", [1])
+    h.record(2, "v1", [2])
+    h.forget([1, 99])
+    assert len(h) == 1 and len(h.recent(1, "v1")) == 0
+    h.record(3, "v1", [3])
+    assert list(h.recent(2, "v1")) == [2] and list(h.recent(3, "v1")) == [3]
@@ -0,0 +1,164 @@
+"""
+Unit tests for the background job runner.
+"""
+import asyncio
+import math
+import sys
+import threading
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+
+backend_dir = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from sqlalchemy import create_engine, insert, select
+
+from app import jobs
+from app.database import Base, Job
+
+@pytest.fixture
+def job_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'jobs.db'}",
+                           connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine, tables=[Job.__table__])
+    yield engine
+    engine.dispose()
+
+@pytest.fixture
+def steps(monkeypatch):
+    """A test job kind that reports five steps and can be held at step 2."""
+    gate = threading.Event()
+
+    def run(ctx, params):
+        for i in range(5):
+            if i == 2 and params.get("hold"):
+                while not gate.wait(0.01):
+                    ctx.check()
+            ctx.progress((i + 1) / 5, f"step {i + 1}")
+        return {"square": ctx.run_cpu(math.pow, params.get("n", 3), 2)}
+
+    monkeypatch.setitem(jobs.JOB_KINDS, "steps", run)
+    return gate
+
+async def _wait_for(runner, job_id, statuses, timeout=5.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while True:
+        row = await asyncio.to_thread(runner.get, job_id)
+        if row["status"] in statuses:
+            return row
+        assert asyncio.get_running_loop().time() < deadline, row
+        await asyncio.sleep(0.01)
+
+def test_job_runs_and_streams_progress(job_engine, steps):
+    """A submitted job is claimed at once; watchers see every step, then the result."""
+    async def scenario():
+        runner = jobs.JobRunner(job_engine, processes=0)
+        await runner.start()
+        try:
+            job = await asyncio.to_thread(runner.submit, "steps", {"n": 4, "hold": True})
+            assert job["status"] in (jobs.QUEUED, jobs.RUNNING)
+            states = []
+            async for state in runner.watch(job["id"]):
+                states.append(state)
+                if state["message"] == "step 2":
+                    steps.set()
+        finally:
+            await runner.stop()
+        return states
+
+    states = asyncio.run(scenario())
+    assert states[-1]["status"] == jobs.SUCCEEDED
+    assert states[-1]["result"] == {"square": 16.0}
+    assert states[-1]["progress"] == 1.0 and states[-1]["attempts"] == 1
+    progress = [s["progress"] for s in states]
+    assert progress == sorted(progress)
+    assert {"status": jobs.RUNNING, "progress": 0.4} in [
+        {"status": s["status"], "progress": s["progress"]} for s in states]
+
+def test_cpu_steps_run_on_process_pool(job_engine, steps):
+    """``ctx.run_cpu`` goes through the (fork-server) process pool."""
+    async def scenario():
+        runner = jobs.JobRunner(job_engine, processes=1)
+        await runner.start()
+        try:
+            job = await asyncio.to_thread(runner.submit, "steps", {"n": 5})
+            return await _wait_for(runner, job["id"], jobs.FINISHED, timeout=60)
+        finally:
+            await runner.stop()
+
+    row = asyncio.run(scenario())
+    assert row["status"] == jobs.SUCCEEDED, row["error"]
+    assert row["result"] == {"square": 25.0}
+
+def test_cancel_queued_and_running_jobs(job_engine, steps):
+    """Queued jobs are cancelled at once, running ones at their next check."""
+    async def scenario():
+        runner = jobs.JobRunner(job_engine, processes=0)
+        await runner.start()
+        try:
+            running = await asyncio.to_thread(runner.submit, "steps", {"hold": True})
+            await _wait_for(runner, running["id"], {jobs.RUNNING})
+            queued = await asyncio.to_thread(runner.submit, "steps")
+            assert (await asyncio.to_thread(runner.cancel, queued["id"]))["status"] == jobs.CANCELLED
+            await asyncio.to_thread(runner.cancel, running["id"])
+            return await _wait_for(runner, running["id"], jobs.FINISHED)
+        finally:
+            await runner.stop()
+
+    row = asyncio.run(scenario())
+    assert row["status"] == jobs.CANCELLED
+    assert row["message"] == "step 2"
+
+def test_shutdown_requeues_unfinished_jobs(job_engine, steps):
+    """Jobs still running when the drain timeout ends go back to the queue."""
+    async def scenario():
+        runner = jobs.JobRunner(job_engine, processes=0)
+        await runner.start()
+        job = await asyncio.to_thread(runner.submit, "steps", {"hold": True})
+        await _wait_for(runner, job["id"], {jobs.RUNNING})
+        await runner.stop(timeout=0.05)
+        return await asyncio.to_thread(runner.get, job["id"])
+
+    row = asyncio.run(scenario())
+    assert row["status"] == jobs.QUEUED and row["owner"] is None
+    assert row["message"] == "re-queued at shutdown"
+
+def test_recovery_after_worker_loss(job_engine, steps):
+    """Rows of dead workers are re-run, or failed once out of attempts."""
+    stale = datetime.now(timezone.utc) - timedelta(seconds=jobs.JOB_STALE_SECONDS + 5)
+    base = {"kind": "steps", "params": {}, "status": jobs.RUNNING, "progress": 0.4,
+            "owner": "gone:1", "cancel_requested": False, "heartbeat_at": stale}
+    with job_engine.begin() as conn:
+        conn.execute(insert(Job), [
+            {**base, "id": "retry", "attempts": 1},
+            {**base, "id": "exhausted", "attempts": jobs.JOB_MAX_ATTEMPTS},
+            {**base, "id": "cancelled", "attempts": 1, "cancel_requested": True},
+        ])
+
+    async def scenario():
+        runner = jobs.JobRunner(job_engine, processes=0)
+        await runner.start()
+        try:
+            return await _wait_for(runner, "retry", jobs.FINISHED)
+        finally:
+            await runner.stop()
+
+    retried = asyncio.run(scenario())
+    assert retried["status"] == jobs.SUCCEEDED and retried["attempts"] == 2
+    with job_engine.connect() as conn:
+        status = dict(conn.execute(select(Job.id, Job.status)).all())
+    assert status["exhausted"] == jobs.FAILED
+    assert status["cancelled"] == jobs.CANCELLED
+
+def test_claim_is_exclusive(job_engine, steps):
+    """Two runners sharing a queue never claim the same job."""
+    first, second = jobs.JobRunner(job_engine), jobs.JobRunner(job_engine)
+    first.owner, second.owner = "a:1", "b:2"
+    job = first.submit("steps")
+    claimed = first._claim()
+    assert claimed["id"] == job["id"] and claimed["owner"] == "a:1"
+    assert second._claim() is None
+    with pytest.raises(ValueError):
+        first.submit("no-such-kind")
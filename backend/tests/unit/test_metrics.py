@@ -0,0 +1,57 @@
+"""
+Unit tests for the in-process metrics registry.
+"""
+import sys
+import warnings
+from pathlib import Path
+
+backend_dir = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from fastapi.testclient import TestClient
+from app.main import app
+from app.database import generate_meal_plan
+from app.metrics import Counter, Histogram, PLAN_STAGE_SECONDS
+
+def test_histogram_buckets_are_cumulative():
+    """Observations land in the first bucket >= value and are cumulated on render."""
+    hist = Histogram("test_seconds", "test", buckets=(0.1, 1.0))
+    hist.observe(0.05, route="/a")
+    hist.observe(0.5, route="/a")
+    hist.observe(5.0, route="/a")
+
+    lines = list(hist.samples())
+    assert 'test_seconds_bucket{route="/a",le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{route="/a",le="1.0"} 2' in lines
+    assert 'test_seconds_bucket{route="/a",le="+Inf"} 3' in lines
+    assert 'test_seconds_count{route="/a"} 3' in lines
+    assert hist.count(route="/a") == 3
+
+def test_counter_labels():
+    """Counters keep a separate value per label set."""
+    c = Counter("test_total", "test")
+    c.inc(kind="x")
+    c.inc(2, kind="y")
+    assert c.value(kind="x") == 1
+    assert c.value(kind="y") == 2
+
+def test_plan_stages_are_timed():
+    """generate_meal_plan records every pipeline stage."""
+    profile = {"user_id": 1, "age": 30, "weight": 70, "height": 175, "goal": "maintain"}
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", message="X does not have valid feature names")
+        generate_meal_plan(profile)
+
+    for stage in ("targets", "scaling", "cluster", "diet_filter",
+                  "budget_filter", "sampling", "serialization"):
+        assert PLAN_STAGE_SECONDS.count(stage=stage) >= 1
+
+def test_metrics_endpoint():
+    """/metrics exposes request latency labelled by route template."""
+    client = TestClient(app)
+    client.get("/")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'nutricart_http_request_duration_seconds_count{method="GET",route="/",status="200"}' in response.text
+    assert "# TYPE nutricart_db_query_duration_seconds histogram" in response.text
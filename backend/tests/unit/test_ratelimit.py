@@ -0,0 +1,103 @@
+"""
+Unit tests for the auth rate limiter.
+"""
+import sys
+from pathlib import Path
+
+backend_dir = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(backend_dir))
+
+import pytest
+from fastapi import HTTPException
+from app import ratelimit
+from app.ratelimit import Limit, MemoryBackend, SQLiteBackend
+
+def test_bucket_allows_burst_then_rejects():
+    """A full bucket allows ``capacity`` takes, then reports the wait."""
+    backend = MemoryBackend()
+    limit = Limit(capacity=3, per_second=0.5)
+    assert [backend.take("k", limit) for _ in range(3)] == [0.0, 0.0, 0.0]
+    retry = backend.take("k", limit)
+    assert 0 < retry <= 2.0
+
+def test_bucket_refills_over_time(monkeypatch):
+    """Tokens come back at ``per_second``."""
+    now = [1000.0]
+    monkeypatch.setattr(ratelimit.time, "monotonic", lambda: now[0])
+    backend = MemoryBackend()
+    limit = Limit(capacity=1, per_second=1.0)
+    assert backend.take("k", limit) == 0.0
+    assert backend.take("k", limit) == pytest.approx(1.0)
+    now[0] += 1.0
+    assert backend.take("k", limit) == 0.0
+
+def test_memory_backend_is_bounded():
+    """Least recently used buckets are evicted beyond ``max_keys``."""
+    backend = MemoryBackend(max_keys=100)
+    limit = Limit(capacity=1, per_second=0.001)
+    for i in range(1000):
+        backend.take(f"ip:{i}", limit)
+    assert len(backend) == 100
+    assert backend.take("ip:999", limit) > 0      # recent key still tracked
+
+def test_sqlite_backend_shared_between_instances(tmp_path):
+    """Two backends on one file (two workers) see the same buckets."""
+    path = str(tmp_path / "rl.db")
+    a, b = SQLiteBackend(path), SQLiteBackend(path)
+    limit = Limit(capacity=2, per_second=0.01)
+    assert a.take("k", limit) == 0.0
+    assert b.take("k", limit) == 0.0
+    assert a.take("k", limit) > 0
+    b.reset()
+    assert a.take("k", limit) == 0.0
+
+def test_backend_from_url(tmp_path):
+    """Backends are chosen by RATE_LIMIT_BACKEND."""
+    assert isinstance(ratelimit.backend_from_url("memory"), MemoryBackend)
+    assert isinstance(ratelimit.backend_from_url(f"sqlite:///{tmp_path / 'rl.db'}"), SQLiteBackend)
+    with pytest.raises(ValueError):
+        ratelimit.backend_from_url("redis://localhost")
+
+def test_check_keys_by_ip_and_email(monkeypatch):
+    """The e-mail bucket trips independently of the IP and sets Retry-After."""
+    monkeypatch.setattr(ratelimit, "backend", MemoryBackend())
+    monkeypatch.setattr(ratelimit, "LIMITS", {
+        "login": {"ip": Limit(100, 1.0), "email": Limit(2, 0.1)},
+    })
+    ratelimit.check("login", "1.2.3.4", "a@example.com")
+    ratelimit.check("login", "5.6.7.8", "a@example.com")
+    with pytest.raises(HTTPException) as exc:
+        ratelimit.check("login", "9.9.9.9", "a@example.com")
+    assert exc.value.status_code == 429
+    assert exc.value.headers["Retry-After"] == "10"
+    ratelimit.check("login", "9.9.9.9", "b@example.com")   # other account unaffected
+
+def test_blocking_backend_runs_off_the_event_loop(monkeypatch):
+    """A backend doing I/O is called on the thread pool, in-memory buckets inline."""
+    import asyncio
+    import threading
+    from starlette.requests import Request
+
+    class Recording(MemoryBackend):
+        def take(self, key, limit):
+            threads.append(threading.current_thread())
+            return super().take(key, limit)
+
+    async def receive():
+        return {"type": "http.request", "body": b'{"email": "a@example.com"}'}
+
+    async def run(blocking):
+        backend = Recording()
+        backend.blocking = blocking
+        monkeypatch.setattr(ratelimit, "backend", backend)
+        request = Request({"type": "http", "method": "POST", "headers": [],
+                           "client": ("1.2.3.4", 1)}, receive)
+        await ratelimit.rate_limit("login")(request)
+        return threading.current_thread()
+
+    threads = []
+    loop_thread = asyncio.run(run(blocking=True))
+    assert threads and loop_thread not in threads
+    threads = []
+    loop_thread = asyncio.run(run(blocking=False))
+    assert threads == [loop_thread, loop_thread]
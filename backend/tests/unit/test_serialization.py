@@ -0,0 +1,66 @@
+"""
+Unit tests for the JSON encoders and pre-serialised plan fragments.
+"""
+import json
+import sys
+import warnings
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+backend_dir = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from app import serialization
+from app.database import generate_meal_plan_json
+from app.catalogue import RecipeCatalogue
+from app.serialization import FragmentCache, _stdlib_dumps, render_plan
+
+@pytest.mark.parametrize("encoder", [_stdlib_dumps, serialization.dumps])
+def test_encoders_handle_numpy(encoder):
+    """NumPy scalars and arrays encode like their Python equivalents."""
+    data = {"i": np.int64(3), "f": np.float32(1.5), "a": np.arange(3)}
+    assert json.loads(encoder(data)) == {"i": 3, "f": 1.5, "a": [0, 1, 2]}
+
+def test_fragment_cache_resets_for_new_catalogue():
+    """Fragments are tied to the catalogue object they were built from."""
+    df1 = pd.DataFrame({"name": ["A", "B"], "calories": [100, 200], "protein": [1, 2],
+                        "carbs": [3, 4], "fat": [5, 6], "price": [1.5, 2.5], "cluster": [0, 0]})
+    cat1 = RecipeCatalogue.from_frame(df1)
+    cat2 = RecipeCatalogue.from_frame(df1.assign(name=["C", "D"]))
+    cache = FragmentCache()
+
+    assert json.loads(cache.get(cat1, [1])[0]) == {
+        "name": "B", "calories": 200, "protein": 2.0, "carbs": 4.0, "fat": 6.0, "price": 2.5,
+    }
+    assert json.loads(cache.get(cat2, [1])[0])["name"] == "D"
+
+def test_render_plan_is_valid_json():
+    """Concatenated fragments form the same document as the dict path."""
+    body = render_plan({"user_id": 1}, ["Mon", "Tue"], [[b'{"x":1}'], [b'{"x":2}', b'{"x":3}']])
+    assert json.loads(body) == {
+        "user_id": 1,
+        "weekly_plan": [
+            {"day": "Mon", "meals": [{"x": 1}]},
+            {"day": "Tue", "meals": [{"x": 2}, {"x": 3}]},
+        ],
+    }
+
+def test_generate_meal_plan_json_shape():
+    """The byte path yields 7 days × 3 fully typed meals."""
+    profile = {"user_id": 4, "age": 30, "weight": 70, "height": 175, "goal": "maintain",
+               "budget": 200, "dietary_restrictions": ["vegetarian"]}
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", message="X does not have valid feature names")
+        plan = json.loads(generate_meal_plan_json(profile))
+
+    assert plan["user_id"] == 4
+    assert plan["dietary_restrictions"] == ["vegetarian"]
+    assert [d["day"] for d in plan["weekly_plan"]] == ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+    for day in plan["weekly_plan"]:
+        assert len(day["meals"]) == 3
+        for meal in day["meals"]:
+            assert list(meal) == ["name", "calories", "protein", "carbs", "fat", "price"]
+            assert isinstance(meal["calories"], int)
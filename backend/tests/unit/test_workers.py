@@ -0,0 +1,80 @@
+"""
+Unit tests for the pre-fork worker helpers.
+"""
+import os
+import sys
+from pathlib import Path
+
+backend_dir = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(backend_dir))
+
+import pytest
+from app import database, workers
+
+def test_cpu_quota_cgroup_v2(tmp_path):
+    """cpu.max quota / period gives fractional CPUs; "max" means unlimited."""
+    (tmp_path / "cpu.max").write_text("250000 100000\n")
+    assert workers.cpu_quota(tmp_path) == 2.5
+    (tmp_path / "cpu.max").write_text("max 100000\n")
+    assert workers.cpu_quota(tmp_path) is None
+
+def test_cpu_quota_cgroup_v1(tmp_path):
+    """CFS quota of -1 means unlimited."""
+    (tmp_path / "cpu").mkdir()
+    (tmp_path / "cpu" / "cpu.cfs_period_us").write_text("100000\n")
+    (tmp_path / "cpu" / "cpu.cfs_quota_us").write_text("150000\n")
+    assert workers.cpu_quota(tmp_path) == 1.5
+    (tmp_path / "cpu" / "cpu.cfs_quota_us").write_text("-1\n")
+    assert workers.cpu_quota(tmp_path) is None
+
+def test_available_cpus_capped_by_quota(tmp_path):
+    """A fractional quota rounds up and never exceeds the affinity mask."""
+    (tmp_path / "cpu.max").write_text("50000 100000\n")
+    assert workers.available_cpus(tmp_path) == 1
+    (tmp_path / "cpu.max").write_text("max 100000\n")
+    assert workers.available_cpus(tmp_path) == len(os.sched_getaffinity(0))
+
+def test_default_workers_env_override(monkeypatch):
+    """WEB_CONCURRENCY wins over CPU detection."""
+    monkeypatch.setenv("WEB_CONCURRENCY", "3")
+    assert workers.default_workers() == 3
+    monkeypatch.delenv("WEB_CONCURRENCY")
+    assert workers.default_workers() >= 1
+
+def test_postfork_reseeds_plan_rng(monkeypatch):
+    """Each worker gets its own generator instead of the master's."""
+    monkeypatch.setattr(database, "_rng", database._rng)
+    inherited = database._rng
+    workers.postfork()
+    assert database._rng is not inherited
+
+@pytest.mark.skipif(not Path("/proc/self/smaps_rollup").exists(), reason="needs /proc smaps_rollup")
+def test_memory_report_own_process():
+    """The report reads RSS/PSS for a process and its children."""
+    report = workers.memory_report(os.getpid())
+    assert report["master"]["rss_kb"] > 0
+    assert report["master"]["pss_kb"] > 0
+    assert isinstance(report["workers"], dict)
+
+def test_lifespan_skips_startup_work_done_before_fork(monkeypatch):
+    """Workers forked after ``prefork`` leave tables and token pruning to the master."""
+    import gc
+    from fastapi.testclient import TestClient
+    from app import main
+
+    calls = []
+    monkeypatch.setattr(main, "init_db", lambda: calls.append("init_db"))
+    monkeypatch.setattr(main, "prune_refresh_tokens", lambda db: calls.append("prune"))
+    monkeypatch.setattr(main.jobs, "JOBS_ENABLED", False)
+    monkeypatch.setattr(workers, "preforked", False)
+    with TestClient(main.app):
+        pass
+    assert calls == ["init_db", "prune"]
+
+    workers.prefork()
+    gc.unfreeze()
+    assert workers.preforked
+    calls.clear()
+    with TestClient(main.app):
+        pass
+    assert calls == []
@@ -11,9 +11,17 @@ MODEL_PATH      = 'meal_cluster_model.pkl'
 N_CLUSTERS      = 10
 RANDOM_STATE    = 42
 
-def main():
+def train(
+    input_csv: str = INPUT_CSV,
+    output_csv: str = OUTPUT_CSV,
+    scaler_path: str = SCALER_PATH,
+    model_path: str = MODEL_PATH,
+    n_clusters: int = N_CLUSTERS,
+) -> dict:
+    """Fit scaler + KMeans on *input_csv* and write the artefacts; returns
+    the written paths and the number of recipes."""
     # 1) Load the full recipes dataset (must include a 'price' column)
-    df = pd.read_csv(INPUT_CSV)
+    df = pd.read_csv(input_csv)
 
     # 2) Select features for clustering: nutrition + price
     features = df[['calories', 'protein', 'carbs', 'fat', 'price']].fillna(0)
@@ -23,21 +31,28 @@ def main():
     scaled_features = scaler.fit_transform(features)
 
     # 4) Train KMeans model
-    model = KMeans(n_clusters=N_CLUSTERS, random_state=RANDOM_STATE, n_init=10)
+    model = KMeans(n_clusters=n_clusters, random_state=RANDOM_STATE, n_init=10)
     model.fit(scaled_features)
 
     # 5) Assign cluster labels back to DataFrame
     df['cluster'] = model.predict(scaled_features)
 
     # 6) Save artifacts and updated CSV
-    joblib.dump(scaler, SCALER_PATH)
-    joblib.dump(model, MODEL_PATH)
-    df.to_csv(OUTPUT_CSV, index=False)
+    joblib.dump(scaler, scaler_path)
+    joblib.dump(model, model_path)
+    df.to_csv(output_csv, index=False)
+    return {
+        "scaler_path": scaler_path, "model_path": model_path,
+        "recipes_path": output_csv, "recipes": len(df),
+    }
+
+def main():
+    paths = train()
 
     print("✅ Generated files:")
-    print(f"   • {SCALER_PATH}")
-    print(f"   • {MODEL_PATH}")
-    print(f"   • {OUTPUT_CSV}")
+    print(f"   • {paths['scaler_path']}")
+    print(f"   • {paths['model_path']}")
+    print(f"   • {paths['recipes_path']}")
 
 if __name__ == '__main__':
     main()
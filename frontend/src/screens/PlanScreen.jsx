@@ -52,9 +52,15 @@ export default function PlanScreen () {
   const budget   = plan.budget ?? plan.weekly_budget ?? null;
   const inBudget = budget ? weekCost <= budget : true;
 
-  /* very rough macro targets (30-40-30 split by kcal) */
+  /* weekly macro targets from the profile (plan.summary), else a rough
+     30-40-30 split of the plan's own kcal */
   const kcal2g = { protein:4, carbs:4, fat:9 };
-  const tgt    = {
+  const daily  = plan.summary?.target_per_day;
+  const tgt    = daily ? {
+    protein: daily.protein * days.length,
+    carbs:   daily.carbs   * days.length,
+    fat:     daily.fat     * days.length,
+  } : {
     protein: (0.30 * weekKcal) / kcal2g.protein,
     carbs:   (0.40 * weekKcal) / kcal2g.carbs,
     fat:     (0.30 * weekKcal) / kcal2g.fat,
@@ -64,7 +70,7 @@ export default function PlanScreen () {
   /* actions -------------------------------------------------------------- */
   const regenerate = async () => {
     setLoading(true);
-    const fresh = await apiClient.generateMealPlan(user.id);
+    const fresh = await apiClient.generateMealPlan(user.id, true);
 
     const dr = (fresh.dietary_restrictions || []).map(x => x.toLowerCase());
     const filtered = fresh.weekly_plan.map(d => ({
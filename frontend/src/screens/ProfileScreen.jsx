@@ -15,7 +15,7 @@ export default function ProfileScreen () {
 
   const [form, setForm] = useState({
     age:'', weight:'', height:'',
-    goal:'maintain', budget:'',
+    goal:'maintain', sex:'', activity_level:'sedentary', budget:'',
     dietary_restrictions:[]
   });
   const [error,setError]       = useState('');
@@ -28,7 +28,8 @@ export default function ProfileScreen () {
       const p = await apiClient.fetchProfile();
       setForm({
         age:p.age, weight:p.weight, height:p.height,
-        goal:p.goal, budget:p.budget ?? '',
+        goal:p.goal, sex:p.sex ?? '', activity_level:p.activity_level ?? 'sedentary',
+        budget:p.budget ?? '',
         dietary_restrictions:p.dietary_restrictions ?? []
       });
 
@@ -56,6 +57,7 @@ export default function ProfileScreen () {
     try {
       await apiClient.createOrUpdateProfile({
         ...form,
+        sex:    form.sex === '' ? null : form.sex,
         budget: form.budget === '' ? null : Number(form.budget)
       });
       const plan = await apiClient.generateMealPlan(user.id);
@@ -102,6 +104,22 @@ export default function ProfileScreen () {
           <option value="gain">Gain Muscle</option>
         </select>
 
+        <select name="sex" value={form.sex} onChange={onField}
+                className="w-full border rounded p-2">
+          <option value="">Sex (for calorie estimate)</option>
+          <option value="female">Female</option>
+          <option value="male">Male</option>
+        </select>
+
+        <select name="activity_level" value={form.activity_level} onChange={onField}
+                className="w-full border rounded p-2">
+          <option value="sedentary">Sedentary (little exercise)</option>
+          <option value="light">Lightly active (1–3 days/week)</option>
+          <option value="moderate">Moderately active (3–5 days/week)</option>
+          <option value="active">Very active (6–7 days/week)</option>
+          <option value="very_active">Extra active (physical job or twice a day)</option>
+        </select>
+
         <input name="budget" type="number" placeholder="Budget per week ($)"
                value={form.budget} onChange={onField}
                className="w-full border rounded p-2"/>
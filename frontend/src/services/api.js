@@ -7,6 +7,8 @@ class ApiClient {
   constructor () {
     this.baseURL = API_BASE_URL;
     this.token   = localStorage.getItem('authToken') || null;
+    this.refreshToken = localStorage.getItem('refreshToken') || null;
+    this.refreshing   = null;   // in-flight /auth/refresh, shared by callers
   }
 
   /* token helpers */
@@ -16,10 +18,36 @@ class ApiClient {
       : localStorage.removeItem('authToken');
   }
   getToken ()        { return this.token || localStorage.getItem('authToken'); }
+  setRefreshToken (t) {
+    this.refreshToken = t;
+    t ? localStorage.setItem('refreshToken', t)
+      : localStorage.removeItem('refreshToken');
+  }
+  storeTokens (t) {
+    if (t.access_token)  this.setToken(t.access_token);
+    if (t.refresh_token) this.setRefreshToken(t.refresh_token);
+  }
+
+  /* swap the refresh token for a new pair (no password, no bcrypt) */
+  async refresh () {
+    if (!this.refreshToken) return false;
+    this.refreshing ??= fetch(`${this.baseURL}/auth/refresh`, {
+      method : 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body   : JSON.stringify({ refresh_token: this.refreshToken }),
+    })
+      .then(async res => {
+        if (!res.ok) { this.setToken(null); this.setRefreshToken(null); return false; }
+        this.storeTokens(await res.json());
+        return true;
+      })
+      .finally(() => { this.refreshing = null; });
+    return this.refreshing;
+  }
   isAuthenticated () { return !!this.getToken(); }
 
   /* fetch wrapper */
-  async request (endpoint, opts = {}) {
+  async request (endpoint, opts = {}, retried = false) {
     const cfg = {
       headers : { 'Content-Type': 'application/json', ...opts.headers },
       ...opts,
@@ -28,6 +56,11 @@ class ApiClient {
     if (cfg.body && typeof cfg.body === 'object') cfg.body = JSON.stringify(cfg.body);
 
     const res = await fetch(`${this.baseURL}${endpoint}`, cfg);
+    /* access tokens are short-lived: renew once and replay */
+    if (res.status === 401 && !retried && this.refreshToken
+        && !endpoint.startsWith('/auth/login') && await this.refresh()) {
+      return this.request(endpoint, opts, true);
+    }
     if (!res.ok) {
       const err = await res.json().catch(() => ({}));
       throw new Error(err.detail || `HTTP ${res.status}`);
@@ -40,10 +73,17 @@ class ApiClient {
   register      (d) { return this.request('/auth/register', { method:'POST', body:d }); }
   async login   (c) {
     const t = await this.request('/auth/login', { method:'POST', body:c });
-    if (t.access_token) this.setToken(t.access_token);
+    this.storeTokens(t);
     return t;
   }
-  logout        ()  { this.setToken(null); }
+  async logout  ()  {
+    const refresh_token = this.refreshToken;
+    this.setToken(null);
+    this.setRefreshToken(null);
+    if (refresh_token) {
+      await this.request('/auth/logout', { method:'POST', body:{ refresh_token } }).catch(() => {});
+    }
+  }
   getCurrentUser()  { return this.request('/auth/me'); }
   
   /* password reset */
@@ -61,7 +101,10 @@ class ApiClient {
   fetchProfile          () { return this.request('/profile'); }
 
   /* meal-plan & swapping */
-  generateMealPlan (id)            { return this.request(`/generate_plan/${id}`); }
+  /* plans are revalidated with ETags; pass fresh=true to force a new one */
+  generateMealPlan (id, fresh = false) {
+    return this.request(`/generate_plan/${id}`, fresh ? { cache:'no-store' } : {});
+  }
   swapMeal (userId, dayIdx, mealIdx){
     return this.request(`/swap_meal/${userId}`, {
       method:'POST',